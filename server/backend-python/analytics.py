@@ -1,5 +1,13 @@
-from flask import Blueprint, request, jsonify
+from datetime import date
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 from src.services.analytics_service import analytics_service
+from src.services.analytics_rollup_service import analytics_rollup_service
+from src.services.analytics_cache_service import analytics_cache
+from src.services.notification_service import analytics_stream
+from src.services.chat_telemetry_service import chat_telemetry
+from src.services.analytics_cohort_service import cohort_analytics_service, PERIODS as COHORT_PERIODS
+from src.services.analytics_export_service import analytics_export_service, DATASETS as EXPORT_DATASETS, FORMATS as EXPORT_FORMATS
+from src.config import Config
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -10,20 +18,133 @@ def get_chat_analytics():
         user_id = request.args.get('user_id', type=int)
         days = request.args.get('days', 30, type=int)
         
-        data = analytics_service.get_chat_analytics(user_id, days)
+        data = analytics_cache.get_or_compute(
+            'chat', lambda: analytics_service.get_chat_analytics(user_id, days), user_id, days
+        )
         
         return jsonify(data), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to get chat analytics: {str(e)}'}), 500
 
+@analytics_bp.route('/analytics/daily', methods=['GET'])
+def get_daily_activity():
+    """Get per-day activity from the rollup tables"""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        days = request.args.get('days', 30, type=int)
+        
+        data = analytics_cache.get_or_compute(
+            'daily', lambda: analytics_service.get_daily_activity(user_id, days), user_id, days
+        )
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get daily activity: {str(e)}'}), 500
+
+@analytics_bp.route('/analytics/approximate', methods=['GET'])
+def get_approximate_metrics():
+    """Get sketch-based distinct counts and message-length percentiles"""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        days = request.args.get('days', 30, type=int)
+        
+        # Sketches only change when the rollup runs, so no write invalidation
+        data = analytics_cache.get_or_compute(
+            'approximate', lambda: analytics_service.get_approximate_metrics(user_id, days), user_id, days
+        )
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get approximate metrics: {str(e)}'}), 500
+
+@analytics_bp.route('/analytics/latency', methods=['GET'])
+def get_latency_analytics():
+    """Get per-stage chat latency percentiles from turn telemetry"""
+    try:
+        user_id = request.args.get('user_id', type=int)
+        days = request.args.get('days', 7, type=int)
+        
+        data = analytics_cache.get_or_compute(
+            'latency', lambda: analytics_service.get_latency_analytics(user_id, days), user_id, days
+        )
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get latency analytics: {str(e)}'}), 500
+
+@analytics_bp.route('/analytics/latency/recent', methods=['GET'])
+def get_recent_latency():
+    """Get live latency percentiles over the most recent chat turns (not yet flushed included)"""
+    data = chat_telemetry.recent(request.args.get('limit', type=int))
+    return jsonify({**data, 'recorder': chat_telemetry.get_stats()}), 200
+
+@analytics_bp.route('/analytics/cohorts', methods=['GET'])
+def get_cohort_analytics():
+    """Get cohort retention and rolling DAU/WAU/MAU from the daily rollup"""
+    period = request.args.get('period', 'week')
+    activity = request.args.get('activity', 'messages')
+    max_periods = request.args.get('max_periods', 12, type=int)
+    if period not in COHORT_PERIODS:
+        return jsonify({'error': 'period must be day, week or month'}), 400
+    if activity not in ('messages', 'any'):
+        return jsonify({'error': 'activity must be messages or any'}), 400
+    if not 1 <= max_periods <= 120:
+        return jsonify({'error': 'max_periods must be between 1 and 120'}), 400
+    
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    if start and end and start > end:
+        return jsonify({'error': 'start must not be after end'}), 400
+    
+    try:
+        # Rollups only move when the rollup job runs, so results are cached by range with a longer TTL
+        data = analytics_cache.get_or_compute(
+            'cohorts',
+            lambda: cohort_analytics_service.get_cohorts(start, end, period, activity, max_periods),
+            days=f"{start}:{end}:{period}:{activity}:{max_periods}",
+            ttl=Config.ANALYTICS_COHORT_TTL_SECONDS
+        )
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        print(f"Error computing cohort analytics: {e}")
+        return jsonify({'error': f'Failed to get cohort analytics: {str(e)}'}), 500
+
+@analytics_bp.route('/analytics/rollups/refresh', methods=['POST'])
+def refresh_rollups():
+    """Advance the daily rollups now instead of waiting for the scheduled job"""
+    try:
+        data = analytics_rollup_service.run()
+        
+        if 'error' in data:
+            return jsonify(data), 500
+        if 'skipped' in data:
+            return jsonify(data), 409
+        
+        return jsonify(data), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to refresh rollups: {str(e)}'}), 500
+
 @analytics_bp.route('/analytics/files', methods=['GET'])
 def get_file_analytics():
     """Get file analytics data"""
     try:
         user_id = request.args.get('user_id', type=int)
         
-        data = analytics_service.get_file_analytics(user_id)
+        data = analytics_cache.get_or_compute(
+            'files', lambda: analytics_service.get_file_analytics(user_id), user_id
+        )
         
         return jsonify(data), 200
         
@@ -36,7 +157,9 @@ def get_rag_analytics():
     try:
         user_id = request.args.get('user_id', type=int)
         
-        data = analytics_service.get_rag_analytics(user_id)
+        data = analytics_cache.get_or_compute(
+            'rag', lambda: analytics_service.get_rag_analytics(user_id), user_id
+        )
         
         return jsonify(data), 200
         
@@ -47,7 +170,9 @@ def get_rag_analytics():
 def get_system_analytics():
     """Get system analytics data"""
     try:
-        data = analytics_service.get_system_analytics()
+        data = analytics_cache.get_or_compute(
+            'system', analytics_service.get_system_analytics, ttl=Config.ANALYTICS_SNAPSHOT_TTL_SECONDS
+        )
         
         return jsonify(data), 200
         
@@ -60,13 +185,56 @@ def get_notion_analytics():
     try:
         user_id = request.args.get('user_id', type=int)
         
-        data = analytics_service.get_notion_analytics(user_id)
+        data = analytics_cache.get_or_compute(
+            'notion', lambda: analytics_service.get_notion_analytics(user_id), user_id
+        )
         
         return jsonify(data), 200
         
     except Exception as e:
         return jsonify({'error': f'Failed to get Notion analytics: {str(e)}'}), 500
 
+@analytics_bp.route('/analytics/cache/stats', methods=['GET'])
+def get_cache_stats():
+    """Get analytics cache hit/miss statistics"""
+    return jsonify(analytics_cache.get_stats()), 200
+
+@analytics_bp.route('/analytics/stream/stats', methods=['GET'])
+def get_stream_stats():
+    """Get live analytics subscription statistics"""
+    return jsonify(analytics_stream.get_stats()), 200
+
+@analytics_bp.route('/analytics/export/<dataset>', methods=['GET'])
+def export_analytics(dataset):
+    """Stream an analytics dataset as an Arrow IPC stream or a Parquet file"""
+    fmt = request.args.get('format', 'arrow')
+    if dataset not in EXPORT_DATASETS:
+        return jsonify({'error': f"dataset must be one of {', '.join(EXPORT_DATASETS)}"}), 400
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': 'format must be arrow or parquet'}), 400
+    if not analytics_export_service.available():
+        return jsonify({'error': 'Columnar export requires pyarrow'}), 501
+    
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        start = date.fromisoformat(start) if start else None
+        end = date.fromisoformat(end) if end else None
+    except ValueError:
+        return jsonify({'error': 'start and end must be YYYY-MM-DD dates'}), 400
+    
+    body = analytics_export_service.stream(
+        dataset, fmt, user_id=request.args.get('user_id', type=int), start=start, end=end
+    )
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt][0],
+        headers={
+            'Content-Disposition': f'attachment; filename="{analytics_export_service.filename(dataset, fmt)}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
 @analytics_bp.route('/analytics/mock', methods=['GET'])
 def get_mock_analytics():
     """Get mock analytics data for demo"""
@@ -0,0 +1,172 @@
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Dict, Any, Optional, Callable, Union
+from src.services import change_feed_service
+from src.config import Config
+
+# Endpoints whose results change when a row of each kind is inserted.
+# The system snapshot is left to its short TTL: it changes on every write.
+INVALIDATES = {
+    'chat_message': ('chat', 'daily'),
+    'uploaded_file': ('files', 'daily'),
+    'rag_document': ('rag', 'notion', 'daily')
+}
+
+class InMemoryCacheBackend:
+    """Per-process cache, bounded to max_entries with least-recently-used eviction.
+
+    Keys carry client-chosen ranges, so expiry on read alone would let a scan
+    of different ranges grow the cache without limit.
+    """
+
+    def __init__(self, max_entries=None):
+        self.max_entries = max_entries or Config.ANALYTICS_CACHE_MAX_ENTRIES
+        self._values = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._values[key]
+                return None
+            self._values.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: float):
+        now = time.monotonic()
+        with self._lock:
+            self._values[key] = (now + ttl, value)
+            self._values.move_to_end(key)
+            if len(self._values) > self.max_entries:
+                # Drop expired entries first, then the least recently used
+                for stale in [k for k, (expires_at, _) in self._values.items() if expires_at < now]:
+                    del self._values[stale]
+                while len(self._values) > self.max_entries:
+                    self._values.popitem(last=False)
+
+    def generation(self, scope: str) -> int:
+        with self._lock:
+            return self._generations.get(scope, 0)
+
+    def bump(self, scope: str):
+        with self._lock:
+            self._generations[scope] = self._generations.get(scope, 0) + 1
+            # Entries of older generations can never be read again
+            stale = [key for key in self._values if key.startswith(f"{scope}:")]
+            for key in stale:
+                del self._values[key]
+
+class RedisCacheBackend:
+    """Shares cached results and invalidations across workers"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str):
+        raw = self.client.get(f"analytics:value:{key}")
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key: str, value, ttl: float):
+        self.client.set(f"analytics:value:{key}", json.dumps(value, default=str), ex=max(int(ttl), 1))
+
+    def generation(self, scope: str) -> int:
+        return int(self.client.get(f"analytics:gen:{scope}") or 0)
+
+    def bump(self, scope: str):
+        self.client.incr(f"analytics:gen:{scope}")
+
+class AnalyticsCache:
+    """TTL cache for AnalyticsService results keyed by (endpoint, user_id, days).
+
+    Concurrent misses for the same key are coalesced onto one computation.
+    Committed inserts of chat messages, uploads and RAG documents bump the
+    generation of the affected (endpoint, user) scopes and of the all-users
+    scope, so dashboards see new data on their next poll without waiting out
+    the TTL. Uses Redis when ANALYTICS_CACHE_REDIS_URL is set.
+    """
+
+    def __init__(self, backend=None, ttl=None):
+        self.backend = backend or self._default_backend()
+        self.ttl = ttl or Config.ANALYTICS_CACHE_TTL_SECONDS
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'invalidations': 0}
+        change_feed_service.register(self.on_changes)
+
+    def _default_backend(self):
+        if Config.ANALYTICS_CACHE_REDIS_URL:
+            try:
+                return RedisCacheBackend(Config.ANALYTICS_CACHE_REDIS_URL)
+            except Exception as e:
+                print(f"Redis analytics cache unavailable, using in-process cache: {e}")
+        return InMemoryCacheBackend()
+
+    def _scope(self, endpoint: str, user_id: Optional[int]) -> str:
+        return f"{endpoint}:{user_id if user_id else 'all'}"
+
+    def get_or_compute(self, endpoint: str, compute: Callable[[], Any], user_id: Optional[int] = None,
+                       days: Optional[Union[int, str]] = None, ttl: Optional[float] = None):
+        """Cached compute(); `days` is the range part of the key (a day count or any range string)"""
+        scope = self._scope(endpoint, user_id)
+        key = f"{scope}:{self.backend.generation(scope)}:{days}"
+
+        value = self.backend.get(key)
+        if value is not None:
+            self.stats['hits'] += 1
+            return value
+
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+        if not leader:
+            self.stats['coalesced'] += 1
+            return future.result()
+
+        self.stats['misses'] += 1
+        try:
+            value = compute()
+            self.backend.set(key, value, ttl or self.ttl)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def invalidate(self, endpoint: str, user_id: Optional[int] = None):
+        self.backend.bump(self._scope(endpoint, None))
+        if user_id:
+            self.backend.bump(self._scope(endpoint, user_id))
+        self.stats['invalidations'] += 1
+
+    def on_changes(self, changes):
+        """Change feed listener: invalidate each affected scope once per commit"""
+        scopes = set()
+        for change in changes:
+            for endpoint in INVALIDATES.get(change['kind'], ()):
+                scopes.add((endpoint, change.get('user_id')))
+        for endpoint, user_id in scopes:
+            try:
+                self.invalidate(endpoint, user_id)
+            except Exception as e:
+                print(f"Error invalidating analytics cache: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'backend': type(self.backend).__name__, 'ttl': self.ttl}
+
+# Create global instance
+analytics_cache = AnalyticsCache()
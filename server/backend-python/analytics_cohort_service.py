@@ -0,0 +1,211 @@
+from datetime import date, timedelta
+from typing import Dict, Any, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, or_
+from src.models.user import db
+from src.models.enhanced_models import DailyUserActivity
+from src.services.analytics_rollup_service import as_date, get_watermark
+
+PERIODS = ('day', 'week', 'month')
+ROLLING_WINDOWS = {'dau': 1, 'wau': 7, 'mau': 28}
+# Days before the range that the longest window reaches back over
+LOOKBACK_DAYS = max(ROLLING_WINDOWS.values()) - 1
+
+def _day_numbers(days) -> np.ndarray:
+    """Dates to integer days since the epoch"""
+    return np.array([np.datetime64(as_date(d), 'D') for d in days], dtype='datetime64[D]').astype(np.int64)
+
+def _period_numbers(day_numbers: np.ndarray, period: str) -> np.ndarray:
+    """Integer period index for each day number (weeks start on Monday)"""
+    if period == 'day':
+        return day_numbers
+    if period == 'week':
+        # 1970-01-01 was a Thursday; shift so periods begin on Monday
+        return (day_numbers + 3) // 7
+    return day_numbers.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+def _period_start(number: int, period: str) -> str:
+    if period == 'day':
+        return str(np.datetime64(int(number), 'D'))
+    if period == 'week':
+        return str(np.datetime64(int(number) * 7 - 3, 'D'))
+    return str(np.datetime64(int(number), 'M').astype('datetime64[D]'))
+
+def rolling_distinct(user_codes: np.ndarray, day_index: np.ndarray, n_days: int, window: int) -> np.ndarray:
+    """Distinct users active in each trailing `window` days, in O(rows).
+
+    A user active on day t counts towards the windows ending on t..t+window-1;
+    a later active day only extends that span past the previous one, so each
+    user is counted once per window.
+    """
+    order = np.lexsort((day_index, user_codes))
+    users, days = user_codes[order], day_index[order]
+    previous = np.full(len(days), -window, dtype=np.int64)
+    same_user = np.r_[False, users[1:] == users[:-1]]
+    previous[same_user] = days[np.flatnonzero(same_user) - 1]
+
+    starts = np.maximum(days, previous + window)
+    ends = np.minimum(days + window - 1, n_days - 1)
+    valid = starts <= ends
+    diff = np.zeros(n_days + 1, dtype=np.int64)
+    np.add.at(diff, starts[valid], 1)
+    np.add.at(diff, ends[valid] + 1, -1)
+    return np.cumsum(diff[:-1])
+
+class CohortAnalyticsService:
+    """Retention matrices and rolling activity from the daily user rollup.
+
+    Per-user-per-day activity for the range (plus LOOKBACK_DAYS before it, so
+    the first WAU/MAU values count users active just before the range) is
+    loaded once as integer arrays (day number, user code, messages) and every
+    metric is computed with vectorized NumPy/pandas operations; no raw chat
+    messages are read. A
+    user's cohort is the period of their first active day in the whole rollup,
+    so users who joined before the range are not counted as new.
+    """
+
+    def _activity_filter(self, activity: str):
+        if activity == 'any':
+            return or_(
+                DailyUserActivity.messages > 0,
+                DailyUserActivity.uploads > 0,
+                DailyUserActivity.rag_documents > 0
+            )
+        return DailyUserActivity.messages > 0
+
+    def _load(self, start: date, end: date, activity: str):
+        """(first-seen day numbers by user, activity rows from start to end) as arrays"""
+        active = self._activity_filter(activity)
+        first_seen = db.session.query(DailyUserActivity.user_id, func.min(DailyUserActivity.day))\
+            .filter(active)\
+            .group_by(DailyUserActivity.user_id)\
+            .having(func.min(DailyUserActivity.day) <= end)\
+            .all()
+
+        rows = db.session.query(DailyUserActivity.day, DailyUserActivity.user_id, DailyUserActivity.messages)\
+            .filter(active, DailyUserActivity.day >= start, DailyUserActivity.day <= end)\
+            .all()
+
+        first = pd.Series(
+            _day_numbers([d for _, d in first_seen]),
+            index=[user_id for user_id, _ in first_seen],
+            dtype=np.int64
+        )
+        frame = pd.DataFrame({
+            'day': _day_numbers([r[0] for r in rows]),
+            'user_id': np.array([r[1] for r in rows], dtype=np.int64),
+            'messages': np.array([r[2] or 0 for r in rows], dtype=np.int64)
+        })
+        return first, frame
+
+    def retention(self, first: pd.Series, frame: pd.DataFrame, start_day: int, end_day: int, period: str,
+                  max_periods: int) -> Dict[str, Any]:
+        """Cohort sizes and the share of each cohort active N periods later"""
+        frame = frame[frame['user_id'].map(first).fillna(-1).to_numpy() >= start_day]
+        if frame.empty:
+            return {'cohorts': [], 'periods': [], 'matrix': [], 'counts': []}
+
+        cohort = _period_numbers(frame['user_id'].map(first).to_numpy(dtype=np.int64), period)
+        offset = _period_numbers(frame['day'].to_numpy(), period) - cohort
+        keep = (offset >= 0) & (offset < max_periods)
+
+        # One count per (cohort, offset, user), however many days they were active
+        triples = np.unique(np.stack([cohort[keep], offset[keep], frame['user_id'].to_numpy()[keep]]), axis=1)
+        cohorts, cohort_index = np.unique(triples[0], return_inverse=True)
+        counts = np.zeros((len(cohorts), max_periods), dtype=np.int64)
+        np.add.at(counts, (cohort_index, triples[1]), 1)
+
+        sizes = counts[:, 0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            matrix = np.where(sizes[:, None] > 0, counts / sizes[:, None], 0.0)
+        # Cells for periods after the range end are unknown; earlier empty periods are real zeros
+        last_period = _period_numbers(np.array([end_day], dtype=np.int64), period)[0]
+        elapsed = last_period - cohorts
+        known = np.arange(max_periods)[None, :] <= elapsed[:, None]
+
+        return {
+            'cohorts': [
+                {'cohort': _period_start(c, period), 'size': int(size)}
+                for c, size in zip(cohorts, sizes)
+            ],
+            'periods': list(range(max_periods)),
+            'matrix': [
+                [round(float(v), 4) if ok else None for v, ok in zip(row, known_row)]
+                for row, known_row in zip(matrix, known)
+            ],
+            'counts': [
+                [int(v) if ok else None for v, ok in zip(row, known_row)]
+                for row, known_row in zip(counts, known)
+            ]
+        }
+
+    def rolling_activity(self, frame: pd.DataFrame, start_day: int, n_days: int,
+                         lookback: int = LOOKBACK_DAYS) -> Dict[str, Any]:
+        """DAU/WAU/MAU, stickiness and 7-day messages per weekly active user, per day.
+
+        `frame` may start `lookback` days before start_day; those days feed the
+        trailing windows but are not reported.
+        """
+        if frame.empty:
+            return {'days': []}
+
+        total_days = n_days + lookback
+        day_index = frame['day'].to_numpy() - (start_day - lookback)
+        user_codes, _ = pd.factorize(frame['user_id'])
+        series = {
+            name: rolling_distinct(user_codes, day_index, total_days, window)[lookback:]
+            for name, window in ROLLING_WINDOWS.items()
+        }
+        messages = np.bincount(day_index, weights=frame['messages'].to_numpy(), minlength=total_days)
+        messages_7d = pd.Series(messages).rolling(7, min_periods=1).sum().to_numpy()[lookback:]
+        messages = messages[lookback:]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            stickiness = np.where(series['mau'] > 0, series['dau'] / series['mau'], 0.0)
+            per_user = np.where(series['wau'] > 0, messages_7d / series['wau'], 0.0)
+
+        dates = np.arange(start_day, start_day + n_days).astype('datetime64[D]')
+        return {
+            'days': [
+                {
+                    'date': str(dates[i]),
+                    'dau': int(series['dau'][i]),
+                    'wau': int(series['wau'][i]),
+                    'mau': int(series['mau'][i]),
+                    'stickiness': round(float(stickiness[i]), 4),
+                    'messages': int(messages[i]),
+                    'avg_messages_per_active_user_7d': round(float(per_user[i]), 2)
+                } for i in range(n_days)
+            ]
+        }
+
+    def get_cohorts(self, start: Optional[date] = None, end: Optional[date] = None, period: str = 'week',
+                    activity: str = 'messages', max_periods: int = 12) -> Dict[str, Any]:
+        """Retention matrix and rolling activity for [start, end] (defaults to the last 12 weeks).
+
+        Errors propagate so that a failed computation is not cached.
+        """
+        end = end or date.today()
+        start = start or end - timedelta(weeks=12)
+        if start > end:
+            raise ValueError('start must not be after end')
+
+        first, frame = self._load(start - timedelta(days=LOOKBACK_DAYS), end, activity)
+        start_day = int(np.datetime64(start, 'D').astype(np.int64))
+        end_day = int(np.datetime64(end, 'D').astype(np.int64))
+        n_days = (end - start).days + 1
+
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'period': period,
+            'activity': activity,
+            'retention': self.retention(first, frame, start_day, end_day, period, max_periods),
+            'rolling': self.rolling_activity(frame, start_day, n_days),
+            # Rollups trail the source tables by up to one rollup interval
+            'watermark': get_watermark('chat_messages')
+        }
+
+# Create global instance
+cohort_analytics_service = CohortAnalyticsService()
@@ -0,0 +1,172 @@
+from datetime import datetime, date, timedelta
+from itertools import islice
+from typing import Iterator, Optional, List
+from src.models.user import db
+from src.models.enhanced_models import UploadedFile, RAGDocument, DailyUserActivity, DailySessionActivity
+from src.services.analytics_rollup_service import get_watermark
+from src.config import Config
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATS = {
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet')
+}
+
+# dataset -> (model, date column, rollup watermark, [(field, column, arrow type)])
+DATASETS = {
+    'daily_activity': (DailyUserActivity, DailyUserActivity.day, 'chat_messages', [
+        ('day', DailyUserActivity.day, 'date32'),
+        ('user_id', DailyUserActivity.user_id, 'int64'),
+        ('messages', DailyUserActivity.messages, 'int64'),
+        ('sessions', DailyUserActivity.sessions, 'int64'),
+        ('uploads', DailyUserActivity.uploads, 'int64'),
+        ('upload_bytes', DailyUserActivity.upload_bytes, 'int64'),
+        ('rag_documents', DailyUserActivity.rag_documents, 'int64')
+    ]),
+    'session_activity': (DailySessionActivity, DailySessionActivity.day, 'chat_messages', [
+        ('day', DailySessionActivity.day, 'date32'),
+        ('session_id', DailySessionActivity.session_id, 'int64'),
+        ('user_id', DailySessionActivity.user_id, 'int64'),
+        ('messages', DailySessionActivity.messages, 'int64')
+    ]),
+    'uploads': (UploadedFile, UploadedFile.created_at, None, [
+        ('id', UploadedFile.id, 'int64'),
+        ('user_id', UploadedFile.user_id, 'int64'),
+        ('file_type', UploadedFile.file_type, 'string'),
+        ('file_size', UploadedFile.file_size, 'int64'),
+        ('is_processed', UploadedFile.is_processed, 'bool'),
+        ('created_at', UploadedFile.created_at, 'timestamp')
+    ]),
+    'rag_sources': (RAGDocument, RAGDocument.created_at, None, [
+        ('id', RAGDocument.id, 'int64'),
+        ('user_id', RAGDocument.user_id, 'int64'),
+        ('source_type', RAGDocument.source_type, 'string'),
+        ('source_id', RAGDocument.source_id, 'string'),
+        ('title', RAGDocument.title, 'string'),
+        ('created_at', RAGDocument.created_at, 'timestamp'),
+        ('updated_at', RAGDocument.updated_at, 'timestamp')
+    ])
+}
+
+class _ArrowSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+class AnalyticsExportService:
+    """Streams analytics datasets as Arrow IPC streams or Parquet files.
+
+    Rows are read as column tuples through a server-side cursor and converted
+    to record batches of ANALYTICS_EXPORT_BATCH rows; each batch is serialized
+    and yielded before the next one is fetched, so the worker holds at most one
+    batch regardless of the date range. Parquet files get one row group per
+    batch. The rollup datasets reflect rows up to the rollup watermark, which
+    is recorded in the schema metadata.
+    """
+
+    def __init__(self, batch_size=None):
+        self.batch_size = batch_size or Config.ANALYTICS_EXPORT_BATCH
+
+    def available(self) -> bool:
+        return pa is not None
+
+    def _arrow_type(self, name: str):
+        return {
+            'int64': pa.int64(),
+            'string': pa.string(),
+            'bool': pa.bool_(),
+            'date32': pa.date32(),
+            'timestamp': pa.timestamp('us')
+        }[name]
+
+    def schema(self, dataset: str):
+        model, _, watermark, fields = DATASETS[dataset]
+        metadata = {
+            'dataset': dataset,
+            'exported_at': datetime.utcnow().isoformat()
+        }
+        if watermark:
+            metadata['rollup_watermark'] = str(get_watermark(watermark))
+        return pa.schema([(name, self._arrow_type(kind)) for name, _, kind in fields], metadata=metadata)
+
+    def _rows(self, dataset: str, user_id: Optional[int], start: Optional[date], end: Optional[date]) -> Iterator[tuple]:
+        model, date_column, _, fields = DATASETS[dataset]
+        query = db.session.query(*[column for _, column, _ in fields])
+        if user_id:
+            query = query.filter(model.user_id == user_id)
+        if start:
+            query = query.filter(date_column >= start)
+        if end:
+            query = query.filter(date_column < end + timedelta(days=1))
+        order = [date_column.asc()] + [column.asc() for column in model.__mapper__.primary_key]
+        query = query.order_by(*order).execution_options(stream_results=True, yield_per=self.batch_size)
+        return iter(query)
+
+    def _batches(self, schema, rows: Iterator[tuple]):
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                return
+            columns = list(zip(*chunk))
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+                schema=schema
+            )
+
+    def stream(self, dataset: str, fmt: str = 'arrow', user_id: Optional[int] = None,
+               start: Optional[date] = None, end: Optional[date] = None) -> Iterator[bytes]:
+        """Yield the export body batch by batch"""
+        schema = self.schema(dataset)
+        rows = self._rows(dataset, user_id, start, end)
+        sink = _ArrowSink()
+        output = pa.PythonFile(sink, mode='w')
+
+        if fmt == 'parquet':
+            writer = pq.ParquetWriter(output, schema, compression='zstd')
+            write = lambda batch: writer.write_table(pa.Table.from_batches([batch], schema=schema))
+        else:
+            writer = pa.ipc.new_stream(output, schema)
+            write = writer.write_batch
+
+        try:
+            for batch in self._batches(schema, rows):
+                write(batch)
+                yield sink.drain()
+        finally:
+            writer.close()
+        yield sink.drain()
+
+    def filename(self, dataset: str, fmt: str) -> str:
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        return f"{dataset}-{stamp}.{FORMATS[fmt][1]}"
+
+# Create global instance
+analytics_export_service = AnalyticsExportService()
@@ -0,0 +1,277 @@
+import atexit
+import threading
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional
+from sqlalchemy import func
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage
+from src.models.enhanced_models import (
+    UploadedFile, RAGDocument, DailyUserActivity, DailySessionActivity, DailySketch, RollupWatermark
+)
+from src.services.analytics_sketches import HyperLogLog, DDSketch
+from src.config import Config
+
+def as_date(value) -> date:
+    """func.date() yields a string on SQLite and a date on Postgres"""
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def get_watermark(name: str) -> int:
+    watermark = RollupWatermark.query.get(name)
+    return watermark.last_id if watermark else 0
+
+class AnalyticsRollupService:
+    """Folds new chat messages, uploads and RAG documents into daily rollups.
+
+    Each source table has a watermark (the highest id already counted). A run
+    reads only rows past the watermark, adds their per-day, per-user counts to
+    the rollup tables and advances the watermark in the same transaction, so
+    every row is counted exactly once. Rows newer than ANALYTICS_ROLLUP_LAG_SECONDS
+    are left for the next run so that slower concurrent inserts with lower ids
+    are not skipped. Deletions are not subtracted.
+
+    Runs never overlap: a process lock serializes the scheduled job and manual
+    refreshes, and each batch locks its watermark row (SELECT ... FOR UPDATE)
+    so runs in other workers wait and then continue from the advanced mark.
+    
+    DailySketch rows hold HyperLogLogs of active users and sessions and a
+    DDSketch of message lengths, per user and for all users (user_id 0), which
+    merge across any range of days. They are rolled from chat messages under
+    their own watermark, so a database whose counts were rolled up before
+    sketches existed backfills them from the first message.
+
+    start() runs the rollup once at boot and then every ANALYTICS_ROLLUP_MINUTES
+    on a background thread, so the tail past the watermark stays small.
+    """
+
+    def __init__(self, batch_size=None, interval_minutes=None):
+        self.batch_size = batch_size or Config.ANALYTICS_ROLLUP_BATCH
+        self.interval = (interval_minutes or Config.ANALYTICS_ROLLUP_MINUTES) * 60
+        self._run_lock = threading.Lock()
+        self.app = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        if self.running:
+            return
+        self.app = app
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._loop, name='analytics-rollup', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join(timeout=10)
+
+    def _loop(self):
+        while True:
+            with self.app.app_context():
+                result = self.run()
+            if 'error' in result:
+                print(f"Analytics rollup failed: {result['error']}")
+            if self._stopped.wait(self.interval):
+                return
+
+    def _watermark(self, name: str) -> RollupWatermark:
+        """Watermark row, locked until the batch commits"""
+        watermark = db.session.get(RollupWatermark, name, with_for_update=True, populate_existing=True)
+        if not watermark:
+            watermark = RollupWatermark(name=name, last_id=0)
+            db.session.add(watermark)
+        return watermark
+
+    def _upper_bound(self, model, ts_column, after_id: int, cutoff: datetime) -> Optional[int]:
+        """Highest id of the next batch of settled rows past the watermark"""
+        batch = db.session.query(model.id)\
+            .filter(model.id > after_id, ts_column <= cutoff)\
+            .order_by(model.id.asc())\
+            .limit(self.batch_size)\
+            .subquery()
+        return db.session.query(func.max(batch.c.id)).scalar()
+
+    def _existing(self, model, key_column, keys) -> Dict[tuple, Any]:
+        """Load rollup rows for (day, key) pairs in one query"""
+        if not keys:
+            return {}
+        rows = model.query.filter(
+            model.day.in_({day for day, _ in keys}),
+            key_column.in_({key for _, key in keys})
+        ).all()
+        return {(row.day, getattr(row, key_column.key)): row for row in rows}
+
+    def _user_rows(self, keys) -> Dict[tuple, DailyUserActivity]:
+        rows = self._existing(DailyUserActivity, DailyUserActivity.user_id, keys)
+        for day, user_id in keys:
+            if (day, user_id) not in rows:
+                rows[(day, user_id)] = DailyUserActivity(
+                    day=day, user_id=user_id, messages=0, sessions=0,
+                    uploads=0, upload_bytes=0, rag_documents=0
+                )
+                db.session.add(rows[(day, user_id)])
+        return rows
+
+    def _roll_messages(self, cutoff: datetime) -> bool:
+        watermark = self._watermark('chat_messages')
+        upper = self._upper_bound(ChatMessage, ChatMessage.timestamp, watermark.last_id or 0, cutoff)
+        if upper is None:
+            db.session.rollback()
+            return False
+
+        day = func.date(ChatMessage.timestamp)
+        groups = db.session.query(day, ChatSession.user_id, ChatMessage.session_id, func.count())\
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+            .filter(ChatMessage.id > (watermark.last_id or 0), ChatMessage.id <= upper)\
+            .group_by(day, ChatSession.user_id, ChatMessage.session_id)\
+            .all()
+
+        groups = [(as_date(d), user_id, session_id, count) for d, user_id, session_id, count in groups]
+        user_rows = self._user_rows({(d, user_id) for d, user_id, _, _ in groups})
+        session_rows = self._existing(
+            DailySessionActivity, DailySessionActivity.session_id, {(d, session_id) for d, _, session_id, _ in groups}
+        )
+        for d, user_id, session_id, count in groups:
+            session_row = session_rows.get((d, session_id))
+            if not session_row:
+                session_row = DailySessionActivity(day=d, session_id=session_id, user_id=user_id, messages=0)
+                session_rows[(d, session_id)] = session_row
+                db.session.add(session_row)
+                user_rows[(d, user_id)].sessions += 1
+            session_row.messages += count
+            user_rows[(d, user_id)].messages += count
+
+        watermark.last_id = upper
+        db.session.commit()
+        return True
+
+    def _roll_message_sketches(self, cutoff: datetime) -> bool:
+        watermark = self._watermark('chat_message_sketches')
+        upper = self._upper_bound(ChatMessage, ChatMessage.timestamp, watermark.last_id or 0, cutoff)
+        if upper is None:
+            db.session.rollback()
+            return False
+
+        day = func.date(ChatMessage.timestamp)
+        in_batch = (ChatMessage.id > (watermark.last_id or 0), ChatMessage.id <= upper)
+        groups = db.session.query(day, ChatSession.user_id, ChatMessage.session_id)\
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+            .filter(*in_batch)\
+            .group_by(day, ChatSession.user_id, ChatMessage.session_id)\
+            .all()
+        length = func.length(ChatMessage.content)
+        lengths = db.session.query(day, ChatSession.user_id, length, func.count())\
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+            .filter(*in_batch)\
+            .group_by(day, ChatSession.user_id, length)\
+            .all()
+        self._roll_sketches(
+            [(as_date(d), user_id, session_id) for d, user_id, session_id in groups],
+            [(as_date(d), user_id, n, count) for d, user_id, n, count in lengths]
+        )
+
+        watermark.last_id = upper
+        db.session.commit()
+        return True
+
+    def _roll_sketches(self, groups, lengths):
+        """Merge a batch's (day, user, session) groups and message lengths into the daily sketches"""
+        keys = {(d, user_id) for d, user_id, _ in groups} | {(d, 0) for d, _, _ in groups}
+        rows = self._existing(DailySketch, DailySketch.user_id, keys)
+        sketches = {}
+        for key in keys:
+            row = rows.get(key)
+            sketches[key] = (
+                HyperLogLog.from_bytes(row.users if row else None),
+                HyperLogLog.from_bytes(row.sessions if row else None),
+                DDSketch.from_bytes(row.message_lengths if row else None)
+            )
+
+        for d, user_id, session_id in groups:
+            sketches[(d, user_id)][1].add(session_id)
+            sketches[(d, 0)][0].add(user_id)
+            sketches[(d, 0)][1].add(session_id)
+        for d, user_id, n, count in lengths:
+            sketches[(d, user_id)][2].add(n or 0, count)
+            sketches[(d, 0)][2].add(n or 0, count)
+
+        for (d, user_id), (users, sessions, message_lengths) in sketches.items():
+            row = rows.get((d, user_id))
+            if not row:
+                row = DailySketch(day=d, user_id=user_id)
+                db.session.add(row)
+            row.users = users.to_bytes() if user_id == 0 else None
+            row.sessions = sessions.to_bytes()
+            row.message_lengths = message_lengths.to_bytes()
+
+    def _roll_simple(self, name: str, model, user_counts, cutoff: datetime) -> bool:
+        """Roll a table whose rows carry user_id and created_at directly"""
+        watermark = self._watermark(name)
+        upper = self._upper_bound(model, model.created_at, watermark.last_id or 0, cutoff)
+        if upper is None:
+            db.session.rollback()
+            return False
+
+        day = func.date(model.created_at)
+        groups = db.session.query(day, model.user_id, *user_counts.values())\
+            .filter(model.id > (watermark.last_id or 0), model.id <= upper)\
+            .group_by(day, model.user_id)\
+            .all()
+
+        user_rows = self._user_rows({(as_date(row[0]), row[1]) for row in groups})
+        for row in groups:
+            target = user_rows[(as_date(row[0]), row[1])]
+            for field, value in zip(user_counts.keys(), row[2:]):
+                setattr(target, field, (getattr(target, field) or 0) + (value or 0))
+
+        watermark.last_id = upper
+        db.session.commit()
+        return True
+
+    def run(self) -> Dict[str, Any]:
+        """Catch every rollup up to its source table (skipped if a run is already in progress)"""
+        if not self._run_lock.acquire(blocking=False):
+            return {'skipped': 'rollup already running'}
+        try:
+            return self._run()
+        finally:
+            self._run_lock.release()
+
+    def _run(self) -> Dict[str, Any]:
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.ANALYTICS_ROLLUP_LAG_SECONDS)
+        sources = {
+            'chat_messages': lambda: self._roll_messages(cutoff),
+            'chat_message_sketches': lambda: self._roll_message_sketches(cutoff),
+            'uploaded_files': lambda: self._roll_simple('uploaded_files', UploadedFile, {
+                'uploads': func.count(),
+                'upload_bytes': func.sum(UploadedFile.file_size)
+            }, cutoff),
+            'rag_documents': lambda: self._roll_simple('rag_documents', RAGDocument, {
+                'rag_documents': func.count()
+            }, cutoff)
+        }
+
+        result = {}
+        try:
+            for name, roll in sources.items():
+                batches = 0
+                while roll():
+                    batches += 1
+                result[name] = {'batches': batches, 'watermark': get_watermark(name)}
+            return result
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error updating analytics rollups: {e}")
+            return {'error': str(e), **result}
+
+# Create global instance
+analytics_rollup_service = AnalyticsRollupService()
@@ -2,15 +2,25 @@ import json
 from datetime import datetime, timedelta
 import pandas as pd
 import numpy as np
-from sqlalchemy import func, desc, and_, text
+from sqlalchemy import func, desc, and_, text, select
 from src.models.user import db
 from src.models.chat import ChatSession, ChatMessage
 from src.models.enhanced_models import (
     UploadedFile, RAGDocument, UserProfile, 
-    WorkItem, Board, GraphNode, GraphEdge
+    WorkItem, Board, GraphNode, GraphEdge,
+    DailyUserActivity, DailySessionActivity, DailySketch, RollupWatermark, ChatTurnTelemetry
 )
+from src.services.analytics_rollup_service import as_date, get_watermark
+from src.services.analytics_sketches import HyperLogLog, DDSketch
+from src.services.row_count_service import row_count_columns
 
 class AnalyticsService:
+    """Analytics queries for the dashboard routes.
+
+    Errors are logged and re-raised rather than answered with zero-filled
+    results, so the analytics cache never stores a failure.
+    """
+
     def __init__(self):
         pass
     
@@ -19,40 +29,61 @@ class AnalyticsService:
         try:
             # Calculate date range
             end_date = datetime.utcnow()
-            start_date = end_date - timedelta(days=days)
-            
-            # Base query
-            query = db.session.query(
-                func.date(ChatMessage.created_at).label('date'),
-                func.count().label('message_count')
-            ).filter(ChatMessage.created_at >= start_date)
+            start_day = (end_date - timedelta(days=days)).date()
             
-            # Filter by user if specified
+            # Daily counts come from the rollup (O(days) rows) ...
+            rollup_query = db.session.query(
+                DailyUserActivity.day,
+                func.sum(DailyUserActivity.messages)
+            ).filter(DailyUserActivity.day >= start_day)
             if user_id:
-                query = query.join(ChatSession).filter(ChatSession.user_id == user_id)
-            
-            # Group by date and get results
-            results = query.group_by(func.date(ChatMessage.created_at))\
-                          .order_by(func.date(ChatMessage.created_at))\
-                          .all()
+                rollup_query = rollup_query.filter(DailyUserActivity.user_id == user_id)
+            daily = {}
+            for day, count in rollup_query.group_by(DailyUserActivity.day).all():
+                daily[as_date(day)] = int(count or 0)
+            
+            # ... plus messages written since the last rollup run (past the watermark),
+            # cut at the same midnight so the first day does not jump when a rollup runs
+            watermark = get_watermark('chat_messages')
+            tail_query = db.session.query(
+                func.date(ChatMessage.timestamp),
+                func.count()
+            ).filter(ChatMessage.id > watermark, ChatMessage.timestamp >= datetime.combine(start_day, datetime.min.time()))
+            if user_id:
+                tail_query = tail_query.join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+                                       .filter(ChatSession.user_id == user_id)
+            for day, count in tail_query.group_by(func.date(ChatMessage.timestamp)).all():
+                daily[as_date(day)] = daily.get(as_date(day), 0) + count
             
             # Convert to list of dicts
-            data = [{'date': str(r.date), 'message_count': r.message_count} for r in results]
+            data = [{'date': str(day), 'message_count': count} for day, count in sorted(daily.items())]
             
             # Get total counts
-            total_sessions = ChatSession.query.count()
-            total_messages = ChatMessage.query.count()
+            session_query = ChatSession.query
+            total_query = db.session.query(func.sum(DailyUserActivity.messages))
+            if user_id:
+                session_query = session_query.filter(ChatSession.user_id == user_id)
+                total_query = total_query.filter(DailyUserActivity.user_id == user_id)
+            total_sessions = session_query.count()
+            tail_total = ChatMessage.query.filter(ChatMessage.id > watermark)
+            if user_id:
+                tail_total = tail_total.join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+                                       .filter(ChatSession.user_id == user_id)
+            total_messages = int(total_query.scalar() or 0) + tail_total.count()
             
             # Get average messages per session
             avg_messages = total_messages / total_sessions if total_sessions > 0 else 0
             
-            # Get most active sessions
-            active_sessions = db.session.query(
+            # Get most active sessions (from per-session daily rollups)
+            active_query = db.session.query(
                 ChatSession.id,
                 ChatSession.title,
-                func.count(ChatMessage.id).label('message_count')
-            ).join(ChatMessage)\
-             .group_by(ChatSession.id)\
+                func.sum(DailySessionActivity.messages).label('message_count')
+            ).join(DailySessionActivity, DailySessionActivity.session_id == ChatSession.id)
+            if user_id:
+                active_query = active_query.filter(DailySessionActivity.user_id == user_id)
+            active_sessions = active_query\
+             .group_by(ChatSession.id, ChatSession.title)\
              .order_by(desc('message_count'))\
              .limit(5)\
              .all()
@@ -61,7 +92,7 @@ class AnalyticsService:
                 {
                     'session_id': s.id,
                     'title': s.title,
-                    'message_count': s.message_count
+                    'message_count': int(s.message_count or 0)
                 } for s in active_sessions
             ]
             
@@ -75,13 +106,145 @@ class AnalyticsService:
             
         except Exception as e:
             print(f"Error getting chat analytics: {e}")
+            raise
+    
+    def get_daily_activity(self, user_id=None, days=30):
+        """Per-day messages, active sessions, uploads, bytes and RAG documents from the rollup"""
+        try:
+            start_day = (datetime.utcnow() - timedelta(days=days)).date()
+            query = db.session.query(
+                DailyUserActivity.day,
+                func.sum(DailyUserActivity.messages).label('messages'),
+                func.sum(DailyUserActivity.sessions).label('sessions'),
+                func.sum(DailyUserActivity.uploads).label('uploads'),
+                func.sum(DailyUserActivity.upload_bytes).label('upload_bytes'),
+                func.sum(DailyUserActivity.rag_documents).label('rag_documents')
+            ).filter(DailyUserActivity.day >= start_day)
+            
+            # Filter by user if specified
+            if user_id:
+                query = query.filter(DailyUserActivity.user_id == user_id)
+            
+            results = query.group_by(DailyUserActivity.day)\
+                          .order_by(DailyUserActivity.day)\
+                          .all()
+            
+            return {
+                'days': [
+                    {
+                        'date': str(as_date(r.day)),
+                        'messages': int(r.messages or 0),
+                        'sessions': int(r.sessions or 0),
+                        'uploads': int(r.uploads or 0),
+                        'upload_bytes': int(r.upload_bytes or 0),
+                        'rag_documents': int(r.rag_documents or 0)
+                    } for r in results
+                ],
+                'watermarks': {
+                    name: get_watermark(name)
+                    for name in ('chat_messages', 'uploaded_files', 'rag_documents')
+                }
+            }
+            
+        except Exception as e:
+            print(f"Error getting daily activity: {e}")
+            raise
+    
+    def get_approximate_metrics(self, user_id=None, days=30):
+        """Distinct users/sessions and message-length percentiles merged from daily sketches"""
+        try:
+            start_day = (datetime.utcnow() - timedelta(days=days)).date()
+            rows = DailySketch.query.filter(
+                DailySketch.user_id == (user_id or 0),
+                DailySketch.day >= start_day
+            ).order_by(DailySketch.day).all()
+            
+            users = HyperLogLog()
+            sessions = HyperLogLog()
+            lengths = DDSketch()
+            daily = []
+            for row in rows:
+                day_users = HyperLogLog.from_bytes(row.users)
+                day_sessions = HyperLogLog.from_bytes(row.sessions)
+                users.merge(day_users)
+                sessions.merge(day_sessions)
+                lengths.merge(DDSketch.from_bytes(row.message_lengths))
+                daily.append({
+                    'date': str(as_date(row.day)),
+                    'active_users': day_users.count() if not user_id else None,
+                    'active_sessions': day_sessions.count()
+                })
+            
             return {
-                'daily_activity': [],
-                'total_sessions': 0,
-                'total_messages': 0,
-                'avg_messages_per_session': 0,
-                'most_active_sessions': []
+                'distinct_users': users.count() if not user_id else None,
+                'distinct_sessions': sessions.count(),
+                'message_length': {'count': lengths.count, **lengths.percentiles()},
+                'daily': daily,
+                'watermark': get_watermark('chat_message_sketches')
             }
+            
+        except Exception as e:
+            print(f"Error getting approximate metrics: {e}")
+            raise
+    
+    def get_latency_analytics(self, user_id=None, days=7):
+        """Per-stage latency percentiles, daily p50/p95 and token usage from chat turn telemetry"""
+        try:
+            start_date = datetime.utcnow() - timedelta(days=days)
+            stages = ['embed', 'search', 'hydrate', 'retrieval', 'llm', 'first_token', 'db_commit', 'total']
+            columns = [getattr(ChatTurnTelemetry, f"{name}_ms") for name in stages]
+            
+            filters = [ChatTurnTelemetry.created_at >= start_date]
+            if user_id:
+                filters.append(ChatTurnTelemetry.user_id == user_id)
+            
+            # One pass over a server-side cursor into mergeable sketches (constant memory)
+            sketches = {name: DDSketch() for name in stages}
+            daily = {}
+            rows = db.session.query(func.date(ChatTurnTelemetry.created_at), *columns)\
+                .filter(*filters)\
+                .execution_options(stream_results=True, yield_per=5000)
+            for row in rows:
+                for name, value in zip(stages, row[1:]):
+                    if value is not None:
+                        sketches[name].add(value)
+                daily.setdefault(str(as_date(row[0])), DDSketch()).add(row[-1])
+            
+            totals = db.session.query(
+                func.count(ChatTurnTelemetry.id),
+                func.count(ChatTurnTelemetry.error),
+                func.avg(ChatTurnTelemetry.prompt_tokens),
+                func.avg(ChatTurnTelemetry.completion_tokens),
+                func.avg(ChatTurnTelemetry.context_tokens)
+            ).filter(*filters).one()
+            
+            slowest = ChatTurnTelemetry.query.filter(*filters)\
+                .order_by(desc(ChatTurnTelemetry.total_ms))\
+                .limit(10)\
+                .all()
+            
+            return {
+                'turns': totals[0] or 0,
+                'errors': totals[1] or 0,
+                'stages': {
+                    name: sketch.percentiles()
+                    for name, sketch in sketches.items() if sketch.count
+                },
+                'daily_total': [
+                    {'date': day, 'turns': sketch.count, **sketch.percentiles((50, 95))}
+                    for day, sketch in sorted(daily.items())
+                ],
+                'tokens': {
+                    'avg_prompt': round(float(totals[2] or 0), 1),
+                    'avg_completion': round(float(totals[3] or 0), 1),
+                    'avg_context': round(float(totals[4] or 0), 1)
+                },
+                'slowest_turns': [turn.to_dict() for turn in slowest]
+            }
+            
+        except Exception as e:
+            print(f"Error getting latency analytics: {e}")
+            raise
     
     def get_file_analytics(self, user_id=None):
         """Get analytics data for uploaded files"""
@@ -111,12 +274,15 @@ class AnalyticsService:
                 } for ft in file_types
             ]
             
-            # Get total counts
-            total_files = UploadedFile.query.count()
-            total_size = db.session.query(func.sum(UploadedFile.file_size)).scalar() or 0
+            # Totals follow from the (already user-scoped) per-type groups
+            total_files = sum(ft.count for ft in file_types)
+            total_size = sum(ft.total_size or 0 for ft in file_types)
             
-            # Get recent uploads
-            recent_uploads = UploadedFile.query\
+            # Get recent uploads (served by the (user_id, created_at) index when scoped)
+            recent_query = UploadedFile.query
+            if user_id:
+                recent_query = recent_query.filter(UploadedFile.user_id == user_id)
+            recent_uploads = recent_query\
                 .order_by(UploadedFile.created_at.desc())\
                 .limit(5)\
                 .all()
@@ -140,12 +306,7 @@ class AnalyticsService:
             
         except Exception as e:
             print(f"Error getting file analytics: {e}")
-            return {
-                'file_types': [],
-                'total_files': 0,
-                'total_size': 0,
-                'recent_uploads': []
-            }
+            raise
     
     def get_rag_analytics(self, user_id=None):
         """Get analytics data for RAG system"""
@@ -173,8 +334,8 @@ class AnalyticsService:
                 } for s in sources
             ]
             
-            # Get total counts
-            total_documents = RAGDocument.query.count()
+            # Totals follow from the (already user-scoped) per-source groups
+            total_documents = sum(s.count for s in sources)
             
             return {
                 'source_types': source_data,
@@ -183,70 +344,69 @@ class AnalyticsService:
             
         except Exception as e:
             print(f"Error getting RAG analytics: {e}")
-            return {
-                'source_types': [],
-                'total_documents': 0
-            }
+            raise
+    
+    def _system_snapshot(self):
+        """Every system counter in one statement that reads only maintained aggregates.
+
+        Entity totals come from the table_row_counts counters; messages and
+        files from the daily rollups plus the rows past their watermarks.
+        """
+        def watermark(name):
+            return func.coalesce(
+                select(RollupWatermark.last_id).where(RollupWatermark.name == name).scalar_subquery(), 0
+            )
+        
+        def rolled(column):
+            return select(func.coalesce(func.sum(column), 0)).scalar_subquery()
+        
+        new_files = UploadedFile.id > watermark('uploaded_files')
+        
+        counts = row_count_columns()
+        row = db.session.query(
+            counts[UserProfile.__tablename__].label('user_count'),
+            counts[WorkItem.__tablename__].label('work_item_count'),
+            counts[Board.__tablename__].label('board_count'),
+            counts[GraphNode.__tablename__].label('node_count'),
+            counts[GraphEdge.__tablename__].label('edge_count'),
+            counts[ChatSession.__tablename__].label('total_sessions'),
+            rolled(DailyUserActivity.messages).label('rolled_messages'),
+            select(func.count()).select_from(ChatMessage)
+                .where(ChatMessage.id > watermark('chat_messages')).scalar_subquery().label('tail_messages'),
+            rolled(DailyUserActivity.uploads).label('rolled_files'),
+            rolled(DailyUserActivity.upload_bytes).label('rolled_size'),
+            select(func.count()).select_from(UploadedFile).where(new_files).scalar_subquery().label('tail_files'),
+            select(func.coalesce(func.sum(UploadedFile.file_size), 0)).where(new_files).scalar_subquery()
+                .label('tail_size')
+        ).one()
+        
+        return {
+            'user_count': int(row.user_count),
+            'work_item_count': int(row.work_item_count),
+            'board_count': int(row.board_count),
+            'graph': {
+                'node_count': int(row.node_count),
+                'edge_count': int(row.edge_count)
+            },
+            'chat_stats': {
+                'total_sessions': int(row.total_sessions),
+                'total_messages': int(row.rolled_messages) + row.tail_messages
+            },
+            'file_stats': {
+                'total_files': int(row.rolled_files) + row.tail_files,
+                'total_size': int(row.rolled_size) + int(row.tail_size)
+            },
+            'generated_at': datetime.utcnow().isoformat()
+        }
     
     def get_system_analytics(self):
-        """Get overall system analytics"""
+        """Get overall system analytics (single-query snapshot; cached by the analytics routes)"""
         try:
-            # Get user count
-            user_count = UserProfile.query.count()
-            
-            # Get total work items
-            work_item_count = WorkItem.query.count()
-            
-            # Get total boards
-            board_count = Board.query.count()
-            
-            # Get total graph nodes and edges
-            node_count = GraphNode.query.count()
-            edge_count = GraphEdge.query.count()
-            
-            # Get chat stats
-            chat_stats = self.get_chat_analytics()
-            
-            # Get file stats
-            file_stats = self.get_file_analytics()
-            
-            return {
-                'user_count': user_count,
-                'work_item_count': work_item_count,
-                'board_count': board_count,
-                'graph': {
-                    'node_count': node_count,
-                    'edge_count': edge_count
-                },
-                'chat_stats': {
-                    'total_sessions': chat_stats['total_sessions'],
-                    'total_messages': chat_stats['total_messages']
-                },
-                'file_stats': {
-                    'total_files': file_stats['total_files'],
-                    'total_size': file_stats['total_size']
-                }
-            }
+            return self._system_snapshot()
             
         except Exception as e:
             print(f"Error getting system analytics: {e}")
-            return {
-                'user_count': 0,
-                'work_item_count': 0,
-                'board_count': 0,
-                'graph': {
-                    'node_count': 0,
-                    'edge_count': 0
-                },
-                'chat_stats': {
-                    'total_sessions': 0,
-                    'total_messages': 0
-                },
-                'file_stats': {
-                    'total_files': 0,
-                    'total_size': 0
-                }
-            }
+            raise
     
     def get_notion_analytics(self, user_id=None):
         """Get analytics data for Notion integration"""
@@ -284,10 +444,7 @@ class AnalyticsService:
             
         except Exception as e:
             print(f"Error getting Notion analytics: {e}")
-            return {
-                'total_pages': 0,
-                'recent_pages': []
-            }
+            raise
     
     def generate_mock_data(self):
         """Generate mock data for dashboard demo"""
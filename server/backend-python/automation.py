@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from src.services.scheduler_service import scheduler_service
 from src.services.external_integrations import IntegrationManager
 from datetime import datetime
@@ -12,7 +12,7 @@ def start_scheduler():
     """Start the scheduler service"""
     try:
         scheduler_service.setup_schedules()
-        scheduler_service.start_scheduler()
+        scheduler_service.start_scheduler(current_app._get_current_object())
         return jsonify({
             "success": True,
             "message": "Scheduler started successfully",
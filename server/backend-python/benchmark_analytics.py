@@ -0,0 +1,155 @@
+"""Per-user analytics latency benchmark.
+
+Seeds one tenant with a fixed amount of data, then grows the data owned by
+other tenants step by step and times the per-user dashboard queries at each
+step. With correct scoping and the composite indexes, the tenant's latency
+should stay flat while the total table sizes grow.
+
+Usage:
+    python benchmark_analytics.py                       # temporary SQLite file
+    python benchmark_analytics.py --database-url postgresql://...  --steps 0 10 100
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+FILE_TYPES = ['pdf', 'docx', 'csv', 'txt', 'md', 'html']
+SOURCE_TYPES = ['file', 'notion', 'web']
+
+def create_app(database_url):
+    from flask import Flask
+    from src.models.user import db
+    from src.config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+    db.init_app(app)
+    return app
+
+def seed_tenant(user_id, sessions, messages_per_session, files, documents, days, rng):
+    """Bulk-insert one tenant's sessions, messages, uploads and RAG documents"""
+    from src.models.user import db
+    from src.models.chat import ChatSession, ChatMessage
+    from src.models.enhanced_models import UploadedFile, RAGDocument
+
+    now = datetime.utcnow()
+    session_rows = [
+        ChatSession(user_id=user_id, title=f"Tenant {user_id} chat {n}", updated_at=now)
+        for n in range(sessions)
+    ]
+    db.session.add_all(session_rows)
+    db.session.flush()
+
+    db.session.bulk_insert_mappings(ChatMessage, [
+        {
+            'session_id': session.id,
+            'role': 'user' if n % 2 == 0 else 'assistant',
+            'content': f"Benchmark message {n}",
+            'timestamp': now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+        }
+        for session in session_rows
+        for n in range(messages_per_session)
+    ])
+    db.session.bulk_insert_mappings(UploadedFile, [
+        {
+            'user_id': user_id,
+            'original_filename': f"file_{n}.{file_type}",
+            'stored_filename': f"{user_id}_{n}.{file_type}",
+            'file_type': file_type,
+            'file_size': rng.randint(1_000, 5_000_000),
+            'file_path': f"/tmp/{user_id}_{n}.{file_type}",
+            'is_processed': True,
+            'created_at': now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+        }
+        for n, file_type in ((n, rng.choice(FILE_TYPES)) for n in range(files))
+    ])
+    db.session.bulk_insert_mappings(RAGDocument, [
+        {
+            'user_id': user_id,
+            'source_type': rng.choice(SOURCE_TYPES),
+            'source_id': str(n),
+            'title': f"Document {n}",
+            'content': f"Benchmark document {n}",
+            'created_at': now - timedelta(minutes=rng.randint(0, days * 24 * 60))
+        }
+        for n in range(documents)
+    ])
+    db.session.commit()
+
+def time_dashboard(analytics_service, user_id, days, repeats):
+    """Median milliseconds per endpoint for one tenant's dashboard"""
+    calls = {
+        'chat': lambda: analytics_service.get_chat_analytics(user_id, days),
+        'daily': lambda: analytics_service.get_daily_activity(user_id, days),
+        'files': lambda: analytics_service.get_file_analytics(user_id),
+        'rag': lambda: analytics_service.get_rag_analytics(user_id),
+        'notion': lambda: analytics_service.get_notion_analytics(user_id)
+    }
+    timings = {}
+    for name, call in calls.items():
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            call()
+            samples.append((time.perf_counter() - started) * 1000)
+        timings[name] = round(sorted(samples)[len(samples) // 2], 2)
+    timings['total'] = round(sum(timings.values()), 2)
+    return timings
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark per-user analytics latency against tenant volume')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('--steps', type=int, nargs='+', default=[0, 10, 50],
+                        help='Number of other tenants present at each step (cumulative)')
+    parser.add_argument('--sessions', type=int, default=20, help='Sessions per tenant')
+    parser.add_argument('--messages', type=int, default=50, help='Messages per session')
+    parser.add_argument('--files', type=int, default=200, help='Uploads per tenant')
+    parser.add_argument('--documents', type=int, default=200, help='RAG documents per tenant')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url
+    if not database_url:
+        database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'benchmark.db')}"
+
+    rng = random.Random(args.seed)
+    app = create_app(database_url)
+    with app.app_context():
+        from src.models.user import db
+        from src.models.chat import ChatSession, ChatMessage  # noqa: F401 - register tables
+        from src.models.enhanced_models import create_missing_indexes
+        from src.services.analytics_service import analytics_service
+        from src.services.analytics_rollup_service import analytics_rollup_service
+        db.create_all()
+        create_missing_indexes()
+
+        tenant = 1
+        seed_tenant(tenant, args.sessions, args.messages, args.files, args.documents, args.days, rng)
+
+        results = []
+        other_tenants = 0
+        for step in args.steps:
+            while other_tenants < step:
+                other_tenants += 1
+                seed_tenant(tenant + other_tenants, args.sessions, args.messages,
+                            args.files, args.documents, args.days, rng)
+            analytics_rollup_service.run()
+
+            timings = time_dashboard(analytics_service, tenant, args.days, args.repeats)
+            results.append({'other_tenants': other_tenants, 'tenants_total': other_tenants + 1, 'ms': timings})
+            print(f"{other_tenants:>6} other tenants | " + ' | '.join(f"{k} {v:.2f}ms" for k, v in timings.items()))
+
+        print(json.dumps({'database_url': database_url, 'results': results}, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
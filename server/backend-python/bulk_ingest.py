@@ -0,0 +1,284 @@
+"""Offline bulk ingestion of files into the RAG system.
+
+Walks a directory (or reads a manifest), extracts text in a process pool,
+embeds in large batches, bulk-inserts UploadedFile/RAGDocument rows and adds
+the vectors straight to the index. Progress is checkpointed after every batch
+so an interrupted backfill resumes where it stopped.
+
+Usage:
+    python bulk_ingest.py /data/reports --user-id 1 --workers 8
+    python bulk_ingest.py manifest.jsonl --checkpoint backfill.ckpt.json
+
+A manifest is either a .jsonl file of {"path": ..., "user_id": ...} objects or
+a plain text file with one path per line.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+ALLOWED_EXTENSIONS = {'pdf', 'html', 'csv', 'docx', 'doc', 'md', 'txt'}
+
+def _extract_worker(task):
+    """Runs in a worker process; only imports the lightweight extraction module"""
+    from src.services.text_extraction import extract_text
+
+    path, user_id = task
+    file_type = path.rsplit('.', 1)[1].lower() if '.' in path else 'unknown'
+    try:
+        size = os.path.getsize(path)
+        content = extract_text(path, file_type)
+        return {'path': path, 'user_id': user_id, 'file_type': file_type, 'file_size': size, 'content': content}
+    except Exception as e:
+        return {'path': path, 'user_id': user_id, 'file_type': file_type, 'file_size': 0, 'content': '', 'error': str(e)}
+
+def iter_tasks(source, default_user_id):
+    """Yield (path, user_id) from a directory walk or a manifest file"""
+    if os.path.isdir(source):
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if '.' in name and name.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS:
+                    yield os.path.abspath(os.path.join(root, name)), default_user_id
+        return
+
+    with open(source, 'r', encoding='utf-8') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line:
+                continue
+            if source.endswith('.jsonl'):
+                entry = json.loads(line)
+                yield os.path.abspath(entry['path']), int(entry.get('user_id', default_user_id))
+            else:
+                yield os.path.abspath(line), default_user_id
+
+class Checkpoint:
+    """Set of finished paths, written atomically after each committed batch"""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.done = set(data.get('done', []))
+            self.failed = data.get('failed', {})
+
+    def save(self):
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'done': sorted(self.done), 'failed': self.failed}, f)
+        os.replace(tmp_path, self.path)
+
+def create_app():
+    from flask import Flask
+    from src.models.user import db
+    from src.config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+def ingest_batch(results, rag_service, upload_dir, stats):
+    """Deduplicate, embed, insert and index one batch of extracted files"""
+    copied = []
+    try:
+        _ingest_batch(results, rag_service, upload_dir, stats, copied)
+    except BaseException:
+        # The batch did not commit; drop its copies so a retry leaves no orphans
+        for file_path in copied:
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                print(f"Error removing {file_path}: {e}")
+        raise
+
+def _ingest_batch(results, rag_service, upload_dir, stats, copied):
+    from src.models.user import db
+    from src.models.enhanced_models import UploadedFile, RAGDocument
+
+    ok = [r for r in results if r['content'].strip()]
+    if not ok:
+        return
+
+    files = []
+    for result in ok:
+        stored_filename = f"{uuid.uuid4().hex}.{result['file_type']}"
+        file_path = result['path']
+        if upload_dir:
+            file_path = os.path.join(upload_dir, stored_filename)
+            shutil.copyfile(result['path'], file_path)
+            copied.append(file_path)
+        files.append(UploadedFile(
+            user_id=result['user_id'],
+            original_filename=os.path.basename(result['path']),
+            stored_filename=stored_filename,
+            file_type=result['file_type'],
+            file_size=result['file_size'],
+            file_path=file_path,
+            extracted_content=result['content'],
+            is_processed=True
+        ))
+    db.session.add_all(files)
+    db.session.flush()
+
+    # Find duplicates first, against the index and earlier files of this batch,
+    # so only unique documents are embedded
+    detector = rag_service.dedup_detector
+    unique, duplicates = [], []  # (doc, signature), (doc, original doc or id, similarity)
+    for result, uploaded_file in zip(ok, files):
+        doc = RAGDocument(
+            user_id=result['user_id'],
+            source_type='file',
+            source_id=str(uploaded_file.id),
+            title=uploaded_file.original_filename,
+            content=result['content'],
+            doc_metadata=json.dumps({
+                'file_type': uploaded_file.file_type,
+                'file_size': uploaded_file.file_size,
+                'original_filename': uploaded_file.original_filename,
+                'ingested_by': 'bulk_ingest'
+            })
+        )
+        signature = None
+        if detector:
+            signature = detector.signature(result['content'])
+            duplicate = detector.find_duplicate(result['content'], result['user_id'], signature=signature)
+            for earlier, earlier_signature in unique:
+                if earlier.user_id != doc.user_id:
+                    continue
+                similarity = detector.similarity(earlier_signature, signature)
+                if similarity >= detector.threshold and (duplicate is None or similarity > duplicate[1]):
+                    duplicate = (earlier, similarity)
+            if duplicate:
+                duplicates.append((doc, duplicate[0], duplicate[1]))
+                continue
+        unique.append((doc, signature))
+
+    started = time.time()
+    embeddings = []
+    if unique:
+        embeddings = rag_service.embedding_model.encode(
+            [doc.content for doc, _ in unique],
+            batch_size=64,
+            show_progress_bar=False
+        )
+    stats['embed_seconds'] += time.time() - started
+
+    for (doc, _), embedding in zip(unique, embeddings):
+        doc.embedding_data = json.dumps(embedding.tolist())
+    db.session.add_all([doc for doc, _ in unique])
+    db.session.flush()
+    for doc, signature in unique:
+        if signature is not None:
+            detector.add(doc.id, doc.user_id, signature)
+
+    # Originals from this batch have IDs only now
+    for doc, original, similarity in duplicates:
+        metadata = json.loads(doc.doc_metadata)
+        metadata['duplicate_of'] = original if isinstance(original, int) else original.id
+        metadata['duplicate_similarity'] = round(similarity, 4)
+        doc.doc_metadata = json.dumps(metadata)
+    db.session.add_all([doc for doc, _, _ in duplicates])
+    db.session.commit()
+    # Committed rows now reference the copies
+    copied.clear()
+    for doc, signature in unique:
+        if signature is not None:
+            detector.register(doc.id, doc.user_id, signature)
+
+    for (doc, _), embedding in zip(unique, embeddings):
+        rag_service.index.add(doc.id, embedding)
+    rag_service.save_faiss_index()
+
+    stats['documents'] += len(unique) + len(duplicates)
+    stats['indexed'] += len(unique)
+    stats['duplicates'] += len(duplicates)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-ingest files into the RAG system')
+    parser.add_argument('source', help='Directory to walk, or a .jsonl/.txt manifest')
+    parser.add_argument('--user-id', type=int, default=1, help='Owner for files without an explicit user_id')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Extraction processes')
+    parser.add_argument('--batch-size', type=int, default=256, help='Files per embed/insert batch')
+    parser.add_argument('--checkpoint', default='bulk_ingest.ckpt.json', help='Checkpoint file for resuming')
+    parser.add_argument('--upload-dir', help='Copy files here (like /api/files/upload) instead of referencing them in place')
+    parser.add_argument('--retry-failed', action='store_true', help='Retry files that failed in an earlier run')
+    args = parser.parse_args(argv)
+
+    checkpoint = Checkpoint(args.checkpoint)
+    skip = checkpoint.done if args.retry_failed else checkpoint.done | set(checkpoint.failed)
+    tasks = [task for task in iter_tasks(args.source, args.user_id) if task[0] not in skip]
+    print(f"{len(tasks)} files to ingest ({len(checkpoint.done)} already done)")
+    if not tasks:
+        return 0
+
+    if args.upload_dir:
+        os.makedirs(args.upload_dir, exist_ok=True)
+
+    app = create_app()
+    with app.app_context():
+        from src.models.user import db
+        from src.services.enhanced_rag_service import enhanced_rag_service
+        db.create_all()
+
+        stats = {'files': 0, 'bytes': 0, 'documents': 0, 'indexed': 0, 'duplicates': 0, 'failed': 0, 'embed_seconds': 0.0}
+        started = time.time()
+
+        # Spawned workers never import the app, the embedding model or the index
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=args.workers, mp_context=context) as pool:
+            for start in range(0, len(tasks), args.batch_size):
+                batch = tasks[start:start + args.batch_size]
+                results = list(pool.map(_extract_worker, batch, chunksize=max(1, len(batch) // (args.workers * 4))))
+
+                for result in results:
+                    if result.get('error') or not result['content'].strip():
+                        checkpoint.failed[result['path']] = result.get('error', 'no text extracted')
+                        stats['failed'] += 1
+
+                try:
+                    ingest_batch(results, enhanced_rag_service, args.upload_dir, stats)
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"Batch starting at {start} failed: {e}")
+                    checkpoint.save()
+                    return 1
+
+                for result in results:
+                    if result['content'].strip():
+                        checkpoint.done.add(result['path'])
+                        checkpoint.failed.pop(result['path'], None)
+                    stats['files'] += 1
+                    stats['bytes'] += result['file_size']
+                checkpoint.save()
+
+                elapsed = time.time() - started
+                print(
+                    f"{stats['files']}/{len(tasks)} files | "
+                    f"{stats['files'] / elapsed:.1f} files/s | "
+                    f"{stats['bytes'] / elapsed / 1e6:.2f} MB/s | "
+                    f"{stats['indexed']} indexed, {stats['duplicates']} duplicates, {stats['failed']} failed"
+                )
+
+        elapsed = time.time() - started
+        print(json.dumps({
+            **stats,
+            'elapsed_seconds': round(elapsed, 2),
+            'files_per_second': round(stats['files'] / elapsed, 2) if elapsed else 0,
+            'embed_seconds': round(stats['embed_seconds'], 2)
+        }, indent=2))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
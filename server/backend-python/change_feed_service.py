@@ -0,0 +1,88 @@
+from typing import Callable, Dict, Any, List
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session, object_session
+from src.models.chat import ChatSession, ChatMessage
+from src.models.enhanced_models import UploadedFile, RAGDocument
+
+_listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+
+# Chat session id -> owner; sessions never change owner, so this only grows
+_session_owners: Dict[int, int] = {}
+_MAX_SESSION_OWNERS = 10000
+
+def register(listener: Callable[[List[Dict[str, Any]]], None]):
+    """Call listener(changes) after every commit that inserted tracked rows.
+
+    Each change is a dict with 'kind' ('chat_message', 'uploaded_file' or
+    'rag_document'), 'user_id' and a few kind-specific fields. Listeners run
+    on the committing thread and must not touch the session.
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def _record(target, change: Dict[str, Any]):
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('committed_changes', []).append(change)
+
+@event.listens_for(ChatMessage, 'after_insert')
+def _chat_message_inserted(mapper, connection, target):
+    # user_id is resolved per commit in _resolve_session_owners, not per row
+    _record(target, {
+        'kind': 'chat_message',
+        'user_id': None,
+        'session_id': target.session_id,
+        'role': target.role
+    })
+
+@event.listens_for(UploadedFile, 'after_insert')
+def _uploaded_file_inserted(mapper, connection, target):
+    _record(target, {
+        'kind': 'uploaded_file',
+        'user_id': target.user_id,
+        'file_type': target.file_type,
+        'file_size': target.file_size or 0
+    })
+
+@event.listens_for(RAGDocument, 'after_insert')
+def _rag_document_inserted(mapper, connection, target):
+    _record(target, {
+        'kind': 'rag_document',
+        'user_id': target.user_id,
+        'source_type': target.source_type
+    })
+
+def _resolve_session_owners(session, changes: List[Dict[str, Any]]):
+    """Fill in user_id for chat message changes with at most one query per commit"""
+    messages = [change for change in changes if change['kind'] == 'chat_message']
+    missing = {change['session_id'] for change in messages} - _session_owners.keys()
+    if missing:
+        # The committed session cannot emit SQL here, so use a connection of its own
+        with session.get_bind().connect() as connection:
+            owners = connection.execute(
+                select(ChatSession.id, ChatSession.user_id).where(ChatSession.id.in_(missing))
+            ).all()
+        if len(_session_owners) + len(owners) > _MAX_SESSION_OWNERS:
+            _session_owners.clear()
+        _session_owners.update(owners)
+    for change in messages:
+        change['user_id'] = _session_owners.get(change['session_id'])
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch(session):
+    changes = session.info.pop('committed_changes', None)
+    if not changes:
+        return
+    try:
+        _resolve_session_owners(session, changes)
+    except Exception as e:
+        print(f"Error resolving chat session owners: {e}")
+    for listener in list(_listeners):
+        try:
+            listener(changes)
+        except Exception as e:
+            print(f"Error in change feed listener: {e}")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard(session):
+    session.info.pop('committed_changes', None)
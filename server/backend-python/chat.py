@@ -1,17 +1,42 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context, current_app
 from src.models.chat import ChatSession, ChatMessage, db
 from src.services.rag_service import RAGService
+from src.services.chat_stream_service import ChatStreamService
+from src.services.chat_history_service import chat_history_service
+from src.services.conversation_memory_service import ConversationMemory
+from src.services.chat_write_buffer_service import chat_write_buffer
+from src.services.chat_search_service import chat_search_service
+from src.services.chat_export_service import chat_export_service, FORMATS as EXPORT_FORMATS
+from src.services.llm_gateway_service import llm_gateway
+from src.services.chat_telemetry_service import chat_telemetry, stage
+from src.config import Config
+from src.services.retrieval_orchestrator_service import RetrievalOrchestrator
+from src.services.enhanced_rag_service import enhanced_rag_service
 import json
+from datetime import datetime
 
 chat_bp = Blueprint('chat', __name__)
 rag_service = RAGService()
+retrieval_orchestrator = RetrievalOrchestrator(rag_service, enhanced_rag_service)
+conversation_memory = ConversationMemory(rag_service.ai_service, write_buffer=chat_write_buffer)
+chat_stream_service = ChatStreamService(
+    rag_service, rag_service.ai_service, conversation_memory, chat_write_buffer, retrieval_orchestrator
+)
 
 @chat_bp.route('/chat/sessions', methods=['GET'])
 def get_chat_sessions():
-    """Get all chat sessions for a user"""
+    """Get chat sessions for a user (keyset-paginated when limit is given)"""
     user_id = request.args.get('user_id', 1)  # Default user for now
-    sessions = ChatSession.query.filter_by(user_id=user_id).order_by(ChatSession.updated_at.desc()).all()
-    return jsonify([session.to_dict() for session in sessions])
+    limit = request.args.get('limit', type=int)
+    
+    if limit is not None:
+        try:
+            page = chat_history_service.get_sessions_page(user_id, limit, request.args.get('before'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(page)
+    
+    return jsonify(chat_history_service.get_sessions_with_stats(user_id))
 
 @chat_bp.route('/chat/sessions', methods=['POST'])
 def create_chat_session():
@@ -28,8 +53,25 @@ def create_chat_session():
 
 @chat_bp.route('/chat/sessions/<int:session_id>/messages', methods=['GET'])
 def get_chat_messages(session_id):
-    """Get all messages in a chat session"""
+    """Get messages in a chat session (latest `limit` first, then scroll back with cursors)"""
+    limit = request.args.get('limit', type=int)
+    
+    if limit is not None:
+        try:
+            page = chat_history_service.get_messages_page(
+                session_id,
+                limit,
+                before=request.args.get('before'),
+                after=request.args.get('after')
+            )
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return jsonify(page)
+    
+    # Include messages still waiting in the write-behind buffer
+    pending = chat_write_buffer.pending_for_session(session_id)
     messages = ChatMessage.query.filter_by(session_id=session_id).order_by(ChatMessage.timestamp.asc()).all()
+    messages = chat_write_buffer.merge_pending(messages, pending)
     return jsonify([message.to_dict() for message in messages])
 
 @chat_bp.route('/chat/sessions/<int:session_id>/messages', methods=['POST'])
@@ -42,45 +84,14 @@ def send_message(session_id):
     if not user_message.strip():
         return jsonify({'error': 'Message cannot be empty'}), 400
     
+    session = ChatSession.query.get(session_id)
     try:
-        # Save user message
-        user_msg = ChatMessage(
-            session_id=session_id,
-            role='user',
-            content=user_message
-        )
-        db.session.add(user_msg)
-        
-        # Generate AI response
-        if use_rag:
-            rag_result = rag_service.generate_answer(user_message)
-            ai_response = rag_result['answer']
-            sources = json.dumps(rag_result['sources'])
-            confidence = rag_result['confidence']
-        else:
-            from src.services.ai_service import AIService
-            ai_service = AIService()
-            result = ai_service.generate_with_gemini(user_message)
-            ai_response = result.get('response', result.get('error', 'เกิดข้อผิดพลาดในการสร้างคำตอบ'))
-            sources = None
-            confidence = None
-        
-        # Save AI response
-        ai_msg = ChatMessage(
-            session_id=session_id,
-            role='assistant',
-            content=ai_response,
-            sources=sources,
-            confidence_score=confidence
-        )
-        db.session.add(ai_msg)
+        # Stage timings, retrieved documents and token counts are recorded per turn
+        with chat_telemetry.turn(session_id, session.user_id if session else None, use_rag=use_rag) as turn:
+            user_msg, ai_msg = _answer_and_persist(session_id, session, user_message, use_rag, turn)
         
-        # Update session timestamp
-        session = ChatSession.query.get(session_id)
-        if session:
-            session.updated_at = db.func.now()
-        
-        db.session.commit()
+        # Fold turns that left the verbatim window into the summary, off the request path
+        conversation_memory.schedule_summary(session_id, current_app._get_current_object())
         
         return jsonify({
             'user_message': user_msg.to_dict(),
@@ -91,6 +102,84 @@ def send_message(session_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def _answer_and_persist(session_id, session, user_message, use_rag, turn):
+    """Generate the reply and save both messages, timing each stage under `turn`"""
+    # Bounded history: rolling summary plus the last few turns
+    history = conversation_memory.build_history(session_id)
+    
+    # Generate AI response (every model call in this turn shares one deadline)
+    with llm_gateway.deadline(Config.CHAT_REQUEST_DEADLINE_SECONDS):
+        if use_rag:
+            # Local index, the owner's documents and Notion are searched concurrently
+            retrieved = retrieval_orchestrator.retrieve_context(
+                user_message, user_id=session.user_id if session else None
+            )
+            turn.set_retrieved(retrieved)
+            rag_result = rag_service.generate_answer(user_message, history=history, retrieved=retrieved)
+            ai_response = rag_result['answer']
+            sources = json.dumps(rag_result['sources'])
+            confidence = rag_result['confidence']
+            turn.set_tokens(f"{history}\n\n{retrieved['context']}\n\n{user_message}", ai_response)
+        else:
+            result = llm_gateway.generate_with_gemini(user_message, history)
+            ai_response = result.get('response', result.get('error', 'เกิดข้อผิดพลาดในการสร้างคำตอบ'))
+            sources = None
+            confidence = None
+            turn.set_tokens(f"{history}\n\n{user_message}", ai_response)
+    
+    if chat_write_buffer.running:
+        # Persisted in the background; ids are assigned on flush
+        return chat_write_buffer.enqueue_turn(session_id, user_message, ai_response, sources, confidence)
+    
+    user_msg = ChatMessage(
+        session_id=session_id,
+        role='user',
+        content=user_message
+    )
+    ai_msg = ChatMessage(
+        session_id=session_id,
+        role='assistant',
+        content=ai_response,
+        sources=sources,
+        confidence_score=confidence
+    )
+    db.session.add(user_msg)
+    db.session.add(ai_msg)
+    
+    # Update session timestamp
+    if session:
+        session.updated_at = datetime.utcnow()
+    
+    with stage('db_commit'):
+        db.session.commit()
+    turn.message_id = ai_msg.id
+    return user_msg, ai_msg
+
+@chat_bp.route('/chat/sessions/<int:session_id>/messages/stream', methods=['POST'])
+def stream_message(session_id):
+    """Send a message and stream the AI response as server-sent events"""
+    data = request.get_json()
+    user_message = data.get('message', '')
+    use_rag = data.get('use_rag', True)
+    
+    if not user_message.strip():
+        return jsonify({'error': 'Message cannot be empty'}), 400
+    
+    session = ChatSession.query.get(session_id)
+    events = chat_stream_service.stream_reply(
+        session_id, user_message, use_rag, current_app._get_current_object(),
+        user_id=session.user_id if session else None
+    )
+    
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Disable proxy buffering (nginx)
+        }
+    )
+
 @chat_bp.route('/chat/rag/documents', methods=['POST'])
 def add_rag_document():
     """Add document to RAG system"""
@@ -136,6 +225,78 @@ def search_rag():
     results = rag_service.search(query, k)
     return jsonify(results)
 
+def _export_response(user_id, session_id=None):
+    fmt = request.args.get('format', 'ndjson')
+    inner_format = request.args.get('inner_format', 'markdown')
+    if fmt not in EXPORT_FORMATS or inner_format not in ('ndjson', 'markdown'):
+        return jsonify({'error': 'format must be ndjson, markdown or zip'}), 400
+    
+    body = chat_export_service.stream(user_id, fmt, session_id=session_id, inner_format=inner_format)
+    return Response(
+        stream_with_context(body),
+        mimetype=EXPORT_FORMATS[fmt][0],
+        headers={
+            'Content-Disposition': f'attachment; filename="{chat_export_service.filename(fmt, session_id)}"',
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@chat_bp.route('/chat/sessions/<int:session_id>/export', methods=['GET'])
+def export_chat_session(session_id):
+    """Stream one session as NDJSON, Markdown or zip"""
+    session = ChatSession.query.get(session_id)
+    if not session:
+        return jsonify({'error': 'Session not found'}), 404
+    return _export_response(session.user_id, session_id)
+
+@chat_bp.route('/chat/export', methods=['GET'])
+def export_chat_sessions():
+    """Stream all of a user's sessions as NDJSON, Markdown or zip"""
+    user_id = request.args.get('user_id', 1, type=int)  # Default user for now
+    return _export_response(user_id)
+
+@chat_bp.route('/chat/search', methods=['GET'])
+def search_chat_history():
+    """Full-text search over a user's chat messages (newest first, keyset-paginated)"""
+    user_id = request.args.get('user_id', 1, type=int)  # Default user for now
+    query = request.args.get('q', '')
+    
+    if not query.strip():
+        return jsonify({'error': 'Query cannot be empty'}), 400
+    
+    try:
+        results = chat_search_service.search(
+            user_id,
+            query,
+            limit=request.args.get('limit', 20, type=int),
+            before=request.args.get('before'),
+            session_id=request.args.get('session_id', type=int)
+        )
+        return jsonify(results)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@chat_bp.route('/chat/search/reindex', methods=['POST'])
+def reindex_chat_history():
+    """Rebuild the chat full-text index from existing messages"""
+    try:
+        indexed = chat_search_service.reindex()
+        return jsonify({'message': f'Indexed {indexed} messages', 'indexed': indexed})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@chat_bp.route('/chat/llm/stats', methods=['GET'])
+def get_llm_gateway_stats():
+    """Get LLM gateway queue and concurrency metrics"""
+    return jsonify(llm_gateway.get_stats())
+
+@chat_bp.route('/chat/write-buffer/stats', methods=['GET'])
+def get_write_buffer_stats():
+    """Get write-behind buffer statistics"""
+    return jsonify(chat_write_buffer.get_stats())
+
 @chat_bp.route('/chat/rag/stats', methods=['GET'])
 def get_rag_stats():
     """Get RAG system statistics"""
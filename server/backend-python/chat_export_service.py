@@ -0,0 +1,124 @@
+import json
+import zipfile
+from datetime import datetime
+from typing import Iterator, Optional, List, Tuple
+from src.models.chat import ChatSession, ChatMessage, db
+
+EXPORT_BATCH = 1000
+ROLE_HEADINGS = {'user': 'User', 'assistant': 'Assistant'}
+
+FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'markdown': ('text/markdown; charset=utf-8', 'md'),
+    'zip': ('application/zip', 'zip')
+}
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        self.size = 0
+        return data
+
+class ChatExportService:
+    """Streams chat sessions out as NDJSON, Markdown or a zip of per-session files.
+
+    Messages are read as plain column tuples through a server-side cursor
+    (stream_results) in batches of EXPORT_BATCH, so neither ORM objects nor the
+    response body accumulate in memory.
+    """
+
+    def _sessions(self, user_id: int, session_id: Optional[int] = None) -> List[Tuple[int, str]]:
+        query = db.session.query(ChatSession.id, ChatSession.title).filter(ChatSession.user_id == user_id)
+        if session_id is not None:
+            query = query.filter(ChatSession.id == session_id)
+        return query.order_by(ChatSession.id.asc()).all()
+
+    def _messages(self, session_id: int) -> Iterator[tuple]:
+        query = db.session.query(
+            ChatMessage.id,
+            ChatMessage.role,
+            ChatMessage.content,
+            ChatMessage.sources,
+            ChatMessage.confidence_score,
+            ChatMessage.timestamp
+        ).filter(
+            ChatMessage.session_id == session_id
+        ).order_by(
+            ChatMessage.timestamp.asc(), ChatMessage.id.asc()
+        ).execution_options(stream_results=True, yield_per=EXPORT_BATCH)
+        return iter(query)
+
+    def _ndjson_lines(self, session_id: int, title: str) -> Iterator[str]:
+        for message_id, role, content, sources, confidence, timestamp in self._messages(session_id):
+            yield json.dumps({
+                'session_id': session_id,
+                'session_title': title,
+                'id': message_id,
+                'role': role,
+                'content': content,
+                'sources': json.loads(sources) if sources else None,
+                'confidence_score': confidence,
+                'timestamp': timestamp.isoformat() if timestamp else None
+            }, ensure_ascii=False) + '\n'
+
+    def _markdown_lines(self, session_id: int, title: str) -> Iterator[str]:
+        yield f"# {title or 'Untitled chat'}\n\n"
+        for _, role, content, _, _, timestamp in self._messages(session_id):
+            heading = ROLE_HEADINGS.get(role, role)
+            when = f" · {timestamp.strftime('%Y-%m-%d %H:%M')}" if timestamp else ''
+            yield f"**{heading}**{when}\n\n{content}\n\n"
+
+    def _lines(self, fmt: str, session_id: int, title: str) -> Iterator[str]:
+        return self._markdown_lines(session_id, title) if fmt == 'markdown' else self._ndjson_lines(session_id, title)
+
+    def stream(self, user_id: int, fmt: str = 'ndjson', session_id: Optional[int] = None,
+               inner_format: str = 'markdown') -> Iterator[bytes]:
+        """Yield the export body; zip holds one file per session in `inner_format`"""
+        sessions = self._sessions(user_id, session_id)
+
+        if fmt != 'zip':
+            for sid, title in sessions:
+                buffer = []
+                for line in self._lines(fmt, sid, title):
+                    buffer.append(line)
+                    if len(buffer) >= 100:
+                        yield ''.join(buffer).encode('utf-8')
+                        buffer = []
+                if buffer:
+                    yield ''.join(buffer).encode('utf-8')
+            return
+
+        sink = _ChunkSink()
+        extension = FORMATS[inner_format][1]
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for sid, title in sessions:
+                with archive.open(f"chat-{sid}.{extension}", 'w', force_zip64=True) as entry:
+                    for line in self._lines(inner_format, sid, title):
+                        entry.write(line.encode('utf-8'))
+                        if sink.size >= 64 * 1024:
+                            yield sink.drain()
+                yield sink.drain()
+        yield sink.drain()
+
+    def filename(self, fmt: str, session_id: Optional[int] = None) -> str:
+        stamp = datetime.utcnow().strftime('%Y%m%d-%H%M%S')
+        scope = f"chat-{session_id}" if session_id is not None else 'chats'
+        return f"{scope}-{stamp}.{FORMATS[fmt][1]}"
+
+# Create global instance
+chat_export_service = ChatExportService()
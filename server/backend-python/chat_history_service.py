@@ -0,0 +1,147 @@
+import base64
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+from sqlalchemy import and_, or_, func, select
+from src.models.chat import ChatSession, ChatMessage, db
+from src.services.chat_write_buffer_service import chat_write_buffer
+
+MAX_PAGE_SIZE = 200
+SNIPPET_CHARS = 120
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Opaque keyset cursor for a (timestamp, id) position"""
+    raw = f"{timestamp.isoformat() if timestamp else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    """Inverse of encode_cursor; raises ValueError on malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        timestamp, row_id = raw.rsplit('|', 1)
+        return (datetime.fromisoformat(timestamp) if timestamp else None), int(row_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+def before_position(ts_column, id_column, timestamp, row_id):
+    """(ts, id) < (timestamp, row_id), written out so composite indexes are usable"""
+    return or_(ts_column < timestamp, and_(ts_column == timestamp, id_column < row_id))
+
+def after_position(ts_column, id_column, timestamp, row_id):
+    return or_(ts_column > timestamp, and_(ts_column == timestamp, id_column > row_id))
+
+class ChatHistoryService:
+    """Keyset-paginated reads of chat sessions and messages"""
+
+    def clamp_limit(self, limit: int) -> int:
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    def get_messages_page(self, session_id: int, limit: int, before: Optional[str] = None,
+                          after: Optional[str] = None) -> Dict[str, Any]:
+        """Messages in ascending order.
+
+        Without a cursor this returns the latest `limit` messages; pass
+        `prev_cursor` as `before` to scroll back, or `next_cursor` as `after`
+        to fetch anything newer. Pages at the newest end also carry messages
+        still in the write-behind buffer; they have no id, and next_cursor
+        stays on the last stored message so they are fetched again once saved.
+        """
+        limit = self.clamp_limit(limit)
+        pending = chat_write_buffer.pending_for_session(session_id)
+        query = ChatMessage.query.filter(ChatMessage.session_id == session_id)
+
+        if after:
+            timestamp, row_id = decode_cursor(after)
+            rows = query.filter(after_position(ChatMessage.timestamp, ChatMessage.id, timestamp, row_id))\
+                        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())\
+                        .limit(limit + 1)\
+                        .all()
+            has_more_newer = len(rows) > limit
+            messages = rows[:limit]
+            has_more_older = True
+        else:
+            if before:
+                timestamp, row_id = decode_cursor(before)
+                query = query.filter(before_position(ChatMessage.timestamp, ChatMessage.id, timestamp, row_id))
+            rows = query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())\
+                        .limit(limit + 1)\
+                        .all()
+            has_more_older = len(rows) > limit
+            messages = list(reversed(rows[:limit]))
+            has_more_newer = bool(before)
+
+        stored = messages
+        if pending and not has_more_newer:
+            messages = chat_write_buffer.merge_pending(messages, pending)
+
+        return {
+            'messages': [message.to_dict() for message in messages],
+            'prev_cursor': encode_cursor(stored[0].timestamp, stored[0].id) if stored and has_more_older else None,
+            'next_cursor': encode_cursor(stored[-1].timestamp, stored[-1].id) if stored else after,
+            'has_more_older': has_more_older,
+            'has_more_newer': has_more_newer
+        }
+
+    def _sessions_with_stats(self, user_id: int, limit: Optional[int] = None,
+                             before: Optional[str] = None) -> List[Tuple[ChatSession, Dict[str, Any]]]:
+        """Sessions by most recent activity, each with message count and last-message preview.
+
+        One statement: the page of session ids is selected first, then a window
+        over just those sessions' messages yields the count and the latest row.
+        """
+        page_ids = select(ChatSession.id).where(ChatSession.user_id == user_id)
+        if before:
+            timestamp, row_id = decode_cursor(before)
+            page_ids = page_ids.where(before_position(ChatSession.updated_at, ChatSession.id, timestamp, row_id))
+        page_ids = page_ids.order_by(ChatSession.updated_at.desc(), ChatSession.id.desc())
+        if limit is not None:
+            page_ids = page_ids.limit(limit)
+
+        ranked = select(
+            ChatMessage.session_id.label('session_id'),
+            ChatMessage.role.label('role'),
+            func.substr(ChatMessage.content, 1, SNIPPET_CHARS).label('snippet'),
+            ChatMessage.timestamp.label('timestamp'),
+            func.count().over(partition_by=ChatMessage.session_id).label('message_count'),
+            func.row_number().over(
+                partition_by=ChatMessage.session_id,
+                order_by=(ChatMessage.timestamp.desc(), ChatMessage.id.desc())
+            ).label('position')
+        ).where(ChatMessage.session_id.in_(page_ids)).subquery()
+
+        rows = db.session.query(
+            ChatSession, ranked.c.message_count, ranked.c.role, ranked.c.snippet, ranked.c.timestamp
+        ).outerjoin(
+            ranked, and_(ranked.c.session_id == ChatSession.id, ranked.c.position == 1)
+        ).filter(
+            ChatSession.id.in_(page_ids)
+        ).order_by(ChatSession.updated_at.desc(), ChatSession.id.desc()).all()
+
+        sessions = []
+        for session, message_count, role, snippet, timestamp in rows:
+            data = session.to_dict()
+            data['message_count'] = message_count or 0
+            data['last_message'] = {'role': role, 'snippet': snippet} if snippet is not None else None
+            last_activity = max(filter(None, [timestamp, session.updated_at]), default=None)
+            data['last_activity'] = last_activity.isoformat() if last_activity else None
+            sessions.append((session, data))
+        return sessions
+
+    def get_sessions_with_stats(self, user_id: int) -> List[Dict[str, Any]]:
+        """All of a user's sessions with message count, last-message preview and last activity"""
+        return [data for _, data in self._sessions_with_stats(user_id)]
+
+    def get_sessions_page(self, user_id: int, limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+        """Sessions by most recent activity; pass `next_cursor` as `before` for the next page"""
+        limit = self.clamp_limit(limit)
+        rows = self._sessions_with_stats(user_id, limit + 1, before)
+        sessions = [session for session, _ in rows[:limit]]
+        has_more = len(rows) > limit
+
+        return {
+            'sessions': [data for _, data in rows[:limit]],
+            'next_cursor': encode_cursor(sessions[-1].updated_at, sessions[-1].id) if sessions and has_more else None,
+            'has_more': has_more
+        }
+
+# Create global instance
+chat_history_service = ChatHistoryService()
@@ -0,0 +1,231 @@
+import re
+import html
+from typing import Dict, Any, List, Optional
+from sqlalchemy import event, text, func, select, table, column
+from src.models.chat import ChatSession, ChatMessage, db
+from src.services.chat_history_service import encode_cursor, decode_cursor, before_position, MAX_PAGE_SIZE
+
+try:
+    from pythainlp.tokenize import word_tokenize as thai_word_tokenize
+except ImportError:
+    thai_word_tokenize = None
+
+SNIPPET_CHARS = 160
+REINDEX_BATCH = 1000
+
+_THAI_RUN = re.compile(r'[\u0e00-\u0e7f]+')
+_TERMS = re.compile(r'[\u0e00-\u0e7f]+|[^\W\u0e00-\u0e7f]+', re.UNICODE)
+
+# SQLite: contentless-style FTS5 table keyed by rowid = chat_messages.id
+fts_table = table('chat_messages_fts', column('rowid'), column('tokens'))
+# Postgres: tsvector side table with a GIN index
+pg_search_table = table('chat_message_search', column('message_id'), column('tsv'))
+
+def _segment_thai(run: str) -> List[str]:
+    """Thai is written without spaces: dictionary segmentation when available, else bigrams"""
+    if thai_word_tokenize is not None:
+        return [word for word in thai_word_tokenize(run, engine='newmm', keep_whitespace=False) if word.strip()]
+    if len(run) < 2:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def tokenize_phrases(content: str) -> List[List[str]]:
+    """Split text into phrases of index tokens (one phrase per word or Thai run)"""
+    phrases = []
+    for term in _TERMS.findall((content or '').lower()):
+        phrases.append(_segment_thai(term) if _THAI_RUN.fullmatch(term) else [term])
+    return phrases
+
+def index_tokens(content: str) -> str:
+    """Whitespace-joined tokens stored in the FTS index"""
+    return ' '.join(token for phrase in tokenize_phrases(content) for token in phrase)
+
+def highlight_snippet(content: str, query: str, width: int = SNIPPET_CHARS) -> str:
+    """HTML-escaped excerpt around the first match with query terms wrapped in <mark>"""
+    content = content or ''
+    terms = sorted(set(_TERMS.findall(query.lower())), key=len, reverse=True)
+    pattern = re.compile('|'.join(re.escape(term) for term in terms), re.IGNORECASE) if terms else None
+
+    first = pattern.search(content) if pattern else None
+    start = max(0, first.start() - width // 3) if first else 0
+    excerpt = content[start:start + width]
+
+    parts, position = [], 0
+    for match in (pattern.finditer(excerpt) if pattern else []):
+        parts.append(html.escape(excerpt[position:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group(0))}</mark>")
+        position = match.end()
+    parts.append(html.escape(excerpt[position:]))
+
+    prefix = '…' if start > 0 else ''
+    suffix = '…' if start + width < len(content) else ''
+    return prefix + ''.join(parts) + suffix
+
+class ChatSearchService:
+    """Full-text search over chat messages.
+
+    Uses SQLite FTS5 or a Postgres tsvector table depending on the engine.
+    Text is pre-tokenized in Python (Thai segmented) so both backends index
+    the same tokens, and the index is maintained by ORM insert/delete hooks in
+    the same transaction as the message itself.
+    """
+
+    def __init__(self):
+        self.dialect = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.dialect in ('sqlite', 'postgresql')
+
+    def ensure_index(self):
+        """Create the FTS structures for the current engine; call once at startup"""
+        dialect = db.engine.dialect.name
+        with db.engine.begin() as connection:
+            if dialect == 'sqlite':
+                connection.execute(text(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_messages_fts "
+                    "USING fts5(tokens, tokenize='unicode61 remove_diacritics 0')"
+                ))
+            elif dialect == 'postgresql':
+                connection.execute(text(
+                    "CREATE TABLE IF NOT EXISTS chat_message_search ("
+                    "message_id INTEGER PRIMARY KEY, tsv TSVECTOR NOT NULL)"
+                ))
+                connection.execute(text(
+                    "CREATE INDEX IF NOT EXISTS ix_chat_message_search_tsv "
+                    "ON chat_message_search USING GIN (tsv)"
+                ))
+            else:
+                print(f"Chat full-text search is not available on {dialect}")
+                return
+        self.dialect = dialect
+
+    def index_message(self, connection, message_id: int, content: str):
+        tokens = index_tokens(content)
+        if self.dialect == 'sqlite':
+            connection.execute(
+                text("INSERT OR REPLACE INTO chat_messages_fts(rowid, tokens) VALUES (:id, :tokens)"),
+                {'id': message_id, 'tokens': tokens}
+            )
+        elif self.dialect == 'postgresql':
+            connection.execute(
+                text(
+                    "INSERT INTO chat_message_search(message_id, tsv) VALUES (:id, to_tsvector('simple', :tokens)) "
+                    "ON CONFLICT (message_id) DO UPDATE SET tsv = EXCLUDED.tsv"
+                ),
+                {'id': message_id, 'tokens': tokens}
+            )
+
+    def unindex_message(self, connection, message_id: int):
+        if self.dialect == 'sqlite':
+            connection.execute(text("DELETE FROM chat_messages_fts WHERE rowid = :id"), {'id': message_id})
+        elif self.dialect == 'postgresql':
+            connection.execute(text("DELETE FROM chat_message_search WHERE message_id = :id"), {'id': message_id})
+
+    def reindex(self) -> int:
+        """Rebuild the index from chat_messages in id-ordered batches.
+
+        Rows are upserted in place and entries for messages that no longer
+        exist are swept afterwards, so search keeps answering from the live
+        index throughout and a failed rebuild leaves it whole.
+        """
+        if not self.enabled:
+            return 0
+
+        indexed, last_id = 0, 0
+        while True:
+            rows = db.session.query(ChatMessage.id, ChatMessage.content)\
+                .filter(ChatMessage.id > last_id)\
+                .order_by(ChatMessage.id.asc())\
+                .limit(REINDEX_BATCH)\
+                .all()
+            if not rows:
+                break
+            with db.engine.begin() as connection:
+                for message_id, content in rows:
+                    self.index_message(connection, message_id, content)
+            indexed += len(rows)
+            last_id = rows[-1][0]
+
+        with db.engine.begin() as connection:
+            if self.dialect == 'sqlite':
+                connection.execute(text(
+                    "DELETE FROM chat_messages_fts WHERE rowid NOT IN (SELECT id FROM chat_messages)"
+                ))
+            else:
+                connection.execute(text(
+                    "DELETE FROM chat_message_search s "
+                    "WHERE NOT EXISTS (SELECT 1 FROM chat_messages m WHERE m.id = s.message_id)"
+                ))
+        return indexed
+
+    def _match_ids(self, query: str):
+        """Subquery of message ids matching every phrase of the query"""
+        phrases = tokenize_phrases(query)
+        if not phrases:
+            return None
+        if self.dialect == 'sqlite':
+            match = ' AND '.join('"' + ' '.join(phrase).replace('"', '""') + '"' for phrase in phrases)
+            return select(fts_table.c.rowid).where(fts_table.c.tokens.match(match))
+
+        tsquery = func.phraseto_tsquery('simple', ' '.join(phrases[0]))
+        for phrase in phrases[1:]:
+            tsquery = tsquery.op('&&')(func.phraseto_tsquery('simple', ' '.join(phrase)))
+        return select(pg_search_table.c.message_id).where(pg_search_table.c.tsv.op('@@')(tsquery))
+
+    def search(self, user_id: int, query: str, limit: int = 20, before: Optional[str] = None,
+               session_id: Optional[int] = None) -> Dict[str, Any]:
+        """Newest-first matches across a user's sessions; pass `next_cursor` as `before` for more"""
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        empty = {'results': [], 'next_cursor': None, 'has_more': False}
+        if not self.enabled:
+            return empty
+        match_ids = self._match_ids(query)
+        if match_ids is None:
+            return empty
+
+        rows_query = db.session.query(ChatMessage, ChatSession.title)\
+            .join(ChatSession, ChatSession.id == ChatMessage.session_id)\
+            .filter(ChatSession.user_id == user_id, ChatMessage.id.in_(match_ids))
+        if session_id is not None:
+            rows_query = rows_query.filter(ChatMessage.session_id == session_id)
+        if before:
+            timestamp, row_id = decode_cursor(before)
+            rows_query = rows_query.filter(before_position(ChatMessage.timestamp, ChatMessage.id, timestamp, row_id))
+
+        rows = rows_query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())\
+                         .limit(limit + 1)\
+                         .all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+
+        results = []
+        for message, session_title in rows:
+            results.append({
+                'message_id': message.id,
+                'session_id': message.session_id,
+                'session_title': session_title,
+                'role': message.role,
+                'timestamp': message.timestamp.isoformat() if message.timestamp else None,
+                'snippet': highlight_snippet(message.content, query)
+            })
+
+        last = rows[-1][0] if rows else None
+        return {
+            'results': results,
+            'next_cursor': encode_cursor(last.timestamp, last.id) if last and has_more else None,
+            'has_more': has_more
+        }
+
+# Create global instance
+chat_search_service = ChatSearchService()
+
+@event.listens_for(ChatMessage, 'after_insert')
+def _index_inserted_message(mapper, connection, target):
+    if chat_search_service.enabled:
+        chat_search_service.index_message(connection, target.id, target.content)
+
+@event.listens_for(ChatMessage, 'after_delete')
+def _unindex_deleted_message(mapper, connection, target):
+    if chat_search_service.enabled:
+        chat_search_service.unindex_message(connection, target.id)
@@ -0,0 +1,209 @@
+import json
+import time
+from contextlib import nullcontext
+from datetime import datetime
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Iterator, Optional
+from src.models.chat import ChatSession, ChatMessage, db
+from src.services.llm_gateway_service import llm_gateway
+from src.services.chat_telemetry_service import chat_telemetry, TurnTelemetry, activate, stage
+from src.config import Config
+
+FALLBACK_ERROR = 'เกิดข้อผิดพลาดในการสร้างคำตอบ'
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+class ChatStreamService:
+    """Streams a chat reply as server-sent events.
+
+    Sources are sent as soon as retrieval finishes, then generated text is sent
+    token by token; both messages are persisted once the stream completes.
+    """
+
+    def __init__(self, rag_service, ai_service, conversation_memory=None, write_buffer=None, retriever=None):
+        self.rag_service = rag_service
+        self.retriever = retriever
+        self.ai_service = ai_service
+        self.conversation_memory = conversation_memory
+        self.write_buffer = write_buffer
+
+    def _build_prompt(self, query: str, context: str) -> str:
+        if not context:
+            return query
+        return (
+            "Use the following context to answer the question.\n\n"
+            f"Context:\n{context}\n\n"
+            f"Question: {query}"
+        )
+
+    @staticmethod
+    def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+        """Seconds left before deadline_at (None when there is no deadline)"""
+        if deadline_at is None:
+            return None
+        remaining = deadline_at - time.monotonic()
+        if remaining <= 0:
+            raise FutureTimeoutError('chat request deadline exceeded')
+        return remaining
+
+    def _bounded(self, chunks, deadline_at: Optional[float]) -> Iterator[str]:
+        for chunk in chunks:
+            self._remaining(deadline_at)
+            yield chunk
+
+    def stream_generation(self, query: str, context: str = "",
+                          deadline_at: Optional[float] = None) -> Iterator[str]:
+        """Yield generated text chunks, falling back to a single blocking call.
+
+        `deadline_at` (time.monotonic()) bounds waiting for a slot, the stream
+        itself and the fallback call.
+        """
+        started = False
+        backend_stream = getattr(llm_gateway.backend, 'stream_generate', None)
+        if backend_stream is not None:
+            # Backends with native streaming (e.g. the offline stub) skip the Gemini client
+            with llm_gateway.slot('gemini', timeout=self._remaining(deadline_at)):
+                yield from self._bounded(backend_stream(query, context or None), deadline_at)
+            return
+
+        if Config.GOOGLE_API_KEY:
+            try:
+                import google.generativeai as genai
+                genai.configure(api_key=Config.GOOGLE_API_KEY)
+                model = genai.GenerativeModel(Config.GEMINI_MODEL)
+                # Streams hold a gateway slot for their whole duration
+                with llm_gateway.slot('gemini', timeout=self._remaining(deadline_at)):
+                    stream = model.generate_content(self._build_prompt(query, context), stream=True)
+                    for chunk in self._bounded(stream, deadline_at):
+                        text = getattr(chunk, 'text', '')
+                        if text:
+                            started = True
+                            yield text
+                return
+            except Exception as e:
+                # Once tokens have gone out we cannot restart the answer
+                if started:
+                    raise
+                print(f"Error streaming from Gemini, falling back to blocking call: {e}")
+
+        remaining = self._remaining(deadline_at)
+        with llm_gateway.deadline(remaining) if remaining is not None else nullcontext():
+            if context:
+                result = self.ai_service.generate_with_gemini(query, context)
+            else:
+                result = self.ai_service.generate_with_gemini(query)
+        if 'error' in result:
+            raise RuntimeError(result['error'])
+        yield result.get('response', '')
+
+    def stream_reply(self, session_id: int, user_message: str, use_rag: bool = True, app=None,
+                     user_id: Optional[int] = None) -> Iterator[str]:
+        """Generate SSE events for one chat turn (run under stream_with_context)"""
+        context = ""
+        sources = None
+        confidence = None
+        # Made current only around blocks without a yield; generation is timed here directly
+        turn = TurnTelemetry(session_id, user_id, streamed=True, use_rag=use_rag)
+
+        try:
+            with activate(turn):
+                history = self.conversation_memory.build_history(session_id) if self.conversation_memory else ""
+            # Retrieval and generation share one deadline, as in the blocking chat path.
+            # The gateway deadline is entered only around blocks without a yield;
+            # generation is bounded through deadline_at.
+            deadline_at = time.monotonic() + Config.CHAT_REQUEST_DEADLINE_SECONDS
+            with activate(turn), llm_gateway.deadline(Config.CHAT_REQUEST_DEADLINE_SECONDS):
+                if use_rag:
+                    if self.retriever:
+                        retrieved = self.retriever.retrieve_context(user_message, user_id=user_id)
+                    else:
+                        retrieved = self.rag_service.retrieve_context(user_message)
+                    turn.set_retrieved(retrieved)
+                    context = retrieved['context']
+                    sources = retrieved['sources']
+                    confidence = retrieved['confidence']
+                if history:
+                    context = f"{history}\n\n{context}" if context else history
+            yield format_sse('sources', {'sources': sources or [], 'confidence': confidence})
+
+            if use_rag and not sources:
+                chunks = ['ไม่พบข้อมูลที่เกี่ยวข้องในฐานข้อมูล']
+                confidence = 0.0
+            else:
+                chunks = self.stream_generation(user_message, context, deadline_at=deadline_at)
+
+            parts = []
+            generation_started = time.monotonic()
+            for chunk in chunks:
+                turn.mark_first_token()
+                parts.append(chunk)
+                yield format_sse('token', {'text': chunk})
+            turn.add('llm', (time.monotonic() - generation_started) * 1000)
+            ai_response = ''.join(parts)
+            turn.set_tokens(f"{context}\n\n{user_message}", ai_response)
+
+        except GeneratorExit:
+            # Client disconnected; nothing is persisted for an abandoned turn
+            turn.error = 'client disconnected'
+            chat_telemetry.record(turn)
+            return
+        except Exception as e:
+            print(f"Error streaming chat reply: {e}")
+            turn.error = str(e)
+            chat_telemetry.record(turn)
+            yield format_sse('error', {'error': str(e) or FALLBACK_ERROR})
+            return
+
+        try:
+            with activate(turn):
+                user_msg, ai_msg = self.persist_turn(session_id, user_message, ai_response, sources, confidence)
+            turn.message_id = ai_msg.id
+        except Exception as e:
+            db.session.rollback()
+            turn.error = str(e)
+            chat_telemetry.record(turn)
+            yield format_sse('error', {'error': str(e)})
+            return
+
+        chat_telemetry.record(turn)
+        if self.conversation_memory and app is not None:
+            self.conversation_memory.schedule_summary(session_id, app)
+        yield format_sse('done', {
+            'user_message': user_msg.to_dict(),
+            'ai_response': ai_msg.to_dict()
+        })
+
+    def persist_turn(self, session_id: int, user_message: str, ai_response: str,
+                     sources: Optional[list], confidence: Optional[float]):
+        """Save the user message and the completed AI response"""
+        if self.write_buffer and self.write_buffer.running:
+            return self.write_buffer.enqueue_turn(
+                session_id, user_message, ai_response,
+                json.dumps(sources) if sources is not None else None, confidence
+            )
+
+        user_msg = ChatMessage(
+            session_id=session_id,
+            role='user',
+            content=user_message
+        )
+        ai_msg = ChatMessage(
+            session_id=session_id,
+            role='assistant',
+            content=ai_response,
+            sources=json.dumps(sources) if sources is not None else None,
+            confidence_score=confidence
+        )
+        db.session.add(user_msg)
+        db.session.add(ai_msg)
+
+        # Update session timestamp
+        session = ChatSession.query.get(session_id)
+        if session:
+            session.updated_at = datetime.utcnow()
+
+        with stage('db_commit'):
+            db.session.commit()
+        return user_msg, ai_msg
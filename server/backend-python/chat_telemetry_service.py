@@ -0,0 +1,255 @@
+import json
+import time
+import atexit
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import numpy as np
+from sqlalchemy import insert
+from src.models.user import db
+from src.models.enhanced_models import ChatTurnTelemetry
+from src.services.context_packing_service import estimate_tokens
+from src.config import Config
+
+STAGES = ('embed', 'search', 'hydrate', 'retrieval', 'llm', 'db_commit')
+
+# Turn being measured on this request; copied into retrieval worker threads
+_current_turn = contextvars.ContextVar('chat_turn_telemetry', default=None)
+
+class TurnTelemetry:
+    """Stage timings and retrieval details of one chat turn.
+
+    Stage times are summed, so stages run concurrently by the retrieval fan-out
+    (embed, search, hydrate) can add up to more than retrieval_ms, which is
+    the wall time of the fan-out itself.
+    """
+
+    def __init__(self, session_id: int, user_id: Optional[int] = None, streamed: bool = False, use_rag: bool = True):
+        self.started = time.monotonic()
+        self.created_at = datetime.utcnow()
+        self.session_id = session_id
+        self.user_id = user_id
+        self.streamed = streamed
+        self.use_rag = use_rag
+        self.stages_ms = {name: 0.0 for name in STAGES}
+        self.first_token_ms = None
+        self.message_id = None
+        self.doc_ids: List[Any] = []
+        self.retrieval: Dict[str, Any] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.context_tokens = 0
+        self.error = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, ms: float):
+        with self._lock:
+            self.stages_ms[name] = self.stages_ms.get(name, 0.0) + ms
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add(name, (time.monotonic() - started) * 1000)
+
+    def mark_first_token(self):
+        if self.first_token_ms is None:
+            self.first_token_ms = (time.monotonic() - self.started) * 1000
+
+    def set_retrieved(self, retrieved: Optional[Dict[str, Any]]):
+        """Record document ids, per-source status and packed context size"""
+        if not retrieved:
+            return
+        for source in retrieved.get('sources') or []:
+            metadata = source.get('metadata') or {}
+            doc_id = metadata.get('document_id') or metadata.get('id')
+            if doc_id is not None:
+                self.doc_ids.append(doc_id)
+        self.retrieval = retrieved.get('retrieval') or {}
+        self.context_tokens = (retrieved.get('context_stats') or {}).get('context_tokens', 0)
+
+    def set_tokens(self, prompt: str, completion: str):
+        self.prompt_tokens = estimate_tokens(prompt or '')
+        self.completion_tokens = estimate_tokens(completion or '')
+
+    def to_row(self) -> Dict[str, Any]:
+        row = {f"{name}_ms": round(ms, 2) for name, ms in self.stages_ms.items() if name in STAGES}
+        row.update({
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'message_id': self.message_id,
+            'streamed': self.streamed,
+            'use_rag': self.use_rag,
+            'first_token_ms': round(self.first_token_ms, 2) if self.first_token_ms is not None else None,
+            'total_ms': round((time.monotonic() - self.started) * 1000, 2),
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'context_tokens': self.context_tokens,
+            'retrieved_doc_ids': json.dumps(self.doc_ids),
+            'retrieval': json.dumps(self.retrieval),
+            'error': (self.error or '')[:255] or None,
+            'created_at': self.created_at
+        })
+        return row
+
+@contextmanager
+def stage(name: str):
+    """Time a block against the current turn; a no-op outside a measured turn"""
+    turn = _current_turn.get()
+    if turn is None:
+        yield
+        return
+    with turn.stage(name):
+        yield
+
+@contextmanager
+def activate(turn: Optional[TurnTelemetry]):
+    """Make `turn` current for a block (for generators, which cannot hold a context across yields)"""
+    token = _current_turn.set(turn)
+    try:
+        yield turn
+    finally:
+        _current_turn.reset(token)
+
+class ChatTelemetryRecorder:
+    """Collects per-turn telemetry off the request path.
+
+    Finished turns go into a ring buffer of the last CHAT_TELEMETRY_RING_SIZE
+    turns (for live percentiles) and a pending list that a background thread
+    bulk-inserts into chat_turn_telemetry every CHAT_TELEMETRY_FLUSH_SECONDS.
+    If the database falls behind, the oldest pending rows are dropped rather
+    than letting the buffer grow.
+    """
+
+    def __init__(self, enabled=None, ring_size=None, flush_seconds=None, max_pending=None):
+        self.enabled = Config.CHAT_TELEMETRY_ENABLED if enabled is None else enabled
+        self.ring = deque(maxlen=ring_size or Config.CHAT_TELEMETRY_RING_SIZE)
+        self.interval = flush_seconds or Config.CHAT_TELEMETRY_FLUSH_SECONDS
+        self.max_pending = max_pending or Config.CHAT_TELEMETRY_MAX_PENDING
+
+        self.app = None
+        self._pending: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        self.stats = {'recorded': 0, 'flushed': 0, 'dropped': 0, 'failed_flushes': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        if self.running or not self.enabled:
+            return
+        self.app = app
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='chat-telemetry', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        if not self.running:
+            return
+        self._stopped.set()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    @contextmanager
+    def turn(self, session_id: int, user_id: Optional[int] = None, streamed: bool = False, use_rag: bool = True):
+        """Measure one turn; stages timed anywhere below this block are attributed to it"""
+        turn = TurnTelemetry(session_id, user_id, streamed, use_rag)
+        token = _current_turn.set(turn)
+        try:
+            yield turn
+        except Exception as e:
+            turn.error = str(e)
+            raise
+        finally:
+            _current_turn.reset(token)
+            self.record(turn)
+
+    def record(self, turn: TurnTelemetry):
+        if not self.enabled:
+            return
+        row = turn.to_row()
+        with self._lock:
+            self.ring.append(row)
+            self._pending.append(row)
+            overflow = len(self._pending) - self.max_pending
+            if overflow > 0:
+                del self._pending[:overflow]
+                self.stats['dropped'] += overflow
+            self.stats['recorded'] += 1
+
+    def flush(self) -> int:
+        """Insert pending rows in one statement; on failure they are put back"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+
+        try:
+            with self.app.app_context():
+                db.session.execute(insert(ChatTurnTelemetry), batch)
+                db.session.commit()
+        except Exception as e:
+            print(f"Error flushing chat telemetry: {e}")
+            try:
+                with self.app.app_context():
+                    db.session.rollback()
+            except Exception:
+                pass
+            with self._lock:
+                self._pending = batch + self._pending
+                overflow = len(self._pending) - self.max_pending
+                if overflow > 0:
+                    del self._pending[:overflow]
+                    self.stats['dropped'] += overflow
+                self.stats['failed_flushes'] += 1
+            return 0
+
+        with self._lock:
+            self.stats['flushed'] += len(batch)
+        return len(batch)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self.flush()
+
+    def recent(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """Live percentiles per stage over the turns in the ring buffer"""
+        with self._lock:
+            rows = list(self.ring)
+        if limit:
+            rows = rows[-limit:]
+        if not rows:
+            return {'turns': 0, 'stages': {}}
+
+        stages = {}
+        for column in [f"{name}_ms" for name in STAGES] + ['first_token_ms', 'total_ms']:
+            values = np.array([row[column] for row in rows if row.get(column) is not None], dtype=float)
+            if len(values):
+                p50, p90, p95, p99 = np.percentile(values, [50, 90, 95, 99])
+                stages[column[:-3]] = {
+                    'p50': round(float(p50), 1), 'p90': round(float(p90), 1),
+                    'p95': round(float(p95), 1), 'p99': round(float(p99), 1),
+                    'mean': round(float(values.mean()), 1)
+                }
+        return {
+            'turns': len(rows),
+            'errors': sum(1 for row in rows if row.get('error')),
+            'stages': stages
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {**self.stats, 'enabled': self.enabled, 'running': self.running, 'pending': pending}
+
+# Create global instance
+chat_telemetry = ChatTelemetryRecorder()
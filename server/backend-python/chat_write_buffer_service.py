@@ -0,0 +1,271 @@
+import os
+import json
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from sqlalchemy import update, text
+from src.models.chat import ChatSession, ChatMessage, db
+from src.config import Config
+
+class ChatWriteBuffer:
+    """Write-behind buffer for chat messages.
+
+    Requests enqueue finished messages and return immediately; a background
+    thread inserts them in bulk and bumps ChatSession.updated_at once per
+    session per flush. With a journal configured, every enqueue is appended
+    (and optionally fsync'd) to a local file first and replayed on startup, so
+    a crash loses nothing that was acknowledged. Replay is at-least-once: a
+    crash between commit and journal compaction can re-insert the last batch.
+
+    A batch that fails while the database is reachable is bisected until the
+    rows it rejects are isolated; those go to a dead-letter file so one bad
+    row cannot stall the buffer. Rows being committed stay visible to
+    readers, who merge them with database rows without double-counting.
+    """
+
+    def __init__(self, interval_ms=None, max_batch=None, journal_path=None, fsync=None, dead_letter_path=None):
+        self.interval = (interval_ms or Config.CHAT_WRITE_BEHIND_INTERVAL_MS) / 1000.0
+        self.max_batch = max_batch or Config.CHAT_WRITE_BEHIND_MAX_BATCH
+        self.journal_path = journal_path if journal_path is not None else Config.CHAT_WRITE_BEHIND_JOURNAL
+        self.fsync = Config.CHAT_WRITE_BEHIND_FSYNC if fsync is None else fsync
+        self.dead_letter_path = dead_letter_path or Config.CHAT_WRITE_BEHIND_DEAD_LETTER
+
+        self.app = None
+        self._pending: List[Dict[str, Any]] = []
+        self._inflight: List[Dict[str, Any]] = []  # taken by the flush thread, not yet committed
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        self._journal = None
+        self.stats = {'enqueued': 0, 'flushed': 0, 'flushes': 0, 'failed_flushes': 0, 'dead_lettered': 0, 'replayed': 0}
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, app):
+        """Replay the journal and start the flush thread"""
+        if self.running:
+            return
+        self.app = app
+        if self.journal_path:
+            self._replay_journal()
+            self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='chat-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Flush whatever is pending and stop the thread"""
+        if not self.running:
+            return
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join(timeout=10)
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+
+    def _row(self, session_id: int, role: str, content: str, sources: Optional[str] = None,
+             confidence_score: Optional[float] = None) -> Dict[str, Any]:
+        return {
+            'session_id': session_id,
+            'role': role,
+            'content': content,
+            'sources': sources,
+            'confidence_score': confidence_score,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+    def _message(self, row: Dict[str, Any]) -> ChatMessage:
+        """Transient (unsaved) ChatMessage for a buffered row"""
+        return ChatMessage(**{**row, 'timestamp': datetime.fromisoformat(row['timestamp'])})
+
+    def enqueue_turn(self, session_id: int, user_message: str, ai_response: str,
+                     sources: Optional[str] = None, confidence: Optional[float] = None):
+        """Buffer a user/assistant pair; returns transient messages for the response.
+
+        The returned messages have no id until the next flush.
+        """
+        rows = [
+            self._row(session_id, 'user', user_message),
+            self._row(session_id, 'assistant', ai_response, sources, confidence)
+        ]
+        with self._lock:
+            if self._journal:
+                for row in rows:
+                    self._journal.write(json.dumps(row, ensure_ascii=False) + '\n')
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            self._pending.extend(rows)
+            self.stats['enqueued'] += len(rows)
+            full = len(self._pending) >= self.max_batch
+        if full:
+            self._wakeup.set()
+        return self._message(rows[0]), self._message(rows[1])
+
+    def pending_for_session(self, session_id: int) -> List[ChatMessage]:
+        """Buffered messages for a session that may not be in the database yet"""
+        with self._lock:
+            rows = [row for row in self._inflight + self._pending if row['session_id'] == session_id]
+        return [self._message(row) for row in rows]
+
+    @staticmethod
+    def merge_pending(messages: List[ChatMessage], pending: List[ChatMessage]) -> List[ChatMessage]:
+        """Append buffered messages to database rows, skipping any committed in between.
+
+        Take `pending` before querying the database: a row flushed between the
+        two reads is then in both and dropped here, rather than in neither.
+        """
+        seen = {(message.role, message.timestamp, message.content) for message in messages}
+        return messages + [
+            message for message in pending
+            if (message.role, message.timestamp, message.content) not in seen
+        ]
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            while self.flush():
+                pass
+        while self.flush():
+            pass
+
+    def _commit(self, rows: List[Dict[str, Any]]):
+        """Insert rows and bump ChatSession.updated_at in one transaction"""
+        with self.app.app_context():
+            try:
+                # ORM inserts (not Core) so mapper events on ChatMessage still fire
+                db.session.add_all([self._message(row) for row in rows])
+                latest = {}
+                for row in rows:
+                    latest[row['session_id']] = max(latest.get(row['session_id'], ''), row['timestamp'])
+                for session_id, timestamp in latest.items():
+                    db.session.execute(
+                        update(ChatSession)
+                        .where(ChatSession.id == session_id)
+                        .values(updated_at=datetime.fromisoformat(timestamp))
+                    )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _database_reachable(self) -> bool:
+        try:
+            with self.app.app_context():
+                db.session.execute(text('SELECT 1'))
+                db.session.rollback()
+            return True
+        except Exception:
+            return False
+
+    def _commit_or_split(self, rows: List[Dict[str, Any]], retry: List, dead: List) -> int:
+        """Commit rows, bisecting around rows the database rejects; returns rows committed"""
+        try:
+            self._commit(rows)
+            return len(rows)
+        except Exception as e:
+            if not self._database_reachable():
+                # Outage, not bad data: keep everything for the next flush
+                retry.extend(rows)
+                return 0
+            if len(rows) == 1:
+                dead.append((rows[0], str(e)))
+                return 0
+            middle = len(rows) // 2
+            return (self._commit_or_split(rows[:middle], retry, dead) +
+                    self._commit_or_split(rows[middle:], retry, dead))
+
+    def flush(self) -> int:
+        """Insert buffered messages in one transaction; returns rows taken off the buffer"""
+        with self._lock:
+            batch = self._pending[:self.max_batch]
+            del self._pending[:len(batch)]
+            self._inflight = batch
+        if not batch:
+            return 0
+
+        retry, dead = [], []
+        try:
+            committed = self._commit_or_split(batch, retry, dead)
+        except Exception as e:
+            print(f"Error flushing chat write buffer: {e}")
+            committed, retry, dead = 0, batch, []
+
+        with self._lock:
+            self._inflight = []
+            self._pending[:0] = retry
+            self.stats['flushed'] += committed
+            self.stats['flushes'] += 1
+            if retry:
+                self.stats['failed_flushes'] += 1
+            if dead:
+                self._dead_letter(dead)
+            if self._journal and (committed or dead):
+                self._compact_journal()
+
+        if retry:
+            print(f"Error flushing chat write buffer: database unavailable, {len(retry)} messages kept")
+        return len(batch) - len(retry)
+
+    def _dead_letter(self, rows):
+        """Append rows the database rejected, with the error (caller holds the lock)"""
+        self.stats['dead_lettered'] += len(rows)
+        print(f"Moving {len(rows)} rejected chat messages to {self.dead_letter_path}")
+        try:
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                for row, error in rows:
+                    f.write(json.dumps({**row, 'error': error}, ensure_ascii=False) + '\n')
+        except Exception as e:
+            print(f"Error writing chat dead-letter file: {e}")
+
+    def _compact_journal(self):
+        """Rewrite the journal with only the rows still pending (caller holds the lock)"""
+        self._journal.close()
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self._pending:
+                f.write(json.dumps(row, ensure_ascii=False) + '\n')
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def _replay_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._pending.append(json.loads(line))
+                except ValueError:
+                    # A torn final line from a crash mid-write
+                    print(f"Skipping unreadable chat journal line: {line[:80]}")
+        self.stats['replayed'] = len(self._pending)
+        if self._pending:
+            print(f"Replaying {len(self._pending)} chat messages from write-behind journal")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            pending = len(self._pending)
+        return {
+            **self.stats,
+            'enabled': self.running,
+            'pending': pending,
+            'journal': self.journal_path or None,
+            'dead_letter': self.dead_letter_path,
+            'fsync': self.fsync
+        }
+
+# Create global instance
+chat_write_buffer = ChatWriteBuffer()
@@ -11,11 +11,93 @@ class Config:
     # AI API Keys
     GOOGLE_API_KEY = os.environ.get('GOOGLE_API_KEY')
     HUGGINGFACE_API_KEY = os.environ.get('HUGGINGFACE_API_KEY')
+    GEMINI_MODEL = os.environ.get('GEMINI_MODEL') or 'gemini-pro'
+    
+    # LLM backend: 'gemini' or 'stub' (offline load testing)
+    LLM_BACKEND = os.environ.get('LLM_BACKEND') or 'gemini'
+    LLM_STUB_LATENCY_MS = float(os.environ.get('LLM_STUB_LATENCY_MS', 400))
+    LLM_STUB_LATENCY_SIGMA = float(os.environ.get('LLM_STUB_LATENCY_SIGMA', 0.5))
+    LLM_STUB_TOKENS_PER_SECOND = float(os.environ.get('LLM_STUB_TOKENS_PER_SECOND', 50))
+    LLM_STUB_RESPONSE_TOKENS = int(os.environ.get('LLM_STUB_RESPONSE_TOKENS', 120))
+    LLM_STUB_SEED = int(os.environ.get('LLM_STUB_SEED', 42))
+    
+    # LLM gateway (per-provider concurrency caps and deadlines)
+    LLM_GEMINI_CONCURRENCY = int(os.environ.get('LLM_GEMINI_CONCURRENCY', 4))
+    LLM_EMBEDDINGS_CONCURRENCY = int(os.environ.get('LLM_EMBEDDINGS_CONCURRENCY', 8))
+    LLM_TIMEOUT_SECONDS = float(os.environ.get('LLM_TIMEOUT_SECONDS', 30))
+    LLM_GATEWAY_WORKERS = int(os.environ.get('LLM_GATEWAY_WORKERS', 32))
+    CHAT_REQUEST_DEADLINE_SECONDS = float(os.environ.get('CHAT_REQUEST_DEADLINE_SECONDS', 45))
     
     # External APIs
     N8N_WEBHOOK_URL = os.environ.get('N8N_WEBHOOK_URL')
     GOOGLE_DRIVE_CREDENTIALS = os.environ.get('GOOGLE_DRIVE_CREDENTIALS')
     GOOGLE_SHEETS_CREDENTIALS = os.environ.get('GOOGLE_SHEETS_CREDENTIALS')
     NOTION_API_KEY = os.environ.get('NOTION_API_KEY')
+    NOTION_TIMEOUT_SECONDS = float(os.environ.get('NOTION_TIMEOUT_SECONDS', 5))
     AIRTABLE_API_KEY = os.environ.get('AIRTABLE_API_KEY')
-
+    
+    # RAG near-duplicate detection
+    DEDUP_ENABLED = os.environ.get('DEDUP_ENABLED', 'true').lower() == 'true'
+    DEDUP_MODE = os.environ.get('DEDUP_MODE') or 'link'  # 'skip' or 'link'
+    DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', 0.9))
+    DEDUP_NUM_PERM = int(os.environ.get('DEDUP_NUM_PERM', 128))
+    DEDUP_BANDS = int(os.environ.get('DEDUP_BANDS', 32))
+    
+    # RAG hot/cold index tiering
+    RAG_HOT_INDEX_PATH = os.environ.get('RAG_HOT_INDEX_PATH') or 'faiss_index.bin'
+    RAG_COLD_INDEX_PATH = os.environ.get('RAG_COLD_INDEX_PATH') or 'faiss_cold_index.bin'
+    RAG_COLD_AFTER_DAYS = int(os.environ.get('RAG_COLD_AFTER_DAYS', 7))
+    RAG_PROMOTE_HITS = int(os.environ.get('RAG_PROMOTE_HITS', 3))
+    RAG_COLD_SEARCH_MIN_SCORE = float(os.environ.get('RAG_COLD_SEARCH_MIN_SCORE', 0.5))
+    RAG_COLD_NLIST = int(os.environ.get('RAG_COLD_NLIST', 256))
+    RAG_COLD_NPROBE = int(os.environ.get('RAG_COLD_NPROBE', 16))
+    RAG_TIER_MIGRATION_MINUTES = int(os.environ.get('RAG_TIER_MIGRATION_MINUTES', 30))
+    RAG_CONSISTENCY_CHECK_MINUTES = int(os.environ.get('RAG_CONSISTENCY_CHECK_MINUTES', 60))
+    
+    # RAG context packing
+    RAG_CONTEXT_MAX_TOKENS = int(os.environ.get('RAG_CONTEXT_MAX_TOKENS', 1000))
+    RAG_CONTEXT_CHUNK_TOKENS = int(os.environ.get('RAG_CONTEXT_CHUNK_TOKENS', 200))
+    RAG_CONTEXT_MMR_LAMBDA = float(os.environ.get('RAG_CONTEXT_MMR_LAMBDA', 0.7))
+    RAG_CONTEXT_CANDIDATES = int(os.environ.get('RAG_CONTEXT_CANDIDATES', 8))
+    # Passages kept after cheap pre-ranking, before MMR's pairwise comparisons
+    RAG_CONTEXT_MAX_CHUNKS = int(os.environ.get('RAG_CONTEXT_MAX_CHUNKS', 32))
+    RAG_CONTEXT_EMBED_CACHE_SIZE = int(os.environ.get('RAG_CONTEXT_EMBED_CACHE_SIZE', 20000))
+    
+    # Chat retrieval fan-out (per-source deadlines)
+    RAG_FANOUT_LOCAL_TIMEOUT_MS = int(os.environ.get('RAG_FANOUT_LOCAL_TIMEOUT_MS', 1500))
+    RAG_FANOUT_USER_TIMEOUT_MS = int(os.environ.get('RAG_FANOUT_USER_TIMEOUT_MS', 1500))
+    RAG_FANOUT_NOTION_ENABLED = os.environ.get('RAG_FANOUT_NOTION_ENABLED', 'false').lower() == 'true'
+    RAG_FANOUT_NOTION_TIMEOUT_MS = int(os.environ.get('RAG_FANOUT_NOTION_TIMEOUT_MS', 2500))
+    RAG_FANOUT_NOTION_PAGES = int(os.environ.get('RAG_FANOUT_NOTION_PAGES', 2))
+    RAG_FANOUT_RRF_K = int(os.environ.get('RAG_FANOUT_RRF_K', 60))
+    
+    # Chat conversation memory
+    CHAT_MEMORY_RECENT_TURNS = int(os.environ.get('CHAT_MEMORY_RECENT_TURNS', 6))
+    CHAT_MEMORY_SUMMARY_BATCH = int(os.environ.get('CHAT_MEMORY_SUMMARY_BATCH', 10))
+    CHAT_MEMORY_SUMMARY_MAX_TOKENS = int(os.environ.get('CHAT_MEMORY_SUMMARY_MAX_TOKENS', 400))
+    
+    # Analytics daily rollups
+    ANALYTICS_ROLLUP_MINUTES = int(os.environ.get('ANALYTICS_ROLLUP_MINUTES', 5))
+    ANALYTICS_ROLLUP_BATCH = int(os.environ.get('ANALYTICS_ROLLUP_BATCH', 50000))
+    ANALYTICS_ROLLUP_LAG_SECONDS = int(os.environ.get('ANALYTICS_ROLLUP_LAG_SECONDS', 10))
+    ANALYTICS_SNAPSHOT_TTL_SECONDS = int(os.environ.get('ANALYTICS_SNAPSHOT_TTL_SECONDS', 30))
+    ANALYTICS_CACHE_TTL_SECONDS = int(os.environ.get('ANALYTICS_CACHE_TTL_SECONDS', 60))
+    ANALYTICS_CACHE_REDIS_URL = os.environ.get('ANALYTICS_CACHE_REDIS_URL')
+    ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES', 2048))
+    ANALYTICS_COHORT_TTL_SECONDS = int(os.environ.get('ANALYTICS_COHORT_TTL_SECONDS', 600))
+    ANALYTICS_EXPORT_BATCH = int(os.environ.get('ANALYTICS_EXPORT_BATCH', 10000))
+    ANALYTICS_STREAM_INTERVAL_SECONDS = float(os.environ.get('ANALYTICS_STREAM_INTERVAL_SECONDS', 1.0))
+    
+    # Per-turn chat latency telemetry
+    CHAT_TELEMETRY_ENABLED = os.environ.get('CHAT_TELEMETRY_ENABLED', 'true').lower() == 'true'
+    CHAT_TELEMETRY_RING_SIZE = int(os.environ.get('CHAT_TELEMETRY_RING_SIZE', 2000))
+    CHAT_TELEMETRY_FLUSH_SECONDS = int(os.environ.get('CHAT_TELEMETRY_FLUSH_SECONDS', 5))
+    CHAT_TELEMETRY_MAX_PENDING = int(os.environ.get('CHAT_TELEMETRY_MAX_PENDING', 10000))
+    
+    # Chat write-behind persistence (messages get ids only once flushed)
+    CHAT_WRITE_BEHIND_ENABLED = os.environ.get('CHAT_WRITE_BEHIND_ENABLED', 'false').lower() == 'true'
+    CHAT_WRITE_BEHIND_INTERVAL_MS = int(os.environ.get('CHAT_WRITE_BEHIND_INTERVAL_MS', 200))
+    CHAT_WRITE_BEHIND_MAX_BATCH = int(os.environ.get('CHAT_WRITE_BEHIND_MAX_BATCH', 500))
+    CHAT_WRITE_BEHIND_JOURNAL = os.environ.get('CHAT_WRITE_BEHIND_JOURNAL', 'chat_write_behind.journal')
+    CHAT_WRITE_BEHIND_FSYNC = os.environ.get('CHAT_WRITE_BEHIND_FSYNC', 'true').lower() == 'true'
+    CHAT_WRITE_BEHIND_DEAD_LETTER = os.environ.get('CHAT_WRITE_BEHIND_DEAD_LETTER', 'chat_write_behind.dead.jsonl')
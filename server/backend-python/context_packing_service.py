@@ -0,0 +1,281 @@
+import re
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import List, Dict, Any, Callable, Optional
+from src.config import Config
+
+_THAI_CHARS = re.compile(r'[\u0e00-\u0e7f]')
+_WORDS = re.compile(r'\w+', re.UNICODE)
+_SENTENCE_SPLIT = re.compile(r'(?<=[.!?。])\s+|\n+|(?<=[\u0e00-\u0e7f])\s{1,}(?=[\u0e00-\u0e7f])')
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count: ~4 chars per token for Latin text, ~2 for Thai"""
+    if not text:
+        return 0
+    thai = len(_THAI_CHARS.findall(text))
+    return (thai + 1) // 2 + (len(text) - thai + 3) // 4
+
+def _normalize(text: str) -> str:
+    return re.sub(r'\s+', ' ', text.lower()).strip()
+
+def _word_set(text: str) -> set:
+    words = set(_WORDS.findall(text.lower()))
+    # Thai has no spaces between words, so fall back to character bigrams
+    if _THAI_CHARS.search(text):
+        compact = ''.join(_THAI_CHARS.findall(text))
+        words.update(compact[i:i + 2] for i in range(len(compact) - 1))
+    return words
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+class ContextPacker:
+    """Assembles RAG context under a token budget.
+
+    Retrieved documents are split into passages, which are pre-ranked by a
+    cheap score (document score plus query word overlap) and cut to
+    max_candidates before any pairwise work. Passages are then picked greedily
+    by maximal marginal relevance until the budget is spent; each pick is only
+    compared with the remaining candidates, and near-identical copies of it are
+    collapsed. Sentences already emitted by an earlier passage are dropped, so
+    overlapping chunks never pay for the same text twice.
+
+    With an `embed` function, passage embeddings are kept in a bounded LRU
+    cache keyed by passage text; `precompute()` fills it at ingest so queries
+    only encode the query itself.
+    """
+
+    def __init__(self, embed: Optional[Callable[[List[str]], np.ndarray]] = None,
+                 chunk_tokens=None, mmr_lambda=None, duplicate_threshold=0.9,
+                 max_candidates=None, embed_cache_size=None):
+        self.embed = embed
+        self.chunk_tokens = chunk_tokens or Config.RAG_CONTEXT_CHUNK_TOKENS
+        self.mmr_lambda = mmr_lambda if mmr_lambda is not None else Config.RAG_CONTEXT_MMR_LAMBDA
+        self.duplicate_threshold = duplicate_threshold
+        self.max_candidates = max_candidates or Config.RAG_CONTEXT_MAX_CHUNKS
+        self.embed_cache_size = embed_cache_size or Config.RAG_CONTEXT_EMBED_CACHE_SIZE
+        self._embed_cache = OrderedDict()
+        self._embed_lock = threading.Lock()
+
+    def _pieces(self, text: str) -> List[str]:
+        """Paragraphs, with oversized ones broken into sentences and then character windows.
+
+        PDF text, CSV dumps and Notion pages often have no blank lines at all,
+        so a paragraph can be the whole document and would never fit the budget.
+        """
+        pieces = []
+        for paragraph in re.split(r'\n\s*\n', text):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if estimate_tokens(paragraph) <= self.chunk_tokens:
+                pieces.append(paragraph)
+                continue
+            for sentence in _SENTENCE_SPLIT.split(paragraph):
+                sentence = sentence.strip()
+                if not sentence:
+                    continue
+                tokens = estimate_tokens(sentence)
+                if tokens <= self.chunk_tokens:
+                    pieces.append(sentence)
+                    continue
+                window = max(1, len(sentence) * self.chunk_tokens // tokens)
+                pieces.extend(sentence[i:i + window] for i in range(0, len(sentence), window))
+        return pieces
+
+    def _split(self, doc: Dict[str, Any], doc_index: int) -> List[Dict[str, Any]]:
+        """Split a document into passages of roughly chunk_tokens each"""
+        chunks, current, current_tokens = [], [], 0
+        for paragraph in self._pieces(doc.get('text', '')):
+            tokens = estimate_tokens(paragraph)
+            if current and current_tokens + tokens > self.chunk_tokens:
+                chunks.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(paragraph)
+            current_tokens += tokens
+        if current:
+            chunks.append('\n'.join(current))
+
+        return [{
+            'text': text,
+            'title': doc.get('title') or 'Unknown',
+            'doc_index': doc_index,
+            'doc_score': float(doc.get('score', 0.0)),
+            'tokens': estimate_tokens(text)
+        } for text in chunks]
+
+    def _shortlist(self, query: str, chunks: List[Dict[str, Any]]):
+        """(indexes of the max_candidates best chunks by cheap relevance, their word sets, cheap scores)"""
+        query_words = _word_set(query)
+        word_sets = [_word_set(c['text']) for c in chunks]
+        cheap = np.array([
+            c['doc_score'] + _jaccard(query_words, words)
+            for c, words in zip(chunks, word_sets)
+        ])
+        order = np.argsort(-cheap, kind='stable')[:self.max_candidates]
+        return order, [word_sets[i] for i in order], cheap[order]
+
+    def _embeddings(self, texts: List[str]) -> np.ndarray:
+        """Unit-length passage embeddings, encoding only texts not already cached"""
+        keys = [hashlib.md5(text.encode('utf-8')).hexdigest() for text in texts]
+        found = {}
+        with self._embed_lock:
+            for key in keys:
+                if key in self._embed_cache:
+                    self._embed_cache.move_to_end(key)
+                    found[key] = self._embed_cache[key]
+
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            vectors = np.asarray(self.embed(list(missing.values())), dtype='float32')
+            vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            with self._embed_lock:
+                for key, vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._embed_cache[key] = vector
+                while len(self._embed_cache) > self.embed_cache_size:
+                    self._embed_cache.popitem(last=False)
+        return np.stack([found[key] for key in keys])
+
+    def precompute(self, text: str, batch_size: int = 64):
+        """Embed a document's passages ahead of time (called at ingest)"""
+        if self.embed is None or not text:
+            return
+        passages = [chunk['text'] for chunk in self._split({'text': text}, 0)]
+        for i in range(0, len(passages), batch_size):
+            self._embeddings(passages[i:i + batch_size])
+
+    def _features(self, query: str, candidates: List[Dict[str, Any]], word_sets: List[set],
+                  cheap: np.ndarray):
+        """Query relevance per candidate and the (matrix, sizes) used by _similarity_to"""
+        if self.embed is not None:
+            query_vector = np.asarray(self.embed([query]), dtype='float32')[0]
+            query_vector = query_vector / max(float(np.linalg.norm(query_vector)), 1e-12)
+            vectors = self._embeddings([c['text'] for c in candidates])
+            return vectors @ query_vector, (vectors, None)
+
+        # Binary candidate-by-word matrix: overlaps with one passage are a single mat-vec
+        vocabulary = {word: i for i, word in enumerate(set().union(*word_sets))}
+        matrix = np.zeros((len(candidates), len(vocabulary)), dtype='float32')
+        for row, words in enumerate(word_sets):
+            matrix[row, [vocabulary[word] for word in words]] = 1.0
+        return cheap, (matrix, matrix.sum(axis=1))
+
+    @staticmethod
+    def _similarity_to(features, i: int) -> np.ndarray:
+        """Similarity of every candidate to candidate i (cosine, or Jaccard of word sets)"""
+        matrix, sizes = features
+        overlap = matrix @ matrix[i]
+        if sizes is None:
+            return overlap
+        union = sizes + sizes[i] - overlap
+        return np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+    def pack(self, query: str, documents: List[Dict[str, Any]], max_tokens: int,
+             max_chars: Optional[int] = None) -> Dict[str, Any]:
+        """Pack documents ({'text', 'title', 'score'}) into a context string"""
+        candidate_tokens = sum(estimate_tokens(d.get('text', '')) for d in documents)
+        chunks = [chunk for i, doc in enumerate(documents) for chunk in self._split(doc, i)]
+        empty = {
+            'context': '',
+            'doc_indexes': [],
+            'stats': {
+                'candidate_tokens': candidate_tokens,
+                'context_tokens': 0,
+                'tokens_saved': candidate_tokens,
+                'chunks_considered': len(chunks),
+                'chunks_shortlisted': 0,
+                'chunks_selected': 0,
+                'duplicates_collapsed': 0
+            }
+        }
+        if not chunks:
+            return empty
+
+        order, word_sets, cheap = self._shortlist(query, chunks)
+        candidates = [chunks[i] for i in order]
+        relevance, features = self._features(query, candidates, word_sets, cheap)
+        tokens = np.array([c['tokens'] for c in candidates])
+
+        # Greedy MMR selection under the token budget. Redundancy is the running
+        # max similarity to the passages picked so far; near-identical copies of
+        # a pick are collapsed so they are never considered again.
+        active = np.ones(len(candidates), dtype=bool)
+        redundancy = np.zeros(len(candidates))
+        selected = []
+        collapsed = 0
+        budget = max_tokens
+        while budget > 0 and active.any():
+            scores = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * redundancy
+            fits = active & (tokens <= budget)
+            if fits.any():
+                best = int(np.argmax(np.where(fits, scores, -np.inf)))
+            elif not selected:
+                # Budget smaller than any passage: trim the best one rather than send no context
+                best = int(np.argmax(np.where(active, scores, -np.inf)))
+                text = candidates[best]['text']
+                candidates[best] = {**candidates[best], 'text': text[:len(text) * budget // tokens[best]]}
+                tokens[best] = estimate_tokens(candidates[best]['text'])
+            else:
+                break
+            selected.append(best)
+            active[best] = False
+            budget -= tokens[best]
+
+            similarity = self._similarity_to(features, best)
+            duplicates = active & (similarity >= self.duplicate_threshold)
+            collapsed += int(duplicates.sum())
+            active &= ~duplicates
+            redundancy = np.maximum(redundancy, similarity)
+
+        # Assemble per document in relevance order, dropping sentences already emitted
+        seen_sentences = set()
+        sentences_dropped = 0
+        by_doc = {}
+        for i in selected:
+            kept = []
+            for sentence in _SENTENCE_SPLIT.split(candidates[i]['text']):
+                if not sentence.strip():
+                    continue
+                key = hashlib.md5(_normalize(sentence).encode('utf-8')).hexdigest()
+                if key in seen_sentences:
+                    sentences_dropped += 1
+                    continue
+                seen_sentences.add(key)
+                kept.append(sentence.strip())
+            if kept:
+                by_doc.setdefault(candidates[i]['doc_index'], []).append(' '.join(kept))
+
+        # Only documents that actually made it into the context are reported
+        context = ""
+        doc_indexes = []
+        for doc_index, passages in by_doc.items():
+            block = f"Document: {documents[doc_index].get('title') or 'Unknown'}\n"
+            block += f"Content: {' ... '.join(passages)}\n\n"
+            if max_chars is not None and len(context) + len(block) > max_chars:
+                remaining_chars = max_chars - len(context)
+                if remaining_chars > 100:  # Only add if meaningful length remains
+                    context += block[:remaining_chars] + "...\n\n"
+                    doc_indexes.append(doc_index)
+                break
+            context += block
+            doc_indexes.append(doc_index)
+
+        context_tokens = estimate_tokens(context)
+        return {
+            'context': context,
+            'doc_indexes': doc_indexes,
+            'stats': {
+                'candidate_tokens': candidate_tokens,
+                'context_tokens': context_tokens,
+                'tokens_saved': max(candidate_tokens - context_tokens, 0),
+                'chunks_considered': len(chunks),
+                'chunks_shortlisted': len(candidates),
+                'chunks_selected': len(selected),
+                'duplicates_collapsed': collapsed + sentences_dropped
+            }
+        }
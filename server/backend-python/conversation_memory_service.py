@@ -0,0 +1,149 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from src.models.chat import ChatMessage, db
+from src.models.enhanced_models import ChatSessionSummary
+from src.services.context_packing_service import estimate_tokens
+from src.services.chat_history_service import before_position
+from src.config import Config
+
+ROLE_LABELS = {'user': 'User', 'assistant': 'Assistant'}
+
+class ConversationMemory:
+    """Bounded per-session memory: the last K turns verbatim plus a rolling summary.
+
+    Messages that fall out of the verbatim window are folded into the summary
+    incrementally by a background worker, so prompt size stays constant no
+    matter how long the session gets. Until a full batch of them has been
+    summarized they are still sent verbatim, so no turn is ever left out.
+    """
+
+    def __init__(self, ai_service, recent_turns=None, summary_batch=None, summary_max_tokens=None,
+                 write_buffer=None):
+        self.ai_service = ai_service
+        self.write_buffer = write_buffer
+        self.recent_turns = recent_turns or Config.CHAT_MEMORY_RECENT_TURNS
+        self.summary_batch = summary_batch or Config.CHAT_MEMORY_SUMMARY_BATCH
+        self.summary_max_tokens = summary_max_tokens or Config.CHAT_MEMORY_SUMMARY_MAX_TOKENS
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-memory')
+        self._in_progress = set()
+        self._lock = threading.Lock()
+
+    def _recent_messages(self, session_id: int) -> List[ChatMessage]:
+        rows = ChatMessage.query.filter_by(session_id=session_id)\
+            .order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())\
+            .limit(self.recent_turns * 2)\
+            .all()
+        return list(reversed(rows))
+
+    def _unsummarized_messages(self, session_id: int, summarized_until_id: int) -> List[ChatMessage]:
+        """Everything after the summary: the verbatim window plus any aged-out turns not yet folded in"""
+        # Turns acknowledged but not yet flushed by the write-behind buffer
+        pending = self.write_buffer.pending_for_session(session_id) if self.write_buffer else []
+        rows = ChatMessage.query.filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > summarized_until_id
+        ).order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc())\
+         .limit((self.recent_turns + self.summary_batch) * 2)\
+         .all()
+        messages = list(reversed(rows))
+        if pending:
+            messages = self.write_buffer.merge_pending(messages, pending)
+        return messages
+
+    def _format_turns(self, messages) -> str:
+        return '\n'.join(
+            f"{ROLE_LABELS.get(message.role, message.role)}: {message.content}"
+            for message in messages
+        )
+
+    def build_history(self, session_id: int) -> str:
+        """Conversation history to prepend to the model prompt"""
+        try:
+            summary = ChatSessionSummary.query.get(session_id)
+            recent = self._unsummarized_messages(session_id, (summary.summarized_until_id or 0) if summary else 0)
+
+            parts = []
+            if summary and summary.summary:
+                parts.append(f"Conversation summary:\n{summary.summary}")
+            if recent:
+                parts.append(f"Recent conversation:\n{self._format_turns(recent)}")
+            return '\n\n'.join(parts)
+
+        except Exception as e:
+            print(f"Error building conversation history: {e}")
+            return ""
+
+    def schedule_summary(self, session_id: int, app):
+        """Fold aged-out messages into the summary in the background (one job per session)"""
+        with self._lock:
+            if session_id in self._in_progress:
+                return
+            self._in_progress.add(session_id)
+        self.executor.submit(self._summarize_in_context, session_id, app)
+
+    def _summarize_in_context(self, session_id: int, app):
+        try:
+            with app.app_context():
+                self.update_summary(session_id)
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+        finally:
+            with self._lock:
+                self._in_progress.discard(session_id)
+
+    def update_summary(self, session_id: int) -> bool:
+        """Fold messages older than the verbatim window into the rolling summary, batch by batch"""
+        updated = False
+        while self._summarize_batch(session_id):
+            updated = True
+        return updated
+
+    def _summarize_batch(self, session_id: int) -> bool:
+        """Summarize the oldest batch of aged-out messages; False once less than a batch is pending"""
+        summary = ChatSessionSummary.query.get(session_id)
+        if not summary:
+            summary = ChatSessionSummary(session_id=session_id, summary='', summarized_until_id=0, summarized_count=0)
+            db.session.add(summary)
+
+        recent = self._recent_messages(session_id)
+        if not recent:
+            return False
+        window_start = recent[0]
+
+        # Only messages older than the verbatim window and not yet summarized
+        pending = ChatMessage.query.filter(
+            ChatMessage.session_id == session_id,
+            ChatMessage.id > (summary.summarized_until_id or 0),
+            before_position(ChatMessage.timestamp, ChatMessage.id, window_start.timestamp, window_start.id)
+        ).order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())\
+         .limit(self.summary_batch * 2)\
+         .all()
+
+        if len(pending) < self.summary_batch:
+            db.session.rollback()
+            return False
+
+        prompt = (
+            f"Update the running summary of a conversation. Keep it under {self.summary_max_tokens} tokens, "
+            "in the conversation's language, and keep facts, decisions and open questions.\n\n"
+            f"Current summary:\n{summary.summary or '(empty)'}\n\n"
+            f"New turns:\n{self._format_turns(pending)}\n\n"
+            "Updated summary:"
+        )
+        result = self.ai_service.generate_with_gemini(prompt)
+        if 'error' in result:
+            db.session.rollback()
+            print(f"Error summarizing session {session_id}: {result['error']}")
+            return False
+
+        text = result.get('response', '').strip()
+        # Hard cap in case the model ignores the length instruction
+        while text and estimate_tokens(text) > self.summary_max_tokens:
+            text = text[:int(len(text) * 0.9)]
+
+        summary.summary = text
+        summary.summarized_until_id = max(message.id for message in pending)
+        summary.summarized_count = (summary.summarized_count or 0) + len(pending)
+        db.session.commit()
+        return True
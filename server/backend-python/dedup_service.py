@@ -0,0 +1,193 @@
+import re
+import zlib
+import threading
+import numpy as np
+from collections import defaultdict
+from typing import Dict, Any, Optional, Tuple
+from src.models.enhanced_models import RAGDocumentSignature
+from src.models.user import db
+from src.config import Config
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SHINGLE_BATCH = 10000
+
+class NearDuplicateDetector:
+    """MinHash/LSH index over RAG documents, used to catch near-duplicates at ingestion"""
+
+    def __init__(self, num_perm=None, bands=None, threshold=None, shingle_size=5, seed=1):
+        self.num_perm = num_perm or Config.DEDUP_NUM_PERM
+        self.bands = bands or Config.DEDUP_BANDS
+        self.threshold = threshold if threshold is not None else Config.DEDUP_THRESHOLD
+        self.shingle_size = shingle_size
+
+        if self.num_perm % self.bands != 0:
+            raise ValueError('num_perm must be divisible by bands')
+        self.rows_per_band = self.num_perm // self.bands
+
+        # Random permutations (a * x + b) mod p, fixed by seed so stored signatures stay valid
+        generator = np.random.RandomState(seed)
+        self._perm_a = generator.randint(1, 1 << 32, size=self.num_perm, dtype=np.uint64)
+        self._perm_b = generator.randint(0, 1 << 32, size=self.num_perm, dtype=np.uint64)
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._signatures = {}  # doc_id -> (user_id, signature)
+        self._buckets = defaultdict(set)  # (user_id, band, band_hash) -> {doc_id}
+        self._stats = {
+            'checked': 0,
+            'duplicates_skipped': 0,
+            'duplicates_linked': 0
+        }
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """Hash character shingles of normalized text (works for unsegmented Thai too)"""
+        normalized = re.sub(r'\s+', ' ', text.lower()).strip()
+        if len(normalized) <= self.shingle_size:
+            tokens = {normalized}
+        else:
+            tokens = {
+                normalized[i:i + self.shingle_size]
+                for i in range(len(normalized) - self.shingle_size + 1)
+            }
+        return np.fromiter(
+            (zlib.crc32(token.encode('utf-8')) for token in tokens),
+            dtype=np.uint64,
+            count=len(tokens)
+        )
+
+    def signature(self, text: str) -> np.ndarray:
+        """Compute the MinHash signature of a document"""
+        hashes = self._shingles(text)
+        signature = np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+
+        # Process shingles in batches to bound memory on large documents
+        for start in range(0, len(hashes), _SHINGLE_BATCH):
+            batch = hashes[start:start + _SHINGLE_BATCH]
+            permuted = (np.outer(self._perm_a, batch) + self._perm_b[:, None]) % _MERSENNE_PRIME
+            permuted &= _MAX_HASH
+            signature = np.minimum(signature, permuted.min(axis=1))
+
+        return signature.astype(np.uint32)
+
+    def _band_keys(self, user_id: int, signature: np.ndarray):
+        for band in range(self.bands):
+            start = band * self.rows_per_band
+            band_hash = hash(signature[start:start + self.rows_per_band].tobytes())
+            yield (user_id, band, band_hash)
+
+    def _index(self, doc_id: int, user_id: int, signature: np.ndarray):
+        self._signatures[doc_id] = (user_id, signature)
+        for key in self._band_keys(user_id, signature):
+            self._buckets[key].add(doc_id)
+
+    def _unindex(self, doc_id: int):
+        entry = self._signatures.pop(doc_id, None)
+        if entry is None:
+            return
+        user_id, signature = entry
+        for key in self._band_keys(user_id, signature):
+            bucket = self._buckets.get(key)
+            if bucket:
+                bucket.discard(doc_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def load(self):
+        """Rebuild the LSH buckets from stored signatures (at startup, else on first use)"""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            try:
+                for row in RAGDocumentSignature.query.yield_per(1000):
+                    signature = np.frombuffer(row.signature, dtype=np.uint32)
+                    if len(signature) == self.num_perm:
+                        self._index(row.doc_id, row.user_id, signature)
+                self._loaded = True
+            except Exception as e:
+                print(f"Error loading document signatures: {e}")
+
+    def find_duplicate(self, text: str, user_id: int, exclude_doc_id: Optional[int] = None,
+                       signature: Optional[np.ndarray] = None) -> Optional[Tuple[int, float]]:
+        """Return (doc_id, estimated Jaccard similarity) of the closest near-duplicate, if any"""
+        self.load()
+        if signature is None:
+            signature = self.signature(text)
+
+        with self._lock:
+            self._stats['checked'] += 1
+            candidates = set()
+            for key in self._band_keys(user_id, signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(exclude_doc_id)
+
+            best = None
+            for doc_id in candidates:
+                similarity = self.similarity(self._signatures[doc_id][1], signature)
+                if similarity >= self.threshold and (best is None or similarity > best[1]):
+                    best = (doc_id, similarity)
+
+        return best
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two MinHash signatures"""
+        return float(np.mean(a == b))
+
+    def add(self, doc_id: int, user_id: int, signature: np.ndarray):
+        """Stage a document signature row; call register() once the session commits.
+
+        The LSH buckets are left alone here, so a rolled-back insert never
+        leaves a phantom document for later uploads to match.
+        """
+        self.load()
+        row = RAGDocumentSignature.query.get(doc_id)
+        if row:
+            row.user_id = user_id
+            row.signature = signature.tobytes()
+        else:
+            db.session.add(RAGDocumentSignature(
+                doc_id=doc_id,
+                user_id=user_id,
+                signature=signature.tobytes()
+            ))
+
+    def register(self, doc_id: int, user_id: int, signature: np.ndarray):
+        """Make a committed document's signature matchable"""
+        self.load()
+        with self._lock:
+            self._unindex(doc_id)
+            self._index(doc_id, user_id, signature)
+
+    def remove(self, doc_id: int):
+        """Stage deleting a document signature row; call unregister() once the session commits"""
+        RAGDocumentSignature.query.filter_by(doc_id=doc_id).delete()
+
+    def unregister(self, doc_id: int):
+        """Stop matching a deleted document"""
+        with self._lock:
+            self._unindex(doc_id)
+
+    def record_duplicate(self, mode: str):
+        with self._lock:
+            if mode == 'skip':
+                self._stats['duplicates_skipped'] += 1
+            else:
+                self._stats['duplicates_linked'] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get near-duplicate detection statistics"""
+        self.load()
+        with self._lock:
+            duplicates = self._stats['duplicates_skipped'] + self._stats['duplicates_linked']
+            return {
+                **self._stats,
+                'duplicate_rate': round(duplicates / self._stats['checked'], 4) if self._stats['checked'] else 0,
+                'indexed_signatures': len(self._signatures),
+                'lsh_buckets': len(self._buckets),
+                'threshold': self.threshold,
+                'num_perm': self.num_perm,
+                'bands': self.bands
+            }
@@ -1,5 +1,6 @@
 from datetime import datetime
 from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage
 import json
 
 # User Profile Model
@@ -240,3 +241,255 @@ class SharedContent(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+# RAG Document Signature Model (MinHash signatures for near-duplicate detection)
+class RAGDocumentSignature(db.Model):
+    __tablename__ = 'rag_document_signatures'
+    
+    doc_id = db.Column(db.Integer, primary_key=True)  # rag_documents.id
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    signature = db.Column(db.LargeBinary, nullable=False)  # uint32 MinHash values
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'doc_id': self.doc_id,
+            'user_id': self.user_id,
+            'signature_size': len(self.signature) // 4 if self.signature else 0,
+            'created_at': self.created_at.isoformat()
+        }
+
+# RAG Document Access Model (hit counters driving hot/cold index tiering)
+class RAGDocumentAccess(db.Model):
+    __tablename__ = 'rag_document_access'
+    
+    doc_id = db.Column(db.Integer, primary_key=True)  # rag_documents.id
+    tier = db.Column(db.String(10), default='hot')  # 'hot', 'cold'
+    hit_count = db.Column(db.Integer, default=0)
+    last_hit_at = db.Column(db.DateTime)
+    tier_changed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'doc_id': self.doc_id,
+            'tier': self.tier,
+            'hit_count': self.hit_count,
+            'last_hit_at': self.last_hit_at.isoformat() if self.last_hit_at else None,
+            'tier_changed_at': self.tier_changed_at.isoformat() if self.tier_changed_at else None
+        }
+
+# Chat Session Summary Model (rolling summary of turns older than the verbatim window)
+class ChatSessionSummary(db.Model):
+    __tablename__ = 'chat_session_summaries'
+    
+    session_id = db.Column(db.Integer, primary_key=True)  # chat_sessions.id
+    summary = db.Column(db.Text, default='')
+    summarized_until_id = db.Column(db.Integer, default=0)  # last chat_messages.id folded in
+    summarized_count = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'session_id': self.session_id,
+            'summary': self.summary,
+            'summarized_until_id': self.summarized_until_id,
+            'summarized_count': self.summarized_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Daily per-user activity rollup (maintained incrementally by AnalyticsRollupService)
+class DailyUserActivity(db.Model):
+    __tablename__ = 'daily_user_activity'
+    
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    messages = db.Column(db.Integer, default=0)
+    sessions = db.Column(db.Integer, default=0)  # distinct sessions with messages that day
+    uploads = db.Column(db.Integer, default=0)
+    upload_bytes = db.Column(db.BigInteger, default=0)
+    rag_documents = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'user_id': self.user_id,
+            'messages': self.messages,
+            'sessions': self.sessions,
+            'uploads': self.uploads,
+            'upload_bytes': self.upload_bytes,
+            'rag_documents': self.rag_documents
+        }
+
+# Daily per-session message counts (feeds distinct-session counts and most-active sessions)
+class DailySessionActivity(db.Model):
+    __tablename__ = 'daily_session_activity'
+    
+    day = db.Column(db.Date, primary_key=True)
+    session_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    messages = db.Column(db.Integer, default=0)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'messages': self.messages
+        }
+
+# Daily mergeable sketches per user (user_id 0 holds the all-users sketch)
+class DailySketch(db.Model):
+    __tablename__ = 'daily_sketches'
+    
+    day = db.Column(db.Date, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True)
+    users = db.Column(db.LargeBinary)  # HyperLogLog of active user ids (all-users rows only)
+    sessions = db.Column(db.LargeBinary)  # HyperLogLog of active session ids
+    message_lengths = db.Column(db.LargeBinary)  # DDSketch of message lengths in characters
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'day': self.day.isoformat(),
+            'user_id': self.user_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Per-turn chat latency telemetry (stage timings in milliseconds)
+class ChatTurnTelemetry(db.Model):
+    __tablename__ = 'chat_turn_telemetry'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    session_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer)
+    message_id = db.Column(db.Integer)  # assistant message; null when persisted write-behind
+    streamed = db.Column(db.Boolean, default=False)
+    use_rag = db.Column(db.Boolean, default=True)
+    embed_ms = db.Column(db.Float, default=0)
+    search_ms = db.Column(db.Float, default=0)
+    hydrate_ms = db.Column(db.Float, default=0)
+    retrieval_ms = db.Column(db.Float, default=0)  # wall time of the retrieval fan-out
+    llm_ms = db.Column(db.Float, default=0)
+    first_token_ms = db.Column(db.Float)  # streamed turns only
+    db_commit_ms = db.Column(db.Float, default=0)
+    total_ms = db.Column(db.Float, default=0)
+    prompt_tokens = db.Column(db.Integer, default=0)
+    completion_tokens = db.Column(db.Integer, default=0)
+    context_tokens = db.Column(db.Integer, default=0)
+    retrieved_doc_ids = db.Column(db.Text)  # JSON array
+    retrieval = db.Column(db.Text)  # JSON per-source status and latency
+    error = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'session_id': self.session_id,
+            'user_id': self.user_id,
+            'message_id': self.message_id,
+            'streamed': self.streamed,
+            'use_rag': self.use_rag,
+            'embed_ms': self.embed_ms,
+            'search_ms': self.search_ms,
+            'hydrate_ms': self.hydrate_ms,
+            'retrieval_ms': self.retrieval_ms,
+            'llm_ms': self.llm_ms,
+            'first_token_ms': self.first_token_ms,
+            'db_commit_ms': self.db_commit_ms,
+            'total_ms': self.total_ms,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'context_tokens': self.context_tokens,
+            'retrieved_doc_ids': json.loads(self.retrieved_doc_ids) if self.retrieved_doc_ids else [],
+            'retrieval': json.loads(self.retrieval) if self.retrieval else {},
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Rollup Watermark Model (highest source row id already folded into the rollups)
+class RollupWatermark(db.Model):
+    __tablename__ = 'rollup_watermarks'
+    
+    name = db.Column(db.String(50), primary_key=True)  # source table name
+    last_id = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'last_id': self.last_id,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Table Row Count Model (exact row counts kept in step with ORM inserts and deletes)
+class TableRowCount(db.Model):
+    __tablename__ = 'table_row_counts'
+    
+    name = db.Column(db.String(50), primary_key=True)  # counted table name
+    row_count = db.Column(db.BigInteger, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'row_count': self.row_count,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+# Composite indexes for keyset pagination of chat history
+chat_messages_session_timestamp_index = db.Index(
+    'ix_chat_messages_session_timestamp_id',
+    ChatMessage.session_id, ChatMessage.timestamp, ChatMessage.id
+)
+chat_sessions_user_updated_index = db.Index(
+    'ix_chat_sessions_user_updated_id',
+    ChatSession.user_id, ChatSession.updated_at, ChatSession.id
+)
+
+# Composite indexes for per-user analytics
+uploaded_files_user_created_index = db.Index(
+    'ix_uploaded_files_user_created', UploadedFile.user_id, UploadedFile.created_at
+)
+uploaded_files_user_type_index = db.Index(
+    'ix_uploaded_files_user_type_size', UploadedFile.user_id, UploadedFile.file_type, UploadedFile.file_size
+)
+rag_documents_user_source_index = db.Index(
+    'ix_rag_documents_user_source_created', RAGDocument.user_id, RAGDocument.source_type, RAGDocument.created_at
+)
+rag_documents_source_created_index = db.Index(
+    'ix_rag_documents_source_created', RAGDocument.source_type, RAGDocument.created_at
+)
+daily_user_activity_user_day_index = db.Index(
+    'ix_daily_user_activity_user_day', DailyUserActivity.user_id, DailyUserActivity.day
+)
+daily_session_activity_user_session_index = db.Index(
+    'ix_daily_session_activity_user_session', DailySessionActivity.user_id, DailySessionActivity.session_id,
+    DailySessionActivity.messages
+)
+
+chat_turn_telemetry_user_created_index = db.Index(
+    'ix_chat_turn_telemetry_user_created',
+    ChatTurnTelemetry.user_id, ChatTurnTelemetry.created_at
+)
+chat_turn_telemetry_created_index = db.Index(
+    'ix_chat_turn_telemetry_created',
+    ChatTurnTelemetry.created_at
+)
+
+COMPOSITE_INDEXES = [
+    chat_messages_session_timestamp_index,
+    chat_sessions_user_updated_index,
+    uploaded_files_user_created_index,
+    uploaded_files_user_type_index,
+    rag_documents_user_source_index,
+    rag_documents_source_created_index,
+    daily_user_activity_user_day_index,
+    daily_session_activity_user_session_index,
+    chat_turn_telemetry_user_created_index,
+    chat_turn_telemetry_created_index
+]
+
+def create_missing_indexes():
+    """Create indexes that db.create_all() skips on tables that already exist"""
+    for index in COMPOSITE_INDEXES:
+        index.create(bind=db.engine, checkfirst=True)
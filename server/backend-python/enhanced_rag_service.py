@@ -1,113 +1,40 @@
-import os
 import json
 import requests
 import numpy as np
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-import faiss
 from sentence_transformers import SentenceTransformer
-import PyPDF2
-import docx
-import csv
-import markdown
-from bs4 import BeautifulSoup
-import pandas as pd
 from src.models.enhanced_models import RAGDocument, UploadedFile
 from src.models.user import db
 from src.config import Config
+from src.services.dedup_service import NearDuplicateDetector
+from src.services.tiered_index_service import TieredVectorIndex
+from src.services.index_consistency_service import IndexConsistencyChecker
+from src.services.text_extraction import extract_text
+from src.services.context_packing_service import ContextPacker
+from src.services.chat_telemetry_service import stage
 
 class EnhancedRAGService:
     def __init__(self):
         self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         self.index = None
-        self.documents = []
         self.notion_api_key = Config.NOTION_API_KEY
+        self.dedup_detector = NearDuplicateDetector() if Config.DEDUP_ENABLED else None
         self.initialize_faiss_index()
+        self.consistency_checker = IndexConsistencyChecker(self)
+        self.context_packer = ContextPacker(embed=lambda texts: self.embedding_model.encode(texts))
     
     def initialize_faiss_index(self):
-        """Initialize FAISS index for vector similarity search"""
-        try:
-            # Try to load existing index
-            if os.path.exists('faiss_index.bin'):
-                self.index = faiss.read_index('faiss_index.bin')
-                print("Loaded existing FAISS index")
-            else:
-                # Create new index (384 dimensions for all-MiniLM-L6-v2)
-                self.index = faiss.IndexFlatIP(384)
-                print("Created new FAISS index")
-        except Exception as e:
-            print(f"Error initializing FAISS index: {e}")
-            self.index = faiss.IndexFlatIP(384)
+        """Initialize tiered FAISS index (384 dimensions for all-MiniLM-L6-v2)"""
+        self.index = TieredVectorIndex(dimension=384)
     
     def save_faiss_index(self):
         """Save FAISS index to disk"""
-        try:
-            faiss.write_index(self.index, 'faiss_index.bin')
-            print("FAISS index saved successfully")
-        except Exception as e:
-            print(f"Error saving FAISS index: {e}")
+        self.index.save()
     
     def extract_text_from_file(self, file_path: str, file_type: str) -> str:
         """Extract text content from various file types"""
-        try:
-            if file_type.lower() == 'pdf':
-                return self._extract_from_pdf(file_path)
-            elif file_type.lower() in ['docx', 'doc']:
-                return self._extract_from_docx(file_path)
-            elif file_type.lower() == 'csv':
-                return self._extract_from_csv(file_path)
-            elif file_type.lower() == 'html':
-                return self._extract_from_html(file_path)
-            elif file_type.lower() == 'md':
-                return self._extract_from_markdown(file_path)
-            elif file_type.lower() == 'txt':
-                return self._extract_from_txt(file_path)
-            else:
-                return ""
-        except Exception as e:
-            print(f"Error extracting text from {file_type} file: {e}")
-            return ""
-    
-    def _extract_from_pdf(self, file_path: str) -> str:
-        """Extract text from PDF file"""
-        text = ""
-        with open(file_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-        return text
-    
-    def _extract_from_docx(self, file_path: str) -> str:
-        """Extract text from DOCX file"""
-        doc = docx.Document(file_path)
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return text
-    
-    def _extract_from_csv(self, file_path: str) -> str:
-        """Extract text from CSV file"""
-        df = pd.read_csv(file_path)
-        return df.to_string()
-    
-    def _extract_from_html(self, file_path: str) -> str:
-        """Extract text from HTML file"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            soup = BeautifulSoup(file.read(), 'html.parser')
-            return soup.get_text()
-    
-    def _extract_from_markdown(self, file_path: str) -> str:
-        """Extract text from Markdown file"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            md_content = file.read()
-            html = markdown.markdown(md_content)
-            soup = BeautifulSoup(html, 'html.parser')
-            return soup.get_text()
-    
-    def _extract_from_txt(self, file_path: str) -> str:
-        """Extract text from TXT file"""
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return file.read()
+        return extract_text(file_path, file_type)
     
     def process_uploaded_file(self, file_id: int, user_id: int) -> bool:
         """Process uploaded file and add to RAG system"""
@@ -133,20 +60,33 @@ class EnhancedRAGService:
                 source_id=str(file_id),
                 title=uploaded_file.original_filename,
                 content=content,
-                metadata=json.dumps({
+                doc_metadata=json.dumps({
                     'file_type': uploaded_file.file_type,
                     'file_size': uploaded_file.file_size,
                     'original_filename': uploaded_file.original_filename
                 })
             )
             
+            # Check for near-duplicates before spending an embedding and an index slot
+            signature = None
+            if self.dedup_detector:
+                signature = self.dedup_detector.signature(content)
+                duplicate = self.dedup_detector.find_duplicate(content, user_id, signature=signature)
+                if duplicate:
+                    return self._handle_duplicate(rag_doc, duplicate)
+            
             # Generate embedding
             embedding = self.embedding_model.encode([content])[0]
-            rag_doc.embedding = json.dumps(embedding.tolist())
+            rag_doc.embedding_data = json.dumps(embedding.tolist())
             
             # Add to database
             db.session.add(rag_doc)
+            db.session.flush()
+            if signature is not None:
+                self.dedup_detector.add(rag_doc.id, user_id, signature)
             db.session.commit()
+            if signature is not None:
+                self.dedup_detector.register(rag_doc.id, user_id, signature)
             
             # Add to FAISS index
             self.add_document_to_index(rag_doc.id, embedding, content)
@@ -158,21 +98,35 @@ class EnhancedRAGService:
             db.session.rollback()
             return False
     
+    def _handle_duplicate(self, rag_doc: RAGDocument, duplicate) -> bool:
+        """Skip or link a near-duplicate document instead of indexing another copy"""
+        duplicate_id, similarity = duplicate
+        mode = Config.DEDUP_MODE
+        self.dedup_detector.record_duplicate(mode)
+        
+        if mode == 'skip':
+            db.session.commit()
+            print(f"Skipped near-duplicate of document {duplicate_id} (similarity {similarity:.2f})")
+            return True
+        
+        # Keep the row for provenance, but leave it out of the vector index
+        metadata = json.loads(rag_doc.doc_metadata) if rag_doc.doc_metadata else {}
+        metadata['duplicate_of'] = duplicate_id
+        metadata['duplicate_similarity'] = round(similarity, 4)
+        rag_doc.doc_metadata = json.dumps(metadata)
+        
+        db.session.add(rag_doc)
+        db.session.commit()
+        print(f"Linked document {rag_doc.id} as near-duplicate of {duplicate_id} (similarity {similarity:.2f})")
+        return True
+    
     def add_document_to_index(self, doc_id: int, embedding: np.ndarray, content: str):
         """Add document to FAISS index"""
         try:
-            # Ensure embedding is 2D array
-            if embedding.ndim == 1:
-                embedding = embedding.reshape(1, -1)
-            
-            # Add to FAISS index
-            self.index.add(embedding.astype('float32'))
-            
-            # Store document info
-            self.documents.append({
-                'id': doc_id,
-                'content': content[:500] + '...' if len(content) > 500 else content
-            })
+            # Add to the hot tier, keyed by document ID
+            self.index.add(doc_id, embedding)
+            # Passage embeddings for context packing, so queries only encode the query
+            self.context_packer.precompute(content)
             
             # Save index
             self.save_faiss_index()
@@ -180,8 +134,8 @@ class EnhancedRAGService:
         except Exception as e:
             print(f"Error adding document to index: {e}")
     
-    def search_notion_pages(self, query: str, user_id: int) -> List[Dict[str, Any]]:
-        """Search Notion pages using Notion API"""
+    def search_notion_pages(self, query: str, user_id: int, timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Search Notion pages using Notion API; `timeout` overrides NOTION_TIMEOUT_SECONDS"""
         if not self.notion_api_key:
             return []
         
@@ -204,7 +158,8 @@ class EnhancedRAGService:
             response = requests.post(
                 'https://api.notion.com/v1/search',
                 headers=headers,
-                json=search_data
+                json=search_data,
+                timeout=timeout or Config.NOTION_TIMEOUT_SECONDS
             )
             
             if response.status_code == 200:
@@ -249,8 +204,8 @@ class EnhancedRAGService:
             print(f"Error extracting Notion title: {e}")
             return 'Untitled'
     
-    def get_notion_page_content(self, page_id: str) -> str:
-        """Get content from a specific Notion page"""
+    def get_notion_page_content(self, page_id: str, timeout: Optional[float] = None) -> str:
+        """Get content from a specific Notion page; `timeout` overrides NOTION_TIMEOUT_SECONDS"""
         if not self.notion_api_key:
             return ""
         
@@ -264,7 +219,8 @@ class EnhancedRAGService:
             # Get page blocks
             response = requests.get(
                 f'https://api.notion.com/v1/blocks/{page_id}/children',
-                headers=headers
+                headers=headers,
+                timeout=timeout or Config.NOTION_TIMEOUT_SECONDS
             )
             
             if response.status_code == 200:
@@ -324,6 +280,8 @@ class EnhancedRAGService:
                 source_id=page_id
             ).first()
             
+            signature = self.dedup_detector.signature(content) if self.dedup_detector else None
+            
             if existing:
                 # Update existing document
                 existing.content = content
@@ -331,7 +289,10 @@ class EnhancedRAGService:
                 
                 # Update embedding
                 embedding = self.embedding_model.encode([content])[0]
-                existing.embedding = json.dumps(embedding.tolist())
+                existing.embedding_data = json.dumps(embedding.tolist())
+                
+                if signature is not None:
+                    self.dedup_detector.add(existing.id, user_id, signature)
             else:
                 # Create new document
                 rag_doc = RAGDocument(
@@ -340,23 +301,31 @@ class EnhancedRAGService:
                     source_id=page_id,
                     title=f"Notion Page {page_id}",
                     content=content,
-                    metadata=json.dumps({'page_id': page_id})
+                    doc_metadata=json.dumps({'page_id': page_id})
                 )
                 
+                # Duplicated Notion pages are linked or skipped rather than indexed again
+                if signature is not None:
+                    duplicate = self.dedup_detector.find_duplicate(content, user_id, signature=signature)
+                    if duplicate:
+                        return self._handle_duplicate(rag_doc, duplicate)
+                
                 # Generate embedding
                 embedding = self.embedding_model.encode([content])[0]
-                rag_doc.embedding = json.dumps(embedding.tolist())
+                rag_doc.embedding_data = json.dumps(embedding.tolist())
                 
                 db.session.add(rag_doc)
+                db.session.flush()
+                if signature is not None:
+                    self.dedup_detector.add(rag_doc.id, user_id, signature)
             
             db.session.commit()
+            doc_id = existing.id if existing else rag_doc.id
+            if signature is not None:
+                self.dedup_detector.register(doc_id, user_id, signature)
             
             # Add to FAISS index
-            self.add_document_to_index(
-                existing.id if existing else rag_doc.id,
-                embedding,
-                content
-            )
+            self.add_document_to_index(doc_id, embedding, content)
             
             return True
             
@@ -365,38 +334,49 @@ class EnhancedRAGService:
             db.session.rollback()
             return False
     
+    def _search_documents(self, query: str, user_id: int, top_k: int):
+        """Return (RAGDocument, score, tier) for the best matches owned by user_id"""
+        # Search in FAISS index (cold tier is only consulted when hot scores are weak)
+        if self.index.ntotal == 0:
+            return []
+        
+        # Generate query embedding
+        with stage('embed'):
+            query_embedding = self.embedding_model.encode([query])[0]
+        
+        with stage('search'):
+            hits = self.index.search(query_embedding, top_k)
+        if not hits:
+            return []
+        
+        # Get documents from database in one query
+        with stage('hydrate'):
+            rag_docs = RAGDocument.query.filter(
+                RAGDocument.id.in_([doc_id for doc_id, _, _ in hits]),
+                RAGDocument.user_id == user_id
+            ).all()
+        docs_by_id = {doc.id: doc for doc in rag_docs}
+        
+        matches = [
+            (docs_by_id[doc_id], score, tier)
+            for doc_id, score, tier in hits
+            if doc_id in docs_by_id
+        ]
+        
+        # Feed hit counters used for tier migration
+        self.index.record_hits(doc.id for doc, _, _ in matches)
+        
+        return matches
+    
     def semantic_search(self, query: str, user_id: int, top_k: int = 5) -> List[Dict[str, Any]]:
         """Perform semantic search using RAG system"""
         try:
-            # Generate query embedding
-            query_embedding = self.embedding_model.encode([query])[0]
-            
-            # Search in FAISS index
-            if self.index.ntotal == 0:
-                return []
-            
-            # Ensure query embedding is 2D
-            if query_embedding.ndim == 1:
-                query_embedding = query_embedding.reshape(1, -1)
-            
-            scores, indices = self.index.search(query_embedding.astype('float32'), top_k)
-            
-            # Get documents from database
             results = []
-            for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-                if idx < len(self.documents):
-                    doc_info = self.documents[idx]
-                    
-                    # Get full document from database
-                    rag_doc = RAGDocument.query.filter_by(
-                        id=doc_info['id'],
-                        user_id=user_id
-                    ).first()
-                    
-                    if rag_doc:
-                        result = rag_doc.to_dict()
-                        result['similarity_score'] = float(score)
-                        results.append(result)
+            for rag_doc, score, tier in self._search_documents(query, user_id, top_k):
+                result = rag_doc.to_dict()
+                result['similarity_score'] = score
+                result['tier'] = tier
+                results.append(result)
             
             return results
             
@@ -404,36 +384,37 @@ class EnhancedRAGService:
             print(f"Error in semantic search: {e}")
             return []
     
-    def get_rag_context(self, query: str, user_id: int, max_context_length: int = 2000) -> str:
-        """Get relevant context for RAG-enhanced chat"""
+    def pack_rag_context(self, query: str, user_id: int, max_tokens: Optional[int] = None,
+                         max_context_length: Optional[int] = None) -> Dict[str, Any]:
+        """Build token-budgeted, MMR-diverse RAG context and report tokens saved"""
         try:
-            # Search for relevant documents
-            search_results = self.semantic_search(query, user_id, top_k=3)
-            
-            context = ""
-            current_length = 0
+            # Retrieve more candidates than fit, then let the packer choose passages
+            matches = self._search_documents(query, user_id, Config.RAG_CONTEXT_CANDIDATES)
+            documents = [
+                {'id': doc.id, 'title': doc.title, 'text': doc.content or '', 'score': score}
+                for doc, score, _ in matches
+            ]
+            
+            packed = self.context_packer.pack(
+                query,
+                documents,
+                max_tokens=max_tokens or Config.RAG_CONTEXT_MAX_TOKENS,
+                max_chars=max_context_length
+            )
             
-            for result in search_results:
-                content = result.get('content', '')
-                
-                # Add content if it fits within max length
-                if current_length + len(content) <= max_context_length:
-                    context += f"Document: {result.get('title', 'Unknown')}\n"
-                    context += f"Content: {content}\n\n"
-                    current_length += len(content)
-                else:
-                    # Add partial content
-                    remaining_length = max_context_length - current_length
-                    if remaining_length > 100:  # Only add if meaningful length remains
-                        context += f"Document: {result.get('title', 'Unknown')}\n"
-                        context += f"Content: {content[:remaining_length]}...\n\n"
-                    break
-            
-            return context
+            return {
+                'context': packed['context'],
+                'document_ids': [documents[i]['id'] for i in packed['doc_indexes']],
+                'stats': packed['stats']
+            }
             
         except Exception as e:
-            print(f"Error getting RAG context: {e}")
-            return ""
+            print(f"Error packing RAG context: {e}")
+            return {'context': '', 'document_ids': [], 'stats': {}}
+    
+    def get_rag_context(self, query: str, user_id: int, max_context_length: int = 2000) -> str:
+        """Get relevant context for RAG-enhanced chat"""
+        return self.pack_rag_context(query, user_id, max_context_length=max_context_length)['context']
     
     def rebuild_index(self, user_id: Optional[int] = None):
         """Rebuild FAISS index from database"""
@@ -446,19 +427,93 @@ class EnhancedRAGService:
             documents = query.all()
             
             # Create new index
-            self.index = faiss.IndexFlatIP(384)
-            self.documents = []
+            self.index.reset()
             
-            # Add all documents to index
+            # Add all documents to the hot tier, then let migration re-tier them
             for doc in documents:
-                if doc.embedding:
-                    embedding = np.array(json.loads(doc.embedding))
-                    self.add_document_to_index(doc.id, embedding, doc.content)
+                if doc.embedding_data:
+                    embedding = np.array(json.loads(doc.embedding_data))
+                    self.index.add(doc.id, embedding)
+            self.save_faiss_index()
             
             print(f"Rebuilt FAISS index with {len(documents)} documents")
             
         except Exception as e:
             print(f"Error rebuilding index: {e}")
+    
+    def remove_documents_from_index(self, doc_ids: List[int]):
+        """Remove document vectors from the index and promote duplicates linked to them"""
+        try:
+            if self.index.remove(doc_ids):
+                self.save_faiss_index()
+        except Exception as e:
+            print(f"Error removing documents from index: {e}")
+
+        for doc_id in doc_ids:
+            self.promote_linked_duplicate(doc_id)
+
+    def promote_linked_duplicate(self, original_id: int) -> Optional[int]:
+        """Embed and index the oldest duplicate linked to a removed original.
+
+        The other duplicates are re-linked to the promoted document, so the
+        content stays searchable as long as any copy of it exists.
+        """
+        try:
+            linked = []
+            candidates = RAGDocument.query.filter(
+                RAGDocument.doc_metadata.like(f'%"duplicate_of": {int(original_id)}%')
+            ).order_by(RAGDocument.id.asc()).all()
+            for doc in candidates:
+                metadata = json.loads(doc.doc_metadata)
+                if metadata.get('duplicate_of') == original_id:
+                    linked.append((doc, metadata))
+            if not linked:
+                return None
+
+            promoted, metadata = linked[0]
+            metadata.pop('duplicate_of', None)
+            metadata.pop('duplicate_similarity', None)
+            promoted.doc_metadata = json.dumps(metadata)
+            embedding = self.embedding_model.encode([promoted.content])[0]
+            promoted.embedding_data = json.dumps(embedding.tolist())
+            signature = self.dedup_detector.signature(promoted.content) if self.dedup_detector else None
+            if signature is not None:
+                self.dedup_detector.add(promoted.id, promoted.user_id, signature)
+
+            for doc, doc_metadata in linked[1:]:
+                doc_metadata['duplicate_of'] = promoted.id
+                doc.doc_metadata = json.dumps(doc_metadata)
+            db.session.commit()
+            if signature is not None:
+                self.dedup_detector.register(promoted.id, promoted.user_id, signature)
+
+            self.add_document_to_index(promoted.id, embedding, promoted.content)
+            print(f"Promoted document {promoted.id} to replace removed original {original_id}")
+            return promoted.id
+
+        except Exception as e:
+            print(f"Error promoting duplicate of document {original_id}: {e}")
+            db.session.rollback()
+            return None
+    
+    def check_index_consistency(self, repair: bool = False) -> Dict[str, Any]:
+        """Diff RAGDocument rows against the index, optionally repairing the delta"""
+        try:
+            if repair:
+                return self.consistency_checker.repair()
+            return self.consistency_checker.scan()
+        except Exception as e:
+            print(f"Error checking index consistency: {e}")
+            return {'error': str(e)}
+    
+    def migrate_tiers(self) -> Dict[str, Any]:
+        """Move documents between the hot and cold index tiers"""
+        try:
+            return self.index.migrate()
+        except Exception as e:
+            print(f"Error migrating index tiers: {e}")
+            db.session.rollback()
+            return {'error': str(e)}
 
 # Global instance
 enhanced_rag_service = EnhancedRAGService()
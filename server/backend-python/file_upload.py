@@ -6,6 +6,7 @@ from werkzeug.utils import secure_filename
 from src.models.user import db
 from src.models.enhanced_models import UploadedFile, RAGDocument
 from src.services.enhanced_rag_service import enhanced_rag_service
+from src.config import Config
 
 file_upload_bp = Blueprint('file_upload', __name__)
 
@@ -139,12 +140,20 @@ def delete_file(file_id):
             source_id=str(file_id)
         ).first()
         if rag_doc:
+            if enhanced_rag_service.dedup_detector:
+                enhanced_rag_service.dedup_detector.remove(rag_doc.id)
             db.session.delete(rag_doc)
         
         # Delete database record
         db.session.delete(uploaded_file)
         db.session.commit()
         
+        # Drop the vector too; the consistency job repairs it if this fails
+        if rag_doc:
+            if enhanced_rag_service.dedup_detector:
+                enhanced_rag_service.dedup_detector.unregister(rag_doc.id)
+            enhanced_rag_service.remove_documents_from_index([rag_doc.id])
+        
         return jsonify({'message': 'File deleted successfully'}), 200
         
     except Exception as e:
@@ -249,17 +258,21 @@ def get_rag_context():
         query = data.get('query', '')
         user_id = data.get('user_id', 1)
         max_length = data.get('max_length', 2000)
+        max_tokens = data.get('max_tokens')
         
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
         # Get RAG context
-        context = enhanced_rag_service.get_rag_context(query, user_id, max_length)
+        packed = enhanced_rag_service.pack_rag_context(query, user_id, max_tokens, max_length)
+        context = packed['context']
         
         return jsonify({
             'query': query,
             'context': context,
-            'context_length': len(context)
+            'context_length': len(context),
+            'document_ids': packed['document_ids'],
+            'packing': packed['stats']
         }), 200
         
     except Exception as e:
@@ -280,3 +293,71 @@ def rebuild_rag_index():
     except Exception as e:
         return jsonify({'error': f'Failed to rebuild RAG index: {str(e)}'}), 500
 
+@file_upload_bp.route('/rag/dedup/stats', methods=['GET'])
+def get_dedup_stats():
+    """Get near-duplicate detection statistics"""
+    try:
+        if not enhanced_rag_service.dedup_detector:
+            return jsonify({'enabled': False}), 200
+        
+        stats = enhanced_rag_service.dedup_detector.get_stats()
+        stats['enabled'] = True
+        stats['mode'] = Config.DEDUP_MODE
+        
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get dedup stats: {str(e)}'}), 500
+
+@file_upload_bp.route('/rag/tiers/stats', methods=['GET'])
+def get_tier_stats():
+    """Get hot/cold index tier statistics"""
+    try:
+        stats = enhanced_rag_service.index.get_stats()
+        
+        return jsonify(stats), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to get tier stats: {str(e)}'}), 500
+
+@file_upload_bp.route('/rag/tiers/migrate', methods=['POST'])
+def migrate_tiers():
+    """Run hot/cold tier migration now"""
+    try:
+        result = enhanced_rag_service.migrate_tiers()
+        
+        if 'error' in result:
+            return jsonify(result), 500
+        
+        return jsonify({'message': 'Tier migration completed', **result}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to migrate tiers: {str(e)}'}), 500
+
+@file_upload_bp.route('/rag/consistency', methods=['GET'])
+def check_rag_consistency():
+    """Diff RAG documents in the database against the vector index"""
+    try:
+        report = enhanced_rag_service.check_index_consistency(repair=False)
+        
+        if 'error' in report:
+            return jsonify(report), 500
+        
+        return jsonify(report), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to check RAG consistency: {str(e)}'}), 500
+
+@file_upload_bp.route('/rag/consistency/repair', methods=['POST'])
+def repair_rag_consistency():
+    """Repair drift between the database and the vector index"""
+    try:
+        result = enhanced_rag_service.check_index_consistency(repair=True)
+        
+        if 'error' in result:
+            return jsonify(result), 500
+        
+        return jsonify({'message': 'RAG index repaired', **result}), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Failed to repair RAG index: {str(e)}'}), 500
@@ -0,0 +1,397 @@
+"""Synthetic data generator for benchmark databases.
+
+Bulk-inserts realistic volumes of users (profiles), chat sessions and
+messages, uploads, RAG documents, work items, graph nodes/edges and
+notifications. Counts and sizes are drawn from log-normal distributions
+around configurable means, timestamps follow a daily activity curve over
+the last --days days, and everything is reproducible from --seed.
+
+Rows go in through batched INSERTs (parents with RETURNING to get their ids)
+committed every --batch-size rows. Bulk inserts skip ORM events, so the
+search index and change feed are not fed; pass --rollup and --reindex to
+bring the analytics rollups and chat search index up to date afterwards.
+
+Usage:
+    python generate_data.py --users 1000 --sessions-per-user 20 --messages-per-session 30
+    python generate_data.py --users 50 --seed 42 --rollup --reindex
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from datetime import datetime, timedelta
+import numpy as np
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+WORDS = (
+    'report revenue quarter project deadline customer analysis summary data model '
+    'meeting budget forecast design review release plan risk team goal metric '
+    'document policy contract invoice search index query latency upload notion '
+    'รายงาน ยอดขาย ลูกค้า โครงการ ประชุม งบประมาณ สรุป ข้อมูล เอกสาร แผนงาน'
+).split()
+FILE_TYPES = (['pdf', 'docx', 'csv', 'txt', 'md', 'html'], [0.35, 0.2, 0.15, 0.12, 0.1, 0.08])
+SOURCE_TYPES = (['file', 'notion', 'url'], [0.6, 0.3, 0.1])
+CONTENT_TYPES = (['document', 'board', 'mindmap', 'graph'], [0.55, 0.2, 0.15, 0.1])
+NODE_TYPES = (['document', 'concept', 'person', 'event'], [0.4, 0.3, 0.2, 0.1])
+RELATIONSHIPS = (['related', 'parent', 'child', 'reference'], [0.5, 0.2, 0.2, 0.1])
+NOTIFICATION_TYPES = (['info', 'success', 'warning', 'error'], [0.5, 0.3, 0.15, 0.05])
+# Relative activity per hour of day (quiet nights, office-hours peak)
+HOUR_WEIGHTS = np.array([1, 1, 1, 1, 1, 2, 4, 7, 10, 12, 12, 11, 9, 11, 12, 12, 11, 9, 7, 6, 5, 4, 3, 2], dtype=float)
+
+def create_app():
+    from flask import Flask
+    from src.models.user import db
+    from src.config import Config
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    return app
+
+class SyntheticDataGenerator:
+    """Draws rows from seeded distributions and inserts them in batches"""
+
+    def __init__(self, args):
+        self.args = args
+        self.rng = np.random.default_rng(args.seed)
+        self.now = datetime.utcnow()
+        self.stats = {}
+        self._text = ' '.join(self.rng.choice(WORDS, size=200000))
+
+    # Distributions
+
+    def counts(self, mean, size, sigma=None):
+        """Non-negative integer counts, log-normal around `mean`"""
+        if mean <= 0 or size <= 0:
+            return np.zeros(max(size, 0), dtype=int)
+        sigma = self.args.sigma if sigma is None else sigma
+        mu = np.log(mean) - sigma ** 2 / 2
+        return np.round(self.rng.lognormal(mu, sigma, size)).astype(int)
+
+    def text(self, length):
+        length = int(min(max(length, 1), len(self._text) // 2))
+        start = int(self.rng.integers(0, len(self._text) - length - 1))
+        start = self._text.find(' ', start) + 1  # begin on a word boundary
+        return self._text[start:start + length].strip() or WORDS[0]
+
+    def pick(self, choices, size):
+        values, weights = choices
+        return self.rng.choice(values, size=size, p=weights).tolist()
+
+    def timestamps(self, size):
+        """Random times over the window, shaped by HOUR_WEIGHTS and recent growth"""
+        days = self.args.days
+        # Later days are busier: density grows linearly by --growth over the window
+        day_weights = 1 + self.args.growth * np.arange(days) / max(days - 1, 1)
+        day_offsets = self.rng.choice(days, size=size, p=day_weights / day_weights.sum())
+        hours = self.rng.choice(24, size=size, p=HOUR_WEIGHTS / HOUR_WEIGHTS.sum())
+        seconds = self.rng.integers(0, 3600, size=size)
+        start = (self.now - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        return [
+            min(start + timedelta(days=int(d), hours=int(h), seconds=int(s)), self.now)
+            for d, h, s in zip(day_offsets, hours, seconds)
+        ]
+
+    # Inserts
+
+    def insert(self, model, rows, returning=False):
+        """Batched INSERT of `rows`; returns the new ids in row order when asked"""
+        from sqlalchemy import insert
+        from src.models.user import db
+
+        ids = []
+        batch = self.args.batch_size
+        for offset in range(0, len(rows), batch):
+            chunk = rows[offset:offset + batch]
+            if returning:
+                statement = insert(model).returning(model.id, sort_by_parameter_order=True)
+                ids.extend(db.session.scalars(statement, chunk).all())
+            else:
+                db.session.execute(insert(model), chunk)
+            db.session.commit()
+        self.stats[model.__tablename__] = self.stats.get(model.__tablename__, 0) + len(rows)
+        return ids
+
+    def first_user_id(self):
+        from sqlalchemy import func
+        from src.models.user import db
+        from src.models.chat import ChatSession
+        from src.models.enhanced_models import UserProfile
+
+        if self.args.first_user_id:
+            return self.args.first_user_id
+        highest = max(
+            db.session.query(func.max(UserProfile.user_id)).scalar() or 0,
+            db.session.query(func.max(ChatSession.user_id)).scalar() or 0
+        )
+        return highest + 1
+
+    def generate_profiles(self, user_ids):
+        from src.models.enhanced_models import UserProfile
+
+        self.insert(UserProfile, [
+            {
+                'user_id': user_id,
+                'display_name': f"Synthetic user {user_id}",
+                'bio': self.text(80),
+                'preferences': json.dumps({'language': 'th' if user_id % 3 == 0 else 'en'}),
+                'created_at': self.now - timedelta(days=self.args.days)
+            }
+            for user_id in user_ids
+        ])
+
+    def generate_chats(self, user_ids):
+        from src.models.chat import ChatSession, ChatMessage
+
+        sessions_per_user = self.counts(self.args.sessions_per_user, len(user_ids))
+        owners = np.repeat(user_ids, sessions_per_user)
+        # Insert sessions in groups so the messages of one group fit in memory
+        group = max(int(self.args.batch_size // max(self.args.messages_per_session, 1)), 1)
+        for offset in range(0, len(owners), group):
+            chunk = owners[offset:offset + group]
+            starts = self.timestamps(len(chunk))
+            lengths = self.counts(self.args.messages_per_session, len(chunk))
+            lengths = np.maximum(lengths + lengths % 2, 2)  # whole user/assistant turns
+
+            messages = []
+            last_times = []
+            for start, count in zip(starts, lengths):
+                gaps = np.cumsum(self.rng.exponential(self.args.turn_gap_seconds, count))
+                times = [min(start + timedelta(seconds=float(g)), self.now) for g in gaps]
+                sizes = self.counts(self.args.message_chars, count)
+                messages.append([
+                    {
+                        'role': 'user' if n % 2 == 0 else 'assistant',
+                        'content': self.text(sizes[n] if n % 2 else max(sizes[n] // 4, 10)),
+                        'sources': None if n % 2 == 0 else json.dumps([{'title': self.text(30)}]),
+                        'confidence_score': None if n % 2 == 0 else round(float(self.rng.beta(8, 2)), 3),
+                        'timestamp': times[n]
+                    }
+                    for n in range(count)
+                ])
+                last_times.append(times[-1])
+
+            session_ids = self.insert(ChatSession, [
+                {'user_id': int(user_id), 'title': self.text(40), 'created_at': start, 'updated_at': updated_at}
+                for user_id, start, updated_at in zip(chunk, starts, last_times)
+            ], returning=True)
+
+            rows = []
+            for session_id, session_messages in zip(session_ids, messages):
+                for message in session_messages:
+                    message['session_id'] = session_id
+                    rows.append(message)
+            self.insert(ChatMessage, rows)
+            self.progress()
+
+    def generate_files(self, user_ids):
+        from src.models.enhanced_models import UploadedFile, RAGDocument
+
+        owners = np.repeat(user_ids, self.counts(self.args.uploads_per_user, len(user_ids)))
+        types = self.pick(FILE_TYPES, len(owners))
+        sizes = self.counts(self.args.file_kb * 1024, len(owners), sigma=1.2)
+        created = self.timestamps(len(owners))
+        file_ids = self.insert(UploadedFile, [
+            {
+                'user_id': int(user_id),
+                'original_filename': f"{self.text(20).replace(' ', '_')}.{file_type}",
+                'stored_filename': f"synthetic_{user_id}_{n}.{file_type}",
+                'file_type': file_type,
+                'file_size': int(size),
+                'file_path': f"uploads/synthetic_{user_id}_{n}.{file_type}",
+                'extracted_content': self.text(self.args.document_chars),
+                'is_processed': True,
+                'created_at': created_at
+            }
+            for n, (user_id, file_type, size, created_at) in enumerate(zip(owners, types, sizes, created))
+        ], returning=True)
+        self.progress()
+
+        # Every upload becomes a RAG document, plus extra Notion/URL sources
+        extra_owners = np.repeat(user_ids, self.counts(self.args.extra_documents_per_user, len(user_ids)))
+        extra_types = self.pick(SOURCE_TYPES, len(extra_owners))
+        extra_created = self.timestamps(len(extra_owners))
+        documents = [
+            {'user_id': int(user_id), 'source_type': 'file', 'source_id': str(file_id), 'created_at': created_at}
+            for user_id, file_id, created_at in zip(owners, file_ids, created)
+        ] + [
+            {'user_id': int(user_id), 'source_type': source_type, 'source_id': f"synthetic-{n}", 'created_at': created_at}
+            for n, (user_id, source_type, created_at) in enumerate(zip(extra_owners, extra_types, extra_created))
+        ]
+        for document in documents:
+            document.update({
+                'title': self.text(40),
+                'content': self.text(self.args.document_chars),
+                'doc_metadata': json.dumps({'synthetic': True}),
+                'updated_at': document['created_at']
+            })
+        self.insert(RAGDocument, documents)
+        self.progress()
+
+    def generate_workspace(self, user_ids):
+        from src.models.enhanced_models import WorkItem, Board, GraphNode, GraphEdge
+
+        owners = np.repeat(user_ids, self.counts(self.args.work_items_per_user, len(user_ids)))
+        self.insert(WorkItem, [
+            {
+                'user_id': int(user_id),
+                'title': self.text(40),
+                'content': self.text(self.args.document_chars),
+                'content_type': content_type,
+                'tags': json.dumps(self.rng.choice(WORDS, size=3, replace=False).tolist(), ensure_ascii=False),
+                'is_public': bool(self.rng.random() < 0.1),
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+            for user_id, content_type, created_at in zip(
+                owners, self.pick(CONTENT_TYPES, len(owners)), self.timestamps(len(owners))
+            )
+        ])
+
+        owners = np.repeat(user_ids, self.counts(self.args.boards_per_user, len(user_ids)))
+        self.insert(Board, [
+            {
+                'user_id': int(user_id),
+                'title': self.text(30),
+                'description': self.text(120),
+                'board_data': json.dumps({'columns': ['todo', 'doing', 'done']}),
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+            for user_id, created_at in zip(owners, self.timestamps(len(owners)))
+        ])
+
+        nodes_per_user = self.counts(self.args.nodes_per_user, len(user_ids))
+        owners = np.repeat(user_ids, nodes_per_user)
+        node_ids = self.insert(GraphNode, [
+            {
+                'user_id': int(user_id),
+                'title': self.text(30),
+                'content': self.text(200),
+                'node_type': node_type,
+                'x_position': float(x),
+                'y_position': float(y),
+                'created_at': created_at,
+                'updated_at': created_at
+            }
+            for user_id, node_type, x, y, created_at in zip(
+                owners, self.pick(NODE_TYPES, len(owners)),
+                self.rng.uniform(0, 1000, len(owners)), self.rng.uniform(0, 1000, len(owners)),
+                self.timestamps(len(owners))
+            )
+        ], returning=True)
+
+        # Edges stay within one user's graph
+        edges = []
+        offset = 0
+        for user_id, count in zip(user_ids, nodes_per_user):
+            own = node_ids[offset:offset + count]
+            offset += count
+            if len(own) < 2:
+                continue
+            edge_count = int(len(own) * self.args.edges_per_node)
+            sources = self.rng.choice(own, size=edge_count)
+            targets = self.rng.choice(own, size=edge_count)
+            for source, target, relationship in zip(sources, targets, self.pick(RELATIONSHIPS, edge_count)):
+                if source != target:
+                    edges.append({
+                        'user_id': int(user_id),
+                        'source_node_id': int(source),
+                        'target_node_id': int(target),
+                        'relationship_type': relationship,
+                        'weight': round(float(self.rng.uniform(0.1, 1.0)), 3)
+                    })
+        self.insert(GraphEdge, edges)
+        self.progress()
+
+    def generate_notifications(self, user_ids):
+        from src.models.enhanced_models import Notification
+
+        owners = np.repeat(user_ids, self.counts(self.args.notifications_per_user, len(user_ids)))
+        self.insert(Notification, [
+            {
+                'user_id': int(user_id),
+                'title': self.text(30),
+                'message': self.text(120),
+                'type': notification_type,
+                'is_read': bool(self.rng.random() < self.args.read_ratio),
+                'created_at': created_at
+            }
+            for user_id, notification_type, created_at in zip(
+                owners, self.pick(NOTIFICATION_TYPES, len(owners)), self.timestamps(len(owners))
+            )
+        ])
+        self.progress()
+
+    def progress(self):
+        print(' | '.join(f"{table} {count:,}" for table, count in self.stats.items()), flush=True)
+
+    def run(self):
+        first = self.first_user_id()
+        user_ids = np.arange(first, first + self.args.users)
+        print(f"Generating data for users {first}..{first + self.args.users - 1} (seed {self.args.seed})")
+
+        self.generate_profiles(user_ids.tolist())
+        self.generate_chats(user_ids)
+        self.generate_files(user_ids)
+        self.generate_workspace(user_ids)
+        self.generate_notifications(user_ids)
+        return self.stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-insert synthetic data for benchmarking')
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--first-user-id', type=int, help='Defaults to one past the highest existing user id')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--days', type=int, default=90, help='Spread timestamps over this many past days')
+    parser.add_argument('--growth', type=float, default=1.0, help='How much busier the last day is than the first (1.0 = twice)')
+    parser.add_argument('--sigma', type=float, default=0.8, help='Log-normal spread of per-user counts')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per INSERT/commit')
+    parser.add_argument('--sessions-per-user', type=float, default=20)
+    parser.add_argument('--messages-per-session', type=float, default=16)
+    parser.add_argument('--message-chars', type=float, default=600, help='Mean assistant message length')
+    parser.add_argument('--turn-gap-seconds', type=float, default=45)
+    parser.add_argument('--uploads-per-user', type=float, default=10)
+    parser.add_argument('--file-kb', type=float, default=400, help='Mean upload size in KB')
+    parser.add_argument('--extra-documents-per-user', type=float, default=5, help='Notion/URL RAG documents per user')
+    parser.add_argument('--document-chars', type=float, default=2000)
+    parser.add_argument('--work-items-per-user', type=float, default=15)
+    parser.add_argument('--boards-per-user', type=float, default=2)
+    parser.add_argument('--nodes-per-user', type=float, default=30)
+    parser.add_argument('--edges-per-node', type=float, default=1.5)
+    parser.add_argument('--notifications-per-user', type=float, default=25)
+    parser.add_argument('--read-ratio', type=float, default=0.7)
+    parser.add_argument('--rollup', action='store_true', help='Run the analytics rollups afterwards')
+    parser.add_argument('--reindex', action='store_true', help='Rebuild the chat search index afterwards')
+    args = parser.parse_args(argv)
+
+    app = create_app()
+    with app.app_context():
+        from src.models.user import db
+        from src.models.chat import ChatSession, ChatMessage  # noqa: F401 - register tables
+        from src.models.enhanced_models import create_missing_indexes
+        db.create_all()
+        create_missing_indexes()
+
+        started = time.time()
+        stats = SyntheticDataGenerator(args).run()
+        elapsed = time.time() - started
+        total = sum(stats.values())
+        print(f"Inserted {total:,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
+        # Core inserts skip the ORM hooks that keep the snapshot's row counters current
+        from src.services.row_count_service import recount_rows
+        recount_rows()
+
+        if args.rollup:
+            from src.services.analytics_rollup_service import analytics_rollup_service
+            print(f"Rollups: {analytics_rollup_service.run()}")
+        if args.reindex:
+            from src.services.chat_search_service import chat_search_service
+            chat_search_service.ensure_index()
+            print(f"Search index: {chat_search_service.reindex()}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import json
+import numpy as np
+from datetime import datetime
+from typing import Dict, Any, List
+from src.models.enhanced_models import RAGDocument
+from src.models.user import db
+
+class IndexConsistencyChecker:
+    """Detects and repairs drift between RAGDocument rows and the vector index.
+
+    DB IDs are streamed in ID order and diffed chunk by chunk against the sorted
+    index IDs, so neither side is materialized as Python objects. Repair only
+    touches the delta: orphaned vectors are removed and missing documents are
+    re-added from their stored embeddings.
+    """
+
+    def __init__(self, rag_service, chunk_size=5000):
+        self.rag_service = rag_service
+        self.chunk_size = chunk_size
+        self.last_report = None
+
+    def _indexed_documents(self):
+        """Rows that should have a vector (linked near-duplicates are kept out of the index)"""
+        return db.session.query(RAGDocument.id)\
+            .filter(RAGDocument.embedding_data.isnot(None))\
+            .order_by(RAGDocument.id)\
+            .yield_per(self.chunk_size)
+
+    def _stream_db_ids(self):
+        chunk = []
+        for (doc_id,) in self._indexed_documents():
+            chunk.append(doc_id)
+            if len(chunk) >= self.chunk_size:
+                yield np.array(chunk, dtype='int64')
+                chunk = []
+        if chunk:
+            yield np.array(chunk, dtype='int64')
+
+    def scan(self) -> Dict[str, Any]:
+        """Diff DB IDs against index IDs without modifying anything"""
+        index = self.rag_service.index
+        hot_ids = index.hot_ids()
+        cold_ids = index.cold_ids()
+
+        # IDs present in both tiers, or twice within a tier, are duplicated vectors
+        all_ids = np.concatenate([hot_ids, cold_ids])
+        unique_ids, counts = np.unique(all_ids, return_counts=True)
+        duplicated = unique_ids[counts > 1]
+
+        seen = np.zeros(len(unique_ids), dtype=bool)
+        missing: List[int] = []
+        db_total = 0
+
+        for chunk in self._stream_db_ids():
+            db_total += len(chunk)
+            positions = np.searchsorted(unique_ids, chunk)
+            positions = np.minimum(positions, max(len(unique_ids) - 1, 0))
+            found = (unique_ids[positions] == chunk) if len(unique_ids) else np.zeros(len(chunk), dtype=bool)
+            seen[positions[found]] = True
+            missing.extend(chunk[~found].tolist())
+
+        orphaned = unique_ids[~seen].tolist()
+
+        report = {
+            'db_documents': db_total,
+            'index_vectors': int(len(all_ids)),
+            'hot_vectors': int(len(hot_ids)),
+            'cold_vectors': int(len(cold_ids)),
+            'missing_from_index': missing,
+            'orphaned_vectors': orphaned,
+            'duplicated_vectors': duplicated.tolist(),
+            'consistent': not missing and not orphaned and len(duplicated) == 0,
+            'scanned_at': datetime.utcnow().isoformat()
+        }
+        self.last_report = report
+        return report
+
+    def repair(self) -> Dict[str, Any]:
+        """Apply only the delta found by scan()"""
+        report = self.scan()
+        index = self.rag_service.index
+
+        # Orphans and duplicates are both removed; duplicates that are still in the DB get re-added once
+        to_remove = set(report['orphaned_vectors']) | set(report['duplicated_vectors'])
+        removed = index.remove(to_remove) if to_remove else 0
+
+        to_add = sorted(set(report['missing_from_index']) | (set(report['duplicated_vectors']) - set(report['orphaned_vectors'])))
+        added = 0
+        for start in range(0, len(to_add), self.chunk_size):
+            batch = to_add[start:start + self.chunk_size]
+            rows = db.session.query(RAGDocument.id, RAGDocument.embedding_data)\
+                .filter(RAGDocument.id.in_(batch))\
+                .all()
+            for doc_id, embedding_data in rows:
+                try:
+                    index.add(doc_id, np.array(json.loads(embedding_data), dtype='float32'))
+                    added += 1
+                except Exception as e:
+                    print(f"Error re-indexing document {doc_id}: {e}")
+
+        if removed or added:
+            index.save()
+
+        result = {
+            'removed_vectors': int(removed),
+            'added_vectors': added,
+            'db_documents': report['db_documents'],
+            'repaired_at': datetime.utcnow().isoformat()
+        }
+        print(f"Index consistency repair: {result}")
+        return result
+
+    def get_last_report_summary(self) -> Dict[str, Any]:
+        """Counts from the last scan, without the ID lists"""
+        if not self.last_report:
+            return {'scanned_at': None}
+        return {
+            key: len(value) if isinstance(value, list) else value
+            for key, value in self.last_report.items()
+        }
@@ -0,0 +1,234 @@
+import json
+import time
+import hashlib
+import threading
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Dict, Any, Optional, Callable
+from src.services.chat_telemetry_service import stage
+from src.config import Config
+
+# Chat turn stage each provider's wait is attributed to
+TELEMETRY_STAGES = {'gemini': 'llm', 'embeddings': 'embed'}
+
+# Absolute time.monotonic() deadline inherited by every LLM call made inside a deadline() block
+_request_deadline = contextvars.ContextVar('llm_request_deadline', default=None)
+
+def _percentile(samples, q: float) -> Optional[float]:
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+
+class _ProviderState:
+    def __init__(self, name: str, concurrency: int):
+        self.name = name
+        self.concurrency = concurrency
+        self.semaphore = threading.BoundedSemaphore(concurrency)
+        self.lock = threading.Lock()
+        self.queue_ms = deque(maxlen=1000)
+        self.call_ms = deque(maxlen=1000)
+        self.counters = {
+            'requests': 0, 'coalesced': 0, 'in_flight': 0, 'queued': 0,
+            'timeouts': 0, 'rejected': 0, 'errors': 0
+        }
+
+    def bump(self, counter: str, delta: int = 1):
+        with self.lock:
+            self.counters[counter] += delta
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                **self.counters,
+                'concurrency': self.concurrency,
+                'queue_ms_p50': _percentile(self.queue_ms, 0.5),
+                'queue_ms_p95': _percentile(self.queue_ms, 0.95),
+                'call_ms_p50': _percentile(self.call_ms, 0.5),
+                'call_ms_p95': _percentile(self.call_ms, 0.95)
+            }
+
+def create_llm_backend():
+    """Backend selected by LLM_BACKEND: 'gemini' (AIService) or 'stub' (offline, deterministic)"""
+    if Config.LLM_BACKEND == 'stub':
+        from src.services.stub_llm_backend import StubLLMBackend
+        return StubLLMBackend()
+    from src.services.ai_service import AIService
+    return AIService()
+
+class _InflightCall:
+    """A queued or running backend call shared by every coalesced caller.
+
+    `deadline` is the latest deadline among its waiters; it only moves later
+    as callers join, so a short-budget leader cannot fail followers that
+    still have time left.
+    """
+
+    def __init__(self, deadline: float):
+        self.future = Future()
+        self.deadline = deadline
+
+class LLMGateway:
+    """Single entry point for model calls.
+
+    Exposes the AIService methods (generate_with_gemini, generate_prompt,
+    generate_tool_code, get_embeddings) with the same return contract, and
+    adds per-provider concurrency caps, single-flight coalescing of identical
+    in-flight requests, deadlines (inherited from an enclosing deadline()
+    block) and queue-time metrics. When a provider is saturated, requests wait
+    until their deadline and then fail fast instead of piling up on workers.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or create_llm_backend()
+        self.providers = {
+            'gemini': _ProviderState('gemini', Config.LLM_GEMINI_CONCURRENCY),
+            'embeddings': _ProviderState('embeddings', Config.LLM_EMBEDDINGS_CONCURRENCY)
+        }
+        self.executor = ThreadPoolExecutor(max_workers=Config.LLM_GATEWAY_WORKERS, thread_name_prefix='llm-gateway')
+        self._inflight: Dict[str, _InflightCall] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def deadline(self, seconds: float):
+        """Bound every LLM call in this block (nested blocks can only tighten it)"""
+        current = _request_deadline.get()
+        proposed = time.monotonic() + seconds
+        token = _request_deadline.set(min(current, proposed) if current else proposed)
+        try:
+            yield
+        finally:
+            _request_deadline.reset(token)
+
+    def _deadline(self, timeout: Optional[float]) -> float:
+        own = time.monotonic() + (timeout or Config.LLM_TIMEOUT_SECONDS)
+        inherited = _request_deadline.get()
+        return min(own, inherited) if inherited else own
+
+    def _key(self, method: str, args: tuple) -> str:
+        raw = json.dumps([method, args], sort_keys=True, default=str, ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _acquire(self, provider: _ProviderState, inflight: _InflightCall) -> bool:
+        """Wait for a provider slot until the call's (possibly extended) deadline"""
+        while True:
+            with self._lock:
+                remaining = inflight.deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if provider.semaphore.acquire(timeout=remaining):
+                return True
+
+    def _run(self, provider: _ProviderState, key: str, inflight: _InflightCall, method: str, args: tuple,
+             enqueued_at: float):
+        future = inflight.future
+        try:
+            provider.bump('queued')
+            acquired = self._acquire(provider, inflight)
+            provider.bump('queued', -1)
+            with provider.lock:
+                provider.queue_ms.append((time.monotonic() - enqueued_at) * 1000)
+            if not acquired:
+                provider.bump('rejected')
+                future.set_exception(FutureTimeoutError(f"{provider.name} queue deadline exceeded"))
+                return
+
+            provider.bump('in_flight')
+            started = time.monotonic()
+            try:
+                future.set_result(getattr(self.backend, method)(*args))
+            except Exception as e:
+                provider.bump('errors')
+                future.set_exception(e)
+            finally:
+                provider.semaphore.release()
+                provider.bump('in_flight', -1)
+                with provider.lock:
+                    provider.call_ms.append((time.monotonic() - started) * 1000)
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is inflight:
+                    del self._inflight[key]
+
+    def call(self, provider_name: str, method: str, *args, timeout: Optional[float] = None,
+             on_error: Callable[[str], Any] = lambda message: {'error': message}):
+        """Run backend.method(*args) through the gateway; failures go through on_error"""
+        provider = self.providers[provider_name]
+        deadline = self._deadline(timeout)
+        key = self._key(method, args)
+        provider.bump('requests')
+
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is not None:
+                provider.bump('coalesced')
+                inflight.deadline = max(inflight.deadline, deadline)
+            else:
+                inflight = _InflightCall(deadline)
+                self._inflight[key] = inflight
+                self.executor.submit(self._run, provider, key, inflight, method, args, time.monotonic())
+        future = inflight.future
+
+        try:
+            with stage(TELEMETRY_STAGES[provider_name]):
+                return future.result(timeout=max(deadline - time.monotonic(), 0))
+        except FutureTimeoutError as e:
+            provider.bump('timeouts')
+            return on_error(str(e) or f"{provider.name} request timed out")
+        except Exception as e:
+            print(f"Error calling {provider.name}.{method}: {e}")
+            return on_error(str(e))
+
+    @contextmanager
+    def slot(self, provider_name: str = 'gemini', timeout: Optional[float] = None):
+        """Hold a provider slot for work the gateway cannot run itself (e.g. streaming)"""
+        provider = self.providers[provider_name]
+        provider.bump('requests')
+        enqueued_at = time.monotonic()
+        remaining = self._deadline(timeout) - enqueued_at
+        provider.bump('queued')
+        acquired = remaining > 0 and provider.semaphore.acquire(timeout=remaining)
+        provider.bump('queued', -1)
+        with provider.lock:
+            provider.queue_ms.append((time.monotonic() - enqueued_at) * 1000)
+        if not acquired:
+            provider.bump('rejected')
+            raise FutureTimeoutError(f"{provider.name} queue deadline exceeded")
+
+        provider.bump('in_flight')
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            provider.semaphore.release()
+            provider.bump('in_flight', -1)
+            with provider.lock:
+                provider.call_ms.append((time.monotonic() - started) * 1000)
+
+    # AIService-compatible surface
+
+    def generate_with_gemini(self, prompt: str, context: str = None, timeout: Optional[float] = None):
+        args = (prompt, context) if context else (prompt,)
+        return self.call('gemini', 'generate_with_gemini', *args, timeout=timeout)
+
+    def generate_prompt(self, task_description: str, examples=None, timeout: Optional[float] = None):
+        return self.call('gemini', 'generate_prompt', task_description, examples, timeout=timeout)
+
+    def generate_tool_code(self, tool_description: str, language: str = 'python', timeout: Optional[float] = None):
+        return self.call('gemini', 'generate_tool_code', tool_description, language, timeout=timeout)
+
+    def get_embeddings(self, text: str, timeout: Optional[float] = None):
+        return self.call('embeddings', 'get_embeddings', text, timeout=timeout, on_error=lambda message: None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            inflight = len(self._inflight)
+        return {
+            'providers': {name: provider.get_stats() for name, provider in self.providers.items()},
+            'distinct_in_flight': inflight
+        }
+
+# Create global instance
+llm_gateway = LLMGateway()
@@ -0,0 +1,107 @@
+"""Load test for the chat and prompt/tool generation endpoints.
+
+Start the server with the offline backend so no request reaches Gemini:
+
+    LLM_BACKEND=stub LLM_STUB_LATENCY_MS=400 python main.py
+
+then drive it:
+
+    python load_test_chat.py --target chat --requests 500 --concurrency 32
+    python load_test_chat.py --target prompts --requests 200
+    python load_test_chat.py --target tools --base-url http://staging:5000
+
+Reports throughput, latency percentiles and the LLM gateway queue metrics.
+"""
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+def _percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else None
+
+def build_request(target, base_url, i, session_ids, use_rag):
+    """(url, json body) for the i-th request"""
+    if target == 'chat':
+        session_id = session_ids[i % len(session_ids)]
+        return f"{base_url}/api/chat/sessions/{session_id}/messages", {
+            'message': f"Load test question {i % 50}: summarize the latest project report",
+            'use_rag': use_rag
+        }
+    if target == 'prompts':
+        return f"{base_url}/api/prompts/generate", {
+            'task_description': f"Write release notes for sprint {i % 20}",
+            'examples': []
+        }
+    return f"{base_url}/api/tools/generate", {
+        'tool_description': f"Parse a CSV file and sum column {i % 10}",
+        'language': 'python'
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test chat/prompt/tool endpoints')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--target', choices=['chat', 'prompts', 'tools'], default='chat')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--sessions', type=int, default=8, help='Chat sessions to spread chat requests over')
+    parser.add_argument('--user-id', type=int, default=1)
+    parser.add_argument('--no-rag', action='store_true', help='Send chat messages with use_rag=false')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args(argv)
+
+    http = requests.Session()
+    session_ids = []
+    if args.target == 'chat':
+        for n in range(args.sessions):
+            response = http.post(
+                f"{args.base_url}/api/chat/sessions",
+                json={'user_id': args.user_id, 'title': f"Load test {n}"},
+                timeout=args.timeout
+            )
+            response.raise_for_status()
+            session_ids.append(response.json()['id'])
+
+    def run(i):
+        url, body = build_request(args.target, args.base_url, i, session_ids, not args.no_rag)
+        started = time.perf_counter()
+        try:
+            response = http.post(url, json=body, timeout=args.timeout)
+            ok = response.status_code < 400 and 'error' not in response.json()
+        except Exception:
+            ok = False
+        return ok, (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(run, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = [ms for _, ms in results]
+    report = {
+        'target': args.target,
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'errors': sum(1 for ok, _ in results if not ok),
+        'elapsed_seconds': round(elapsed, 2),
+        'requests_per_second': round(args.requests / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            'p50': round(_percentile(latencies, 0.50), 1),
+            'p95': round(_percentile(latencies, 0.95), 1),
+            'p99': round(_percentile(latencies, 0.99), 1),
+            'max': round(max(latencies), 1)
+        }
+    }
+    try:
+        report['llm_gateway'] = http.get(f"{args.base_url}/api/chat/llm/stats", timeout=args.timeout).json()
+    except Exception as e:
+        report['llm_gateway'] = {'error': str(e)}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 1 if report['errors'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
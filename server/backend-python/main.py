@@ -2,6 +2,7 @@ import os
 import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+import socketio
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from src.models.user import db
@@ -29,6 +30,10 @@ app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
 # Enable CORS for all routes
 CORS(app)
 
+# Serve Socket.IO (notifications, live analytics deltas) from the same server under /socket.io
+from src.services.notification_service import sio
+app.wsgi_app = socketio.WSGIApp(sio, app.wsgi_app)
+
 app.register_blueprint(user_bp, url_prefix='/api')
 app.register_blueprint(chat_bp, url_prefix='/api')
 app.register_blueprint(prompt_tool_bp, url_prefix='/api')
@@ -49,13 +54,35 @@ from src.models.user import User
 from src.models.chat import ChatSession, ChatMessage, PromptTemplate, GeneratedTool
 from src.models.enhanced_models import (
     UserProfile, WorkItem, UploadedFile, RAGDocument, 
-    Notification, Board, GraphNode, GraphEdge, SharedContent
+    Notification, Board, GraphNode, GraphEdge, SharedContent,
+    RAGDocumentSignature, RAGDocumentAccess, ChatSessionSummary,
+    DailyUserActivity, DailySessionActivity, DailySketch, RollupWatermark, ChatTurnTelemetry,
+    TableRowCount, create_missing_indexes
 )
 
 with app.app_context():
     db.create_all()
+    create_missing_indexes()
+    from src.services.row_count_service import ensure_row_counts
+    ensure_row_counts()
+    from src.services.chat_search_service import chat_search_service
+    chat_search_service.ensure_index()
+    from src.services.enhanced_rag_service import enhanced_rag_service
+    if enhanced_rag_service.dedup_detector:
+        enhanced_rag_service.dedup_detector.load()
     print("Database tables created successfully")
 
+from src.services.chat_telemetry_service import chat_telemetry
+chat_telemetry.start(app)
+
+# Keep the analytics rollups current without waiting for /scheduler/start
+from src.services.analytics_rollup_service import analytics_rollup_service
+analytics_rollup_service.start(app)
+
+if Config.CHAT_WRITE_BEHIND_ENABLED:
+    from src.services.chat_write_buffer_service import chat_write_buffer
+    chat_write_buffer.start(app)
+
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
 def serve(path):
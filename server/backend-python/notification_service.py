@@ -1,9 +1,14 @@
 import json
+import threading
 from datetime import datetime
 from src.models.user import db
 from src.models.enhanced_models import Notification
+from src.services import change_feed_service
+from src.config import Config
 import socketio
 
+ANALYTICS_METRICS = ('messages', 'uploads', 'rag_documents')
+
 # Create Socket.IO server
 sio = socketio.Server(cors_allowed_origins='*', async_mode='threading')
 sio_app = socketio.WSGIApp(sio)
@@ -146,6 +151,152 @@ class NotificationService:
         """Send a warning notification"""
         return self.add_notification(user_id, title, message, 'warning', action_url)
 
+class AnalyticsStream:
+    """Pushes incremental analytics deltas to subscribed dashboards.
+
+    Clients load a baseline from the REST analytics endpoints once, then
+    subscribe to metrics ('messages', 'uploads', 'rag_documents') for a user
+    or for all users. Committed inserts reported by the change feed are
+    accumulated per room and emitted as one 'analytics_delta' event per room
+    every ANALYTICS_STREAM_INTERVAL_SECONDS, so a burst of writes costs one
+    push per second instead of one query round per dashboard poll.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = interval or Config.ANALYTICS_STREAM_INTERVAL_SECONDS
+        self.subscriptions = {}  # sid -> set of rooms
+        self.room_sizes = {}  # room -> number of subscribed sids
+        self.pending = {}  # room -> accumulated delta
+        self.sequences = {}  # room -> number of deltas emitted
+        self._lock = threading.Lock()
+        self._flusher_started = False
+        change_feed_service.register(self.on_changes)
+
+    def _room(self, user_id, metric):
+        return f"analytics:{user_id if user_id else 'all'}:{metric}"
+
+    @staticmethod
+    def _user_id(user_id):
+        """Client-supplied user id as an int (None for all users); raises ValueError otherwise"""
+        if user_id in (None, ''):
+            return None
+        if isinstance(user_id, bool):
+            raise ValueError('user_id must be an integer')
+        try:
+            return int(user_id)
+        except (TypeError, ValueError):
+            raise ValueError('user_id must be an integer')
+
+    def subscribe(self, sid, user_id=None, metrics=None):
+        user_id = self._user_id(user_id)
+        metrics = [m for m in (metrics or ANALYTICS_METRICS) if m in ANALYTICS_METRICS]
+        rooms = {self._room(user_id, metric) for metric in metrics}
+        with self._lock:
+            joined = self.subscriptions.setdefault(sid, set())
+            for room in rooms - joined:
+                sio.enter_room(sid, room)
+                self.room_sizes[room] = self.room_sizes.get(room, 0) + 1
+            joined.update(rooms)
+            if not self._flusher_started:
+                self._flusher_started = True
+                sio.start_background_task(self._flush_loop)
+        return metrics
+
+    def unsubscribe(self, sid, rooms=None):
+        """Leave the given rooms, or forget every room of a disconnected sid"""
+        with self._lock:
+            joined = self.subscriptions.get(sid, set())
+            for room in list(joined if rooms is None else joined & set(rooms)):
+                joined.discard(room)
+                if rooms is not None:
+                    sio.leave_room(sid, room)
+                self.room_sizes[room] -= 1
+                if self.room_sizes[room] <= 0:
+                    del self.room_sizes[room]
+                    self.pending.pop(room, None)
+                    self.sequences.pop(room, None)
+            if not joined:
+                self.subscriptions.pop(sid, None)
+
+    def unsubscribe_metrics(self, sid, user_id=None, metrics=None):
+        user_id = self._user_id(user_id)
+        self.unsubscribe(sid, [self._room(user_id, m) for m in (metrics or ANALYTICS_METRICS)])
+
+    def _accumulate(self, room, change):
+        delta = self.pending.get(room)
+        if delta is None:
+            delta = self.pending[room] = {'total': 0}
+        delta['total'] += 1
+        kind = change['kind']
+        if kind == 'chat_message':
+            by_role = delta.setdefault('by_role', {})
+            by_role[change.get('role')] = by_role.get(change.get('role'), 0) + 1
+            sessions = delta.setdefault('active_sessions', [])
+            if change.get('session_id') not in sessions:
+                sessions.append(change.get('session_id'))
+        elif kind == 'uploaded_file':
+            delta['bytes'] = delta.get('bytes', 0) + (change.get('file_size') or 0)
+            by_type = delta.setdefault('by_type', {})
+            by_type[change.get('file_type')] = by_type.get(change.get('file_type'), 0) + 1
+        elif kind == 'rag_document':
+            by_source = delta.setdefault('by_source', {})
+            by_source[change.get('source_type')] = by_source.get(change.get('source_type'), 0) + 1
+
+    def on_changes(self, changes):
+        """Change feed listener: fold committed inserts into pending deltas"""
+        metric_for = {'chat_message': 'messages', 'uploaded_file': 'uploads', 'rag_document': 'rag_documents'}
+        with self._lock:
+            if not self.room_sizes:
+                return
+            for change in changes:
+                metric = metric_for.get(change['kind'])
+                if not metric:
+                    continue
+                for room in (self._room(change.get('user_id'), metric), self._room(None, metric)):
+                    if room in self.room_sizes:
+                        self._accumulate(room, change)
+
+    def flush(self):
+        """Emit and clear every pending delta"""
+        with self._lock:
+            pending, self.pending = self.pending, {}
+            sequences = {}
+            for room in pending:
+                sequences[room] = self.sequences[room] = self.sequences.get(room, 0) + 1
+        now = datetime.utcnow().isoformat()
+        for room, delta in pending.items():
+            # One failing room must not drop the deltas of the others
+            try:
+                _, scope, metric = room.split(':', 2)
+                sio.emit('analytics_delta', {
+                    'metric': metric,
+                    'user_id': None if scope == 'all' else int(scope),
+                    'delta': delta,
+                    'sequence': sequences[room],
+                    'window_seconds': self.interval,
+                    'timestamp': now
+                }, room=room)
+            except Exception as e:
+                print(f"Error pushing analytics delta to {room}: {e}")
+
+    def _flush_loop(self):
+        while True:
+            sio.sleep(self.interval)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Error pushing analytics deltas: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self.subscriptions),
+                'rooms': dict(self.room_sizes),
+                'pending_rooms': len(self.pending),
+                'deltas_sent': sum(self.sequences.values()),
+                'interval_seconds': self.interval
+            }
+
 # Setup Socket.IO event handlers
 @sio.event
 def connect(sid, environ):
@@ -154,6 +305,7 @@ def connect(sid, environ):
 @sio.event
 def disconnect(sid):
     notification_service.remove_user_connection(sid)
+    analytics_stream.unsubscribe(sid)
     print(f"Client disconnected: {sid}")
 
 @sio.event
@@ -168,6 +320,27 @@ def register_user(sid, data):
         print(f"Error registering user: {e}")
         return {'status': 'error', 'message': str(e)}
 
-# Create global instance
+@sio.event
+def subscribe_analytics(sid, data):
+    try:
+        data = data or {}
+        metrics = analytics_stream.subscribe(sid, data.get('user_id'), data.get('metrics'))
+        return {'status': 'success', 'metrics': metrics, 'interval_seconds': analytics_stream.interval}
+    except Exception as e:
+        print(f"Error subscribing to analytics: {e}")
+        return {'status': 'error', 'message': str(e)}
+
+@sio.event
+def unsubscribe_analytics(sid, data):
+    try:
+        data = data or {}
+        analytics_stream.unsubscribe_metrics(sid, data.get('user_id'), data.get('metrics'))
+        return {'status': 'success'}
+    except Exception as e:
+        print(f"Error unsubscribing from analytics: {e}")
+        return {'status': 'error', 'message': str(e)}
+
+# Create global instances
 notification_service = NotificationService()
+analytics_stream = AnalyticsStream()
 
@@ -1,10 +1,10 @@
 from flask import Blueprint, request, jsonify
 from src.models.chat import PromptTemplate, GeneratedTool, db
-from src.services.ai_service import AIService
+from src.services.llm_gateway_service import llm_gateway
 import json
 
 prompt_tool_bp = Blueprint('prompt_tool', __name__)
-ai_service = AIService()
+ai_service = llm_gateway
 
 # Prompt Template Routes
 @prompt_tool_bp.route('/prompts', methods=['GET'])
@@ -4,11 +4,15 @@ import os
 import json
 import pickle
 from typing import List, Dict, Any
-from src.services.ai_service import AIService
+from src.services.llm_gateway_service import llm_gateway
+from src.services.context_packing_service import ContextPacker
+from src.services.chat_telemetry_service import stage
+from src.config import Config
 
 class RAGService:
     def __init__(self):
-        self.ai_service = AIService()
+        self.ai_service = llm_gateway
+        self.context_packer = ContextPacker()  # lexical similarity; avoids re-embedding chunks via the API
         self.index = None
         self.documents = []
         self.embeddings_dim = 384  # dimension for all-MiniLM-L6-v2
@@ -97,12 +101,13 @@ class RAGService:
             
             # Search
             query_flat = query_embeddings.flatten().astype('float32')
-            distances, indices = self.index.search(np.array([query_flat]), k)
+            with stage('search'):
+                distances, indices = self.index.search(np.array([query_flat]), k)
             
             # Return results
             results = []
             for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-                if idx < len(self.documents):
+                if 0 <= idx < len(self.documents):
                     doc = self.documents[idx].copy()
                     doc['similarity_score'] = float(1 / (1 + distance))  # Convert distance to similarity
                     results.append(doc)
@@ -113,49 +118,80 @@ class RAGService:
             print(f"Error searching: {e}")
             return []
     
-    def generate_answer(self, query: str, k: int = 3) -> Dict[str, Any]:
-        """Generate answer using RAG"""
+    def retrieve_context(self, query: str, k: int = 3, max_tokens: int = None) -> Dict[str, Any]:
+        """Retrieve and pack context for a query without generating an answer"""
         # Search for relevant documents
-        relevant_docs = self.search(query, k)
+        relevant_docs = self.search(query, max(k, Config.RAG_CONTEXT_CANDIDATES))
         
         if not relevant_docs:
             return {
-                'answer': 'ไม่พบข้อมูลที่เกี่ยวข้องในฐานข้อมูล',
+                'context': '',
                 'sources': [],
-                'confidence': 0.0
+                'confidence': 0.0,
+                'context_stats': {}
             }
         
-        # Prepare context
-        context_parts = []
-        sources = []
+        # Pack the most relevant, non-overlapping passages into the token budget
+        packed = self.context_packer.pack(
+            query,
+            [{
+                'text': doc['text'],
+                'title': doc['metadata'].get('title') or f"Document {doc['id']}",
+                'score': doc['similarity_score']
+            } for doc in relevant_docs],
+            max_tokens=max_tokens or Config.RAG_CONTEXT_MAX_TOKENS
+        )
+        context = packed['context']
+        relevant_docs = [relevant_docs[i] for i in packed['doc_indexes']] or relevant_docs[:k]
         
+        sources = []
         for doc in relevant_docs:
-            context_parts.append(doc['text'])
             sources.append({
                 'text': doc['text'][:200] + '...' if len(doc['text']) > 200 else doc['text'],
                 'metadata': doc['metadata'],
                 'similarity_score': doc['similarity_score']
             })
         
-        context = '\n\n'.join(context_parts)
+        # Calculate confidence based on similarity scores
+        avg_similarity = sum(doc['similarity_score'] for doc in relevant_docs) / len(relevant_docs)
+        
+        return {
+            'context': context,
+            'sources': sources,
+            'confidence': avg_similarity,
+            'context_stats': packed['stats']
+        }
+    
+    def generate_answer(self, query: str, k: int = 3, max_tokens: int = None, history: str = "",
+                        retrieved: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Generate answer using RAG (pass `retrieved` to reuse context from another retriever)"""
+        if retrieved is None:
+            retrieved = self.retrieve_context(query, k, max_tokens)
+        
+        if not retrieved['sources']:
+            return {
+                'answer': 'ไม่พบข้อมูลที่เกี่ยวข้องในฐานข้อมูล',
+                'sources': [],
+                'confidence': 0.0
+            }
         
-        # Generate answer
+        # Generate answer (conversation history goes ahead of the retrieved context)
+        context = f"{history}\n\n{retrieved['context']}" if history else retrieved['context']
         answer_result = self.ai_service.generate_with_gemini(query, context)
         
         if 'error' in answer_result:
             return {
                 'answer': f"เกิดข้อผิดพลาด: {answer_result['error']}",
-                'sources': sources,
-                'confidence': 0.0
+                'sources': retrieved['sources'],
+                'confidence': 0.0,
+                'context_stats': retrieved['context_stats']
             }
         
-        # Calculate confidence based on similarity scores
-        avg_similarity = sum(doc['similarity_score'] for doc in relevant_docs) / len(relevant_docs)
-        
         return {
             'answer': answer_result['response'],
-            'sources': sources,
-            'confidence': avg_similarity
+            'sources': retrieved['sources'],
+            'confidence': retrieved['confidence'],
+            'context_stats': retrieved['context_stats']
         }
     
     def _save_index(self):
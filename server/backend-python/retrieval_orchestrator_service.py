@@ -0,0 +1,201 @@
+import time
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, List, Optional
+from flask import current_app
+from src.services.chat_telemetry_service import stage
+from src.config import Config
+
+class RetrievalOrchestrator:
+    """Fans a chat query out to every retrieval source concurrently.
+
+    Sources are the shared local index (RAGService), the user's document index
+    (EnhancedRAGService) and, when enabled, Notion. Each source has its own
+    deadline; results are merged as they arrive and a source that misses its
+    deadline is dropped from this answer instead of holding it up.
+
+    Sources score on different scales (1/(1+L2) locally, cosine for user
+    documents, none for Notion), so they are merged by reciprocal rank fusion
+    of each source's own ranking rather than by raw score.
+    """
+
+    # Sources whose raw scores are similarities in [0, 1], used for confidence
+    SCORED_SOURCES = ('local', 'user')
+
+    def __init__(self, rag_service, enhanced_rag_service=None, max_workers=8):
+        self.rag_service = rag_service
+        self.enhanced_rag_service = enhanced_rag_service
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='retrieval')
+
+    def _search_local(self, query: str, k: int) -> List[Dict[str, Any]]:
+        return [{
+            'text': doc['text'],
+            'title': doc['metadata'].get('title') or f"Document {doc['id']}",
+            'score': doc['similarity_score'],
+            'metadata': doc['metadata']
+        } for doc in self.rag_service.search(query, k)]
+
+    def _search_user(self, app, query: str, user_id: int, k: int) -> List[Dict[str, Any]]:
+        with app.app_context():
+            return [{
+                'text': doc.content or '',
+                'title': doc.title,
+                'score': score,
+                'metadata': {'document_id': doc.id, 'source_type': doc.source_type, 'tier': tier}
+            } for doc, score, tier in self.enhanced_rag_service._search_documents(query, user_id, k)]
+
+    def _search_notion(self, query: str, user_id: int, deadline: float) -> List[Dict[str, Any]]:
+        """Notion search plus page fetches, each bounded by what is left of `deadline`.
+
+        A timed-out source keeps its pool thread until it returns, so no request
+        may outlive the source's deadline or abandoned Notion calls would starve
+        the local and user searches.
+        """
+        results = []
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return results
+        pages = self.enhanced_rag_service.search_notion_pages(query, user_id, timeout=remaining)
+        for page in pages[:Config.RAG_FANOUT_NOTION_PAGES]:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            content = self.enhanced_rag_service.get_notion_page_content(page['id'], timeout=remaining)
+            if not content.strip():
+                continue
+            results.append({
+                'text': content,
+                'title': page['title'],
+                # Notion search is not scored; only its ranking is used
+                'score': 0.0,
+                'metadata': {'title': page['title'], 'url': page.get('url'), 'source_type': 'notion'}
+            })
+        return results
+
+    def _sources(self, query: str, user_id: Optional[int], k: int) -> Dict[str, tuple]:
+        """name -> (callable, timeout seconds)"""
+        sources = {
+            'local': (lambda: self._search_local(query, k), Config.RAG_FANOUT_LOCAL_TIMEOUT_MS / 1000.0)
+        }
+        if self.enhanced_rag_service and user_id is not None:
+            app = current_app._get_current_object()
+            sources['user'] = (
+                lambda: self._search_user(app, query, user_id, k),
+                Config.RAG_FANOUT_USER_TIMEOUT_MS / 1000.0
+            )
+            if Config.RAG_FANOUT_NOTION_ENABLED and self.enhanced_rag_service.notion_api_key:
+                timeout = Config.RAG_FANOUT_NOTION_TIMEOUT_MS / 1000.0
+                deadline = time.monotonic() + timeout
+                sources['notion'] = (lambda: self._search_notion(query, user_id, deadline), timeout)
+        return sources
+
+    def gather(self, sources: Dict[str, tuple]):
+        """Run sources concurrently; returns (documents, per-source status)"""
+        started = time.monotonic()
+        # Each source runs in a copy of the caller's context, so the request's LLM
+        # deadline and chat turn telemetry carry over into the worker threads
+        futures = {
+            self.executor.submit(contextvars.copy_context().run, fn): name
+            for name, (fn, _) in sources.items()
+        }
+        deadlines = {name: started + timeout for name, (_, timeout) in sources.items()}
+        documents, status = [], {}
+
+        pending = set(futures)
+        while pending:
+            now = time.monotonic()
+            for future in [f for f in pending if deadlines[futures[f]] <= now]:
+                # Left running in the background; its result is simply ignored
+                pending.discard(future)
+                status[futures[future]] = {'status': 'timeout', 'latency_ms': round((now - started) * 1000, 1)}
+            if not pending:
+                break
+
+            next_deadline = min(deadlines[futures[f]] for f in pending)
+            done, pending = wait(pending, timeout=max(next_deadline - now, 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                latency_ms = round((time.monotonic() - started) * 1000, 1)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    print(f"Error retrieving from {name}: {e}")
+                    status[name] = {'status': 'error', 'latency_ms': latency_ms}
+                    continue
+                for doc in results:
+                    doc['source'] = name
+                documents.extend(results)
+                status[name] = {'status': 'ok', 'results': len(results), 'latency_ms': latency_ms}
+
+        return documents, status
+
+    def fuse(self, documents: List[Dict[str, Any]], rrf_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Order documents by reciprocal rank fusion of their per-source rankings.
+
+        Each document's raw score is kept as `source_score`; `score` becomes the
+        fused score scaled so the best document has 1.0.
+        """
+        rrf_k = Config.RAG_FANOUT_RRF_K if rrf_k is None else rrf_k
+        by_source = {}
+        for doc in documents:
+            by_source.setdefault(doc['source'], []).append(doc)
+
+        for docs in by_source.values():
+            # Sort is stable, so unscored sources keep the order they returned
+            docs.sort(key=lambda doc: doc['score'], reverse=True)
+            for rank, doc in enumerate(docs):
+                doc['source_score'] = doc['score']
+                doc['score'] = 1.0 / (rrf_k + rank + 1)
+
+        best = max((doc['score'] for doc in documents), default=0.0)
+        for doc in documents:
+            doc['score'] = doc['score'] / best if best else 0.0
+        return sorted(documents, key=lambda doc: doc['score'], reverse=True)
+
+    def confidence(self, documents: List[Dict[str, Any]]) -> float:
+        """Mean similarity of the documents from sources that report one"""
+        scores = [
+            min(max(doc['source_score'], 0.0), 1.0)
+            for doc in documents if doc['source'] in self.SCORED_SOURCES
+        ]
+        return sum(scores) / len(scores) if scores else 0.0
+
+    def retrieve_context(self, query: str, k: int = 3, max_tokens: int = None,
+                         user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Same result shape as RAGService.retrieve_context, drawn from every source"""
+        candidates = max(k, Config.RAG_CONTEXT_CANDIDATES)
+        with stage('retrieval'):
+            documents, status = self.gather(self._sources(query, user_id, candidates))
+
+        if not documents:
+            return {
+                'context': '',
+                'sources': [],
+                'confidence': 0.0,
+                'context_stats': {},
+                'retrieval': status
+            }
+
+        documents = self.fuse(documents)
+        packed = self.rag_service.context_packer.pack(
+            query,
+            documents,
+            max_tokens=max_tokens or Config.RAG_CONTEXT_MAX_TOKENS
+        )
+        selected = [documents[i] for i in packed['doc_indexes']] or documents[:k]
+
+        sources = [{
+            'text': doc['text'][:200] + '...' if len(doc['text']) > 200 else doc['text'],
+            'metadata': doc['metadata'],
+            'similarity_score': doc['source_score'] if doc['source'] in self.SCORED_SOURCES else None,
+            'fused_score': round(doc['score'], 4),
+            'source': doc['source']
+        } for doc in selected]
+
+        return {
+            'context': packed['context'],
+            'sources': sources,
+            'confidence': self.confidence(selected),
+            'context_stats': packed['stats'],
+            'retrieval': status
+        }
@@ -0,0 +1,68 @@
+from typing import Dict, Any
+from sqlalchemy import event, func, select, update
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db
+from src.models.chat import ChatSession
+from src.models.enhanced_models import (
+    UserProfile, WorkItem, Board, GraphNode, GraphEdge, TableRowCount
+)
+
+# Tables whose totals the system snapshot reports
+COUNTED_MODELS = [UserProfile, WorkItem, Board, GraphNode, GraphEdge, ChatSession]
+
+def _adjust(connection, table_name: str, delta: int):
+    """Move a counter in the flushing transaction, so it commits or rolls back with the row"""
+    connection.execute(
+        update(TableRowCount)
+        .where(TableRowCount.name == table_name)
+        .values(row_count=TableRowCount.row_count + delta)
+    )
+
+def _listen(model):
+    table_name = model.__tablename__
+
+    @event.listens_for(model, 'after_insert')
+    def _inserted(mapper, connection, target):
+        _adjust(connection, table_name, 1)
+
+    @event.listens_for(model, 'after_delete')
+    def _deleted(mapper, connection, target):
+        _adjust(connection, table_name, -1)
+
+for _model in COUNTED_MODELS:
+    _listen(_model)
+
+def ensure_row_counts():
+    """Seed counters that do not exist yet with one COUNT(*) each; call once at startup"""
+    existing = {name for (name,) in db.session.query(TableRowCount.name).all()}
+    for model in COUNTED_MODELS:
+        if model.__tablename__ not in existing:
+            count = db.session.query(func.count()).select_from(model).scalar()
+            db.session.add(TableRowCount(name=model.__tablename__, row_count=count))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker seeded them first
+        db.session.rollback()
+
+def recount_rows():
+    """Recount every table; for loaders that insert with Core statements, which skip the ORM hooks"""
+    for model in COUNTED_MODELS:
+        count = db.session.query(func.count()).select_from(model).scalar()
+        row = db.session.get(TableRowCount, model.__tablename__)
+        if row:
+            row.row_count = count
+        else:
+            db.session.add(TableRowCount(name=model.__tablename__, row_count=count))
+    db.session.commit()
+
+def row_count_columns() -> Dict[str, Any]:
+    """Scalar subqueries reading each counter, keyed by table name"""
+    return {
+        model.__tablename__: func.coalesce(
+            select(TableRowCount.row_count)
+            .where(TableRowCount.name == model.__tablename__)
+            .scalar_subquery(), 0
+        )
+        for model in COUNTED_MODELS
+    }
@@ -6,6 +6,7 @@ import json
 import logging
 from src.services.external_integrations import IntegrationManager
 from src.services.n8n_service import N8NService
+from src.config import Config
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,13 +18,18 @@ class SchedulerService:
         self.n8n_service = N8NService()
         self.is_running = False
         self.scheduler_thread = None
+        self.app = None
         
-    def start_scheduler(self):
+    def start_scheduler(self, app=None):
         """Start the scheduler in a separate thread"""
         if self.is_running:
             logger.info("Scheduler is already running")
             return
         
+        # Jobs that touch the database need the Flask app to push a context
+        if app is not None:
+            self.app = app
+        
         self.is_running = True
         self.scheduler_thread = threading.Thread(target=self._run_scheduler, daemon=True)
         self.scheduler_thread.start()
@@ -59,6 +65,15 @@ class SchedulerService:
         # Monthly cleanup on 1st day at 4:00 AM
         schedule.every().month.do(self.monthly_cleanup_job)
         
+        # Move RAG documents between hot and cold index tiers
+        schedule.every(Config.RAG_TIER_MIGRATION_MINUTES).minutes.do(self.rag_tier_migration_job)
+        
+        # Repair drift between RAG documents and the vector index
+        schedule.every(Config.RAG_CONSISTENCY_CHECK_MINUTES).minutes.do(self.rag_consistency_job)
+        
+        # Fold new rows into the daily analytics rollups
+        schedule.every(Config.ANALYTICS_ROLLUP_MINUTES).minutes.do(self.analytics_rollup_job)
+        
         logger.info("All scheduled tasks have been set up")
     
     def daily_backup_job(self):
@@ -198,6 +213,58 @@ class SchedulerService:
         except Exception as e:
             logger.error(f"Monthly cleanup job failed with exception: {str(e)}")
     
+    def _run_in_app_context(self, job, *args, **kwargs):
+        """Run a job inside the Flask app context when one is available"""
+        if self.app is None:
+            return job(*args, **kwargs)
+        with self.app.app_context():
+            return job(*args, **kwargs)
+    
+    def rag_tier_migration_job(self):
+        """Promote/demote RAG documents between index tiers based on hit counters"""
+        try:
+            from src.services.enhanced_rag_service import enhanced_rag_service
+            
+            result = self._run_in_app_context(enhanced_rag_service.migrate_tiers)
+            
+            if 'error' in result:
+                logger.error(f"RAG tier migration failed: {result['error']}")
+            else:
+                logger.info(f"RAG tier migration completed: {result}")
+                
+        except Exception as e:
+            logger.error(f"RAG tier migration job failed with exception: {str(e)}")
+    
+    def rag_consistency_job(self):
+        """Diff RAG documents against the vector index and repair only the delta"""
+        try:
+            from src.services.enhanced_rag_service import enhanced_rag_service
+            
+            result = self._run_in_app_context(enhanced_rag_service.check_index_consistency, repair=True)
+            
+            if 'error' in result:
+                logger.error(f"RAG consistency repair failed: {result['error']}")
+            else:
+                logger.info(f"RAG consistency repair completed: {result}")
+                
+        except Exception as e:
+            logger.error(f"RAG consistency job failed with exception: {str(e)}")
+    
+    def analytics_rollup_job(self):
+        """Advance the daily analytics rollups past their watermarks"""
+        try:
+            from src.services.analytics_rollup_service import analytics_rollup_service
+            
+            result = self._run_in_app_context(analytics_rollup_service.run)
+            
+            if 'error' in result:
+                logger.error(f"Analytics rollup failed: {result['error']}")
+            else:
+                logger.info(f"Analytics rollup completed: {result}")
+                
+        except Exception as e:
+            logger.error(f"Analytics rollup job failed with exception: {str(e)}")
+    
     def manual_backup(self):
         """Trigger manual backup"""
         try:
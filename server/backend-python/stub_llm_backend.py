@@ -0,0 +1,75 @@
+import time
+import random
+import hashlib
+import numpy as np
+from typing import Iterator, Optional, List
+from src.config import Config
+
+_WORDS = (
+    'the system retrieves relevant documents and summarizes key points for the user '
+    'ระบบ ค้นหา เอกสาร ที่ เกี่ยวข้อง และ สรุป ประเด็น สำคัญ ให้ ผู้ใช้ '
+    'context answer result data report analysis workflow project update'
+).split()
+
+class StubLLMBackend:
+    """Deterministic offline stand-in for AIService, for load tests and benchmarks.
+
+    The same prompt always produces the same text and embedding. Latency is
+    drawn from a log-normal distribution (median LLM_STUB_LATENCY_MS, shape
+    LLM_STUB_LATENCY_SIGMA) and streamed output is paced at
+    LLM_STUB_TOKENS_PER_SECOND, so the rest of the pipeline sees realistic
+    timing without any network access.
+    """
+
+    def __init__(self, latency_ms=None, latency_sigma=None, tokens_per_second=None,
+                 response_tokens=None, dimension=384, seed=None):
+        self.latency_ms = latency_ms if latency_ms is not None else Config.LLM_STUB_LATENCY_MS
+        self.latency_sigma = latency_sigma if latency_sigma is not None else Config.LLM_STUB_LATENCY_SIGMA
+        self.tokens_per_second = tokens_per_second or Config.LLM_STUB_TOKENS_PER_SECOND
+        self.response_tokens = response_tokens or Config.LLM_STUB_RESPONSE_TOKENS
+        self.dimension = dimension
+        self.rng = random.Random(seed if seed is not None else Config.LLM_STUB_SEED)
+
+    def _seed(self, *parts) -> int:
+        digest = hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).digest()
+        return int.from_bytes(digest[:8], 'big')
+
+    def _sleep_latency(self):
+        if self.latency_ms <= 0:
+            return
+        time.sleep(self.rng.lognormvariate(0, self.latency_sigma) * self.latency_ms / 1000.0)
+
+    def _tokens(self, *parts) -> List[str]:
+        words = random.Random(self._seed(*parts))
+        # parts[0] is the call kind; echo the start of the prompt so replies are recognisable
+        echo = ' '.join(str(part) for part in parts[1:] if part).split()[:5]
+        return echo + [words.choice(_WORDS) for _ in range(max(self.response_tokens - len(echo), 0))]
+
+    def _respond(self, *parts) -> dict:
+        tokens = self._tokens(*parts)
+        # Blocking calls pay first-token latency plus the full generation time
+        self._sleep_latency()
+        time.sleep(len(tokens) / self.tokens_per_second)
+        return {'response': ' '.join(tokens)}
+
+    def generate_with_gemini(self, prompt: str, context: Optional[str] = None) -> dict:
+        return self._respond('chat', prompt, context)
+
+    def generate_prompt(self, task_description: str, examples=None) -> dict:
+        return self._respond('prompt', task_description, examples)
+
+    def generate_tool_code(self, tool_description: str, language: str = 'python') -> dict:
+        body = self._respond('tool', tool_description, language)['response']
+        return {'response': f"```{language}\n# {tool_description}\n# {body}\n```"}
+
+    def get_embeddings(self, text: str) -> np.ndarray:
+        vector = np.random.default_rng(self._seed('embed', text)).standard_normal(self.dimension).astype('float32')
+        return vector / np.linalg.norm(vector)
+
+    def stream_generate(self, prompt: str, context: Optional[str] = None) -> Iterator[str]:
+        """Yield the generate_with_gemini text token by token at the configured rate"""
+        self._sleep_latency()
+        interval = 1.0 / self.tokens_per_second
+        for i, token in enumerate(self._tokens('chat', prompt, context)):
+            time.sleep(interval)
+            yield token if i == 0 else f" {token}"
@@ -0,0 +1,70 @@
+import os
+import sys
+import types
+from datetime import datetime
+
+# In the deployed package these modules live under src/services, src/models,
+# src/routes and src/config.py; in this tree they sit flat in backend-python.
+# Map the src.* packages onto the flat directory so tests import them unchanged.
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for name in ('src', 'src.services', 'src.models', 'src.routes'):
+    if name not in sys.modules:
+        package = types.ModuleType(name)
+        package.__path__ = [BACKEND_DIR]
+        sys.modules[name] = package
+
+
+def _ensure_chat_models():
+    """Register minimal src.models.user/chat modules when the tree does not ship them.
+
+    Only the columns the chat services read and write are defined.
+    """
+    try:
+        import src.models.chat  # noqa
+        return
+    except ImportError:
+        pass
+
+    try:
+        from flask_sqlalchemy import SQLAlchemy
+    except ImportError:
+        return
+
+    db = SQLAlchemy()
+
+    class ChatSession(db.Model):
+        __tablename__ = 'chat_sessions'
+        id = db.Column(db.Integer, primary_key=True)
+        user_id = db.Column(db.Integer, nullable=False)
+        title = db.Column(db.String(200))
+        created_at = db.Column(db.DateTime, default=datetime.utcnow)
+        updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+        def to_dict(self):
+            return {'id': self.id, 'user_id': self.user_id, 'title': self.title,
+                    'updated_at': self.updated_at.isoformat()}
+
+    class ChatMessage(db.Model):
+        __tablename__ = 'chat_messages'
+        id = db.Column(db.Integer, primary_key=True)
+        session_id = db.Column(db.Integer, nullable=False)
+        role = db.Column(db.String(20), nullable=False)
+        content = db.Column(db.Text, nullable=False)
+        sources = db.Column(db.Text)
+        confidence_score = db.Column(db.Float)
+        timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+        def to_dict(self):
+            return {'id': self.id, 'session_id': self.session_id, 'role': self.role,
+                    'content': self.content, 'timestamp': self.timestamp.isoformat()}
+
+    user = types.ModuleType('src.models.user')
+    user.db = db
+    chat = types.ModuleType('src.models.chat')
+    chat.db, chat.ChatSession, chat.ChatMessage = db, ChatSession, ChatMessage
+    sys.modules['src.models.user'] = user
+    sys.modules['src.models.chat'] = chat
+
+
+_ensure_chat_models()
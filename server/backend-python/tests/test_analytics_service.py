@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+pytest.importorskip('pandas')
+
+from flask import Flask
+from src.models.user import db
+from src.models.chat import ChatSession, ChatMessage
+from src.models.enhanced_models import UserProfile, UploadedFile, TableRowCount
+from src.services.analytics_service import AnalyticsService
+from src.services.analytics_rollup_service import AnalyticsRollupService
+from src.services.row_count_service import ensure_row_counts
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _upload(user_id, size, created_at):
+    return UploadedFile(user_id=user_id, original_filename='a.pdf', stored_filename='a.pdf',
+                        file_type='pdf', file_size=size, created_at=created_at)
+
+
+def test_snapshot_reads_counters_and_rollups(app):
+    db.session.add(UserProfile(user_id=1))
+    db.session.commit()
+    ensure_row_counts()
+
+    # Counters follow ORM inserts and deletes, and roll back with them
+    db.session.add_all([UserProfile(user_id=2), UserProfile(user_id=3)])
+    sessions = [ChatSession(user_id=1, title=f'chat {n}') for n in range(3)]
+    db.session.add_all(sessions)
+    db.session.commit()
+    db.session.delete(sessions[0])
+    db.session.commit()
+    db.session.add(ChatSession(user_id=1, title='rolled back'))
+    db.session.flush()
+    db.session.rollback()
+
+    old = datetime.utcnow() - timedelta(days=2)
+    db.session.add_all([_upload(1, 100, old), _upload(1, 200, old)])
+    db.session.add(ChatMessage(session_id=sessions[1].id, role='user', content='hi', timestamp=old))
+    db.session.commit()
+    AnalyticsRollupService().run()
+    db.session.add(_upload(2, 50, datetime.utcnow()))
+    db.session.add(ChatMessage(session_id=sessions[1].id, role='assistant', content='hello'))
+    db.session.commit()
+
+    snapshot = AnalyticsService().get_system_analytics()
+
+    assert snapshot['user_count'] == 3
+    assert snapshot['chat_stats'] == {'total_sessions': 2, 'total_messages': 2}
+    assert snapshot['file_stats'] == {'total_files': 3, 'total_size': 350}
+    assert db.session.get(TableRowCount, 'chat_sessions').row_count == 2
@@ -0,0 +1,62 @@
+import time
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from flask import Flask
+
+from src.config import Config
+Config.LLM_BACKEND = 'stub'  # the gateway is created on import; keep it offline
+
+from src.models.chat import ChatSession, db
+from src.services.chat_history_service import chat_history_service
+from src.services.chat_stream_service import ChatStreamService
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _page_through(user_id):
+    seen, cursor = [], None
+    while True:
+        page = chat_history_service.get_sessions_page(user_id, limit=1, before=cursor)
+        seen.extend(session['id'] for session in page['sessions'])
+        cursor = page['next_cursor']
+        if not cursor:
+            return seen
+
+
+def test_session_pages_do_not_repeat_a_session_bumped_by_a_turn(app):
+    sessions = []
+    for i in range(3):
+        session = ChatSession(user_id=1, title=f'session {i}')
+        db.session.add(session)
+        db.session.commit()
+        sessions.append(session)
+        time.sleep(0.01)
+
+    bumped = sessions[1]
+    ChatStreamService(rag_service=None, ai_service=None).persist_turn(bumped.id, 'hello', 'hi', None, None)
+
+    assert _page_through(1) == [bumped.id, sessions[2].id, sessions[0].id]
+
+
+def test_whole_second_timestamps_page_without_repeats(app):
+    # A cursor on a row without microseconds must not match that row again
+    stamps = [datetime(2026, 1, 1, 12, 0, 0), datetime(2026, 1, 1, 12, 0, 0, 500), datetime(2026, 1, 1, 12, 0, 1)]
+    for i, stamp in enumerate(stamps):
+        db.session.add(ChatSession(user_id=1, title=f'session {i}', updated_at=stamp))
+    db.session.commit()
+
+    assert _page_through(1) == [3, 2, 1]
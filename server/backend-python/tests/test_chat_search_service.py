@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from flask import Flask
+from sqlalchemy import text
+from src.models.chat import ChatSession, ChatMessage, db
+from src.services import chat_search_service as search_module
+from src.services.chat_search_service import chat_search_service
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        chat_search_service.ensure_index()
+        yield app
+        db.session.remove()
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.execute(text("DROP TABLE IF EXISTS chat_messages_fts"))
+        chat_search_service.dialect = None
+
+
+def _seed():
+    session = ChatSession(user_id=1, title='budget')
+    db.session.add(session)
+    db.session.flush()
+    for i in range(3):
+        db.session.add(ChatMessage(session_id=session.id, role='user', content=f'quarterly budget review {i}'))
+    db.session.commit()
+
+
+def _fts_ids():
+    return {row[0] for row in db.session.execute(text("SELECT rowid FROM chat_messages_fts"))}
+
+
+def test_reindex_sweeps_entries_for_missing_messages(app):
+    _seed()
+    with db.engine.begin() as connection:
+        connection.execute(text("INSERT INTO chat_messages_fts(rowid, tokens) VALUES (999, 'budget')"))
+
+    assert chat_search_service.reindex() == 3
+    assert _fts_ids() == {1, 2, 3}
+    assert len(chat_search_service.search(1, 'budget')['results']) == 3
+
+
+def test_failed_reindex_leaves_the_index_whole(app, monkeypatch):
+    _seed()
+    calls = []
+
+    def index_message(connection, message_id, content):
+        calls.append(message_id)
+        if len(calls) > 1:
+            raise RuntimeError('disk full')
+
+    monkeypatch.setattr(search_module, 'REINDEX_BATCH', 1)
+    monkeypatch.setattr(chat_search_service, 'index_message', index_message)
+    with pytest.raises(RuntimeError):
+        chat_search_service.reindex()
+    monkeypatch.undo()
+
+    assert len(chat_search_service.search(1, 'budget')['results']) == 3
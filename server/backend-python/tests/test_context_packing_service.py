@@ -0,0 +1,80 @@
+from src.services.context_packing_service import ContextPacker, estimate_tokens
+
+
+def _packer():
+    return ContextPacker(chunk_tokens=200, mmr_lambda=0.7)
+
+
+def test_document_without_blank_lines_is_split_to_fit_the_budget():
+    # Extracted PDF/CSV text: single newlines only, far larger than the budget
+    lines = [f"Row {i}: revenue grew in region {i % 7} during quarter {i % 4}." for i in range(400)]
+    text = '\n'.join(lines)
+    assert estimate_tokens(text) > 4000
+
+    packed = _packer().pack('revenue by region', [{'title': 'report.pdf', 'text': text, 'score': 0.8}], max_tokens=1000)
+
+    assert packed['stats']['chunks_selected'] > 0
+    assert packed['context'].startswith('Document: report.pdf')
+    assert packed['stats']['context_tokens'] <= 1100
+
+
+def test_single_long_line_is_split_into_windows():
+    text = 'x' * 20000
+
+    packed = _packer().pack('x', [{'title': 'blob', 'text': text, 'score': 0.5}], max_tokens=500)
+
+    assert packed['stats']['chunks_selected'] > 0
+    assert packed['context']
+
+
+def test_budget_smaller_than_a_passage_still_returns_context():
+    text = 'The contract renews every year unless either party cancels in writing. ' * 10
+
+    packed = _packer().pack('contract renewal', [{'title': 'terms', 'text': text, 'score': 0.9}], max_tokens=20)
+
+    assert packed['stats']['chunks_selected'] == 1
+    assert 'contract' in packed['context']
+
+
+def test_candidates_are_capped_before_pairwise_work():
+    encoded = []
+
+    def embed(texts):
+        encoded.extend(texts)
+        return [[float(len(text) % 7), 1.0, float(hash(text) % 5)] for text in texts]
+
+    documents = [{
+        'title': f'doc {d}',
+        'text': '\n\n'.join(f"Section {d}.{i}: revenue notes for region {i}. " * 20 for i in range(150)),
+        'score': 0.5
+    } for d in range(8)]
+    packer = ContextPacker(embed=embed, chunk_tokens=200, mmr_lambda=0.7, max_candidates=16)
+
+    packed = packer.pack('revenue by region', documents, max_tokens=1000)
+
+    assert packed['stats']['chunks_considered'] > 1000
+    assert packed['stats']['chunks_shortlisted'] == 16
+    # The query plus at most the shortlisted passages are encoded
+    assert len(encoded) <= 17
+
+    # Passage embeddings are cached: a repeat query only encodes the query
+    encoded.clear()
+    packer.pack('revenue by region', documents, max_tokens=1000)
+    assert encoded == ['revenue by region']
+
+
+def test_documents_cut_by_max_chars_are_not_reported():
+    topics = ['revenue', 'contracts', 'hiring', 'shipping']
+    documents = [{
+        'title': f'doc {d}',
+        'text': ' '.join(f"Note {i} on {topic} covers item {i * 7 + d} in detail." for i in range(12)),
+        'score': 0.9 - d * 0.1
+    } for d, topic in enumerate(topics)]
+
+    packed = _packer().pack('revenue by region', documents, max_tokens=2000, max_chars=700)
+
+    assert len(packed['context']) <= 710
+    assert packed['doc_indexes']
+    for doc_index in packed['doc_indexes']:
+        assert f"Document: doc {doc_index}\n" in packed['context']
+    assert len(packed['doc_indexes']) < len(documents)
@@ -0,0 +1,44 @@
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from flask import Flask
+from src.models.user import db
+from src.services.dedup_service import NearDuplicateDetector
+
+TEXT = 'Quarterly revenue grew in every region, led by strong subscription renewals. ' * 5
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_rolled_back_signature_is_never_matched(app):
+    detector = NearDuplicateDetector()
+    signature = detector.signature(TEXT)
+
+    detector.add(1, 7, signature)
+    db.session.rollback()
+
+    assert detector.find_duplicate(TEXT, 7) is None
+
+
+def test_signature_matches_once_registered_after_commit(app):
+    detector = NearDuplicateDetector()
+    signature = detector.signature(TEXT)
+
+    detector.add(1, 7, signature)
+    db.session.commit()
+    detector.register(1, 7, signature)
+
+    assert detector.find_duplicate(TEXT, 7)[0] == 1
+    # A fresh detector loads the committed row
+    assert NearDuplicateDetector().find_duplicate(TEXT, 7)[0] == 1
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('flask_sqlalchemy')
+
+from src.config import Config
+Config.LLM_BACKEND = 'stub'  # the gateway is created on import; keep it offline
+
+from src.services.llm_gateway_service import LLMGateway
+
+
+class _Backend:
+    def __init__(self):
+        self.calls = 0
+
+    def generate_with_gemini(self, prompt):
+        self.calls += 1
+        return {'response': f"echo {prompt}"}
+
+
+def test_follower_with_time_left_survives_a_short_budget_leader():
+    backend = _Backend()
+    gateway = LLMGateway(backend=backend)
+    provider = gateway.providers['gemini']
+    results = {}
+
+    def hold_every_slot():
+        for _ in range(provider.concurrency):
+            provider.semaphore.acquire()
+        time.sleep(0.4)
+        for _ in range(provider.concurrency):
+            provider.semaphore.release()
+
+    holder = threading.Thread(target=hold_every_slot)
+    holder.start()
+    time.sleep(0.05)
+
+    leader = threading.Thread(target=lambda: results.update(leader=gateway.generate_with_gemini('hi', timeout=0.1)))
+    leader.start()
+    time.sleep(0.02)
+    results['follower'] = gateway.generate_with_gemini('hi', timeout=3)
+    leader.join()
+    holder.join()
+
+    assert 'error' in results['leader']
+    assert results['follower'] == {'response': 'echo hi'}
+    assert backend.calls == 1
+    assert provider.get_stats()['coalesced'] == 1
@@ -0,0 +1,92 @@
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip('faiss')
+pytest.importorskip('flask_sqlalchemy')
+
+from flask import Flask
+from src.models.user import db
+from src.models.enhanced_models import RAGDocument, RAGDocumentAccess
+from src.services.tiered_index_service import TieredVectorIndex
+
+DIM = 8
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def _vector(seed):
+    vector = np.random.RandomState(seed).rand(DIM).astype('float32')
+    return vector / np.linalg.norm(vector)
+
+
+def _index_with_stale_documents(tmp_path, count=6):
+    index = TieredVectorIndex(DIM, hot_path=str(tmp_path / 'hot.bin'), cold_path=str(tmp_path / 'cold.bin'))
+    old = datetime.utcnow() - timedelta(days=30)
+    for n in range(1, count + 1):
+        db.session.add(RAGDocument(id=n, user_id=1, title=f'doc {n}', content='x', created_at=old))
+        index.add(n, _vector(n))
+    db.session.commit()
+    return index
+
+
+def test_stale_documents_move_to_cold_and_back(app, tmp_path):
+    index = _index_with_stale_documents(tmp_path)
+
+    assert index.migrate(cold_after_days=7) == {'promoted': 0, 'demoted': 6}
+    assert index.hot.ntotal == 0
+    assert sorted(index.cold_ids().tolist()) == [1, 2, 3, 4, 5, 6]
+    assert index.search(_vector(3), 1)[0][::2] == (3, 'cold')
+    assert {row.doc_id: row.tier for row in RAGDocumentAccess.query.all()} == {n: 'cold' for n in range(1, 7)}
+
+    index.record_hits([3])
+    assert index.migrate(cold_after_days=7, promote_hits=1) == {'promoted': 1, 'demoted': 0}
+    assert index.hot_ids().tolist() == [3]
+    assert 3 not in index.cold_ids().tolist()
+    assert db.session.get(RAGDocumentAccess, 3).tier == 'hot'
+
+
+def test_searches_and_writes_proceed_while_a_migration_builds(app, tmp_path):
+    index = _index_with_stale_documents(tmp_path)
+    building, release = threading.Event(), threading.Event()
+    build_cold = index._build_cold
+
+    def slow_build(*args, **kwargs):
+        building.set()
+        release.wait(5)
+        return build_cold(*args, **kwargs)
+
+    index._build_cold = slow_build
+    result = {}
+
+    def run():
+        with app.app_context():
+            result.update(index.migrate(cold_after_days=7))
+
+    migration = threading.Thread(target=run)
+    migration.start()
+    assert building.wait(5)
+
+    # Neither blocks on the migration; the touched documents keep their hot vectors
+    assert index.search(_vector(2), 1)[0][::2] == (2, 'hot')
+    index.add(4, _vector(40))
+    index.remove([5])
+    release.set()
+    migration.join(5)
+
+    assert result == {'promoted': 0, 'demoted': 4}
+    assert index.hot_ids().tolist() == [4]
+    assert sorted(index.cold_ids().tolist()) == [1, 2, 3, 6]
+    assert 5 not in [doc_id for doc_id, _, _ in index.search(_vector(5), 6)]
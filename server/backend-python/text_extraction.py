@@ -0,0 +1,69 @@
+import PyPDF2
+import docx
+import markdown
+from bs4 import BeautifulSoup
+import pandas as pd
+
+# Kept free of app/model imports so it can be loaded cheaply in worker processes
+
+def extract_text(file_path: str, file_type: str) -> str:
+    """Extract text content from various file types"""
+    try:
+        if file_type.lower() == 'pdf':
+            return extract_from_pdf(file_path)
+        elif file_type.lower() in ['docx', 'doc']:
+            return extract_from_docx(file_path)
+        elif file_type.lower() == 'csv':
+            return extract_from_csv(file_path)
+        elif file_type.lower() == 'html':
+            return extract_from_html(file_path)
+        elif file_type.lower() == 'md':
+            return extract_from_markdown(file_path)
+        elif file_type.lower() == 'txt':
+            return extract_from_txt(file_path)
+        else:
+            return ""
+    except Exception as e:
+        print(f"Error extracting text from {file_type} file: {e}")
+        return ""
+
+def extract_from_pdf(file_path: str) -> str:
+    """Extract text from PDF file"""
+    text = ""
+    with open(file_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        for page in pdf_reader.pages:
+            text += page.extract_text() + "\n"
+    return text
+
+def extract_from_docx(file_path: str) -> str:
+    """Extract text from DOCX file"""
+    doc = docx.Document(file_path)
+    text = ""
+    for paragraph in doc.paragraphs:
+        text += paragraph.text + "\n"
+    return text
+
+def extract_from_csv(file_path: str) -> str:
+    """Extract text from CSV file"""
+    df = pd.read_csv(file_path)
+    return df.to_string()
+
+def extract_from_html(file_path: str) -> str:
+    """Extract text from HTML file"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        soup = BeautifulSoup(file.read(), 'html.parser')
+        return soup.get_text()
+
+def extract_from_markdown(file_path: str) -> str:
+    """Extract text from Markdown file"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        md_content = file.read()
+        html = markdown.markdown(md_content)
+        soup = BeautifulSoup(html, 'html.parser')
+        return soup.get_text()
+
+def extract_from_txt(file_path: str) -> str:
+    """Extract text from TXT file"""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        return file.read()
@@ -0,0 +1,439 @@
+import os
+import threading
+import numpy as np
+import faiss
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Iterable, Tuple
+from src.models.enhanced_models import RAGDocument, RAGDocumentAccess
+from src.models.user import db
+from src.config import Config
+
+class _ReadWriteLock:
+    """Many readers or one writer; waiting writers hold off new readers"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+class TieredVectorIndex:
+    """Hot in-memory FAISS index plus a memory-mapped on-disk cold index.
+
+    Vectors are keyed by RAGDocument.id. Documents that have not been retrieved
+    recently are demoted to the cold tier, which is only searched when the hot
+    tier's best score is weak; cold documents that get hit again are promoted.
+    The cold tier is an IVF index, whose inverted lists FAISS can memory-map,
+    so only its coarse centroids are held in RAM. Deletes from the cold tier
+    are masked in memory and compacted on the next migration.
+
+    Searches share a read lock on the hot tier and search the cold tier
+    through a snapshot of its (never mutated) index and removal mask, so they
+    run concurrently. Migration reads the database and builds the new cold
+    index outside the lock and only swaps the references under it.
+    """
+
+    def __init__(self, dimension=384, hot_path=None, cold_path=None):
+        self.dimension = dimension
+        self.hot_path = hot_path or Config.RAG_HOT_INDEX_PATH
+        self.cold_path = cold_path or Config.RAG_COLD_INDEX_PATH
+        self.cold_min_score = Config.RAG_COLD_SEARCH_MIN_SCORE
+        self.cold_nlist = Config.RAG_COLD_NLIST
+        self.cold_nprobe = Config.RAG_COLD_NPROBE
+        self._lock = _ReadWriteLock()  # guards self.hot and the cold references
+        self._counter_lock = threading.Lock()  # guards hit counters and stats
+        self._migration_lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._touched = None  # ids added/removed while a migration is building, else None
+        self._hits = defaultdict(int)  # doc_id -> hits since last migration
+        self._last_hit = {}  # doc_id -> datetime
+        self._pending_cold_removals = frozenset()  # removed from cold, compacted on next migration; replaced, never mutated
+        self._stats = {
+            'hot_searches': 0,
+            'cold_searches': 0,
+            'promoted': 0,
+            'demoted': 0,
+            'last_migration': None
+        }
+        self.hot = self._load_hot_index()
+        self.cold = self._load_cold_index()
+
+    def _new_index(self):
+        return faiss.IndexIDMap2(faiss.IndexFlatIP(self.dimension))
+
+    def _new_cold_index(self, vectors: np.ndarray):
+        """IVF index trained on the vectors it will hold"""
+        nlist = max(1, min(self.cold_nlist, int(np.sqrt(len(vectors)))))
+        quantizer = faiss.IndexFlatIP(self.dimension)
+        index = faiss.IndexIVFFlat(quantizer, self.dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        return index
+
+    def _load_hot_index(self):
+        """Load the hot tier into RAM"""
+        try:
+            if os.path.exists(self.hot_path):
+                index = faiss.read_index(self.hot_path)
+                if isinstance(index, faiss.IndexIDMap2):
+                    print(f"Loaded hot FAISS index with {index.ntotal} vectors")
+                    return index
+                # Positional indexes from before tiering cannot be mapped back to documents
+                print("Existing FAISS index has no document IDs, run rebuild_index to repopulate it")
+        except Exception as e:
+            print(f"Error loading hot FAISS index: {e}")
+        return self._new_index()
+
+    def _load_cold_index(self):
+        """Open the cold tier with its inverted lists memory-mapped so they stay on disk"""
+        if not os.path.exists(self.cold_path):
+            return None
+        try:
+            index = faiss.read_index(self.cold_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except Exception as e:
+            print(f"Error loading cold FAISS index: {e}")
+            return None
+        if not isinstance(index, faiss.IndexIVF):
+            # Flat cold files from before IVF cannot be mapped; run rebuild_index to re-tier them
+            print("Cold FAISS index is not an IVF index, run rebuild_index to repopulate it")
+            return None
+        index.nprobe = min(self.cold_nprobe, index.nlist)
+        return index
+
+    @staticmethod
+    def _ids(index) -> np.ndarray:
+        if index is None or index.ntotal == 0:
+            return np.array([], dtype='int64')
+        if isinstance(index, faiss.IndexIVF):
+            lists = index.invlists
+            return np.concatenate([
+                faiss.rev_swig_ptr(lists.get_ids(i), lists.list_size(i)).copy()
+                for i in range(lists.nlist)
+            ] or [np.array([], dtype='int64')]).astype('int64')
+        return faiss.vector_to_array(index.id_map)
+
+    def _vectors(self, index) -> np.ndarray:
+        """All vectors, in the same order as _ids(index)"""
+        if isinstance(index, faiss.IndexIVF):
+            lists = index.invlists
+            return np.concatenate([
+                faiss.rev_swig_ptr(lists.get_codes(i), lists.list_size(i) * lists.code_size)
+                .copy().view('float32').reshape(-1, self.dimension)
+                for i in range(lists.nlist)
+            ] or [np.zeros((0, self.dimension), dtype='float32')])
+        return index.index.reconstruct_n(0, index.ntotal)
+
+    def hot_ids(self) -> np.ndarray:
+        with self._lock.read():
+            return self._ids(self.hot)
+
+    def cold_ids(self) -> np.ndarray:
+        """Cold vector IDs, less the ones already removed but not yet compacted"""
+        cold, pending = self.cold, self._pending_cold_removals
+        ids = self._ids(cold)
+        if pending:
+            ids = ids[~np.isin(ids, list(pending))]
+        return ids
+
+    @property
+    def ntotal(self) -> int:
+        cold, pending = self.cold, self._pending_cold_removals
+        return self.hot.ntotal + (cold.ntotal - len(pending) if cold is not None else 0)
+
+    def add(self, doc_id: int, embedding: np.ndarray):
+        """Add (or replace) a document vector in the hot tier.
+
+        Adding is not a hit: a re-added document (e.g. by rebuild_index) keeps
+        its recorded activity and is demoted once that goes stale.
+        """
+        if embedding.ndim == 1:
+            embedding = embedding.reshape(1, -1)
+        with self._lock.write():
+            self._remove(np.array([doc_id], dtype='int64'))
+            self.hot.add_with_ids(embedding.astype('float32'), np.array([doc_id], dtype='int64'))
+
+    def remove(self, doc_ids: Iterable[int]) -> int:
+        """Remove document vectors from both tiers (cold removals are masked until compacted)"""
+        ids = np.array(list(doc_ids), dtype='int64')
+        if len(ids) == 0:
+            return 0
+        with self._lock.write():
+            return self._remove(ids)
+
+    def _remove(self, ids: np.ndarray) -> int:
+        """Caller holds the write lock"""
+        if self._touched is not None:
+            self._touched.update(ids.tolist())
+        removed = self.hot.remove_ids(ids)
+        if self.cold is not None:
+            cold_ids = self._ids(self.cold)
+            in_cold = set(cold_ids[np.isin(cold_ids, ids)].tolist()) - self._pending_cold_removals
+            removed += len(in_cold)
+            self._pending_cold_removals = self._pending_cold_removals | in_cold
+        return int(removed)
+
+    def search(self, query: np.ndarray, top_k: int) -> List[Tuple[int, float, str]]:
+        """Search the hot tier, falling back to the cold tier when hot scores are weak"""
+        if query.ndim == 1:
+            query = query.reshape(1, -1)
+        query = query.astype('float32')
+
+        results = []
+        with self._lock.read():
+            # Cold references are swapped, never mutated, so this snapshot stays valid
+            cold, pending = self.cold, self._pending_cold_removals
+            searched_hot = self.hot.ntotal > 0
+            if searched_hot:
+                scores, ids = self.hot.search(query, top_k)
+                results = [(int(i), float(s), 'hot') for s, i in zip(scores[0], ids[0]) if i != -1]
+
+        searched_cold = False
+        weak = not results or len(results) < top_k or results[0][1] < self.cold_min_score
+        if weak and cold is not None and cold.ntotal > 0:
+            searched_cold = True
+            scores, ids = cold.search(query, top_k)
+            results.extend(
+                (int(i), float(s), 'cold') for s, i in zip(scores[0], ids[0])
+                if i != -1 and int(i) not in pending
+            )
+            results.sort(key=lambda r: r[1], reverse=True)
+            results = results[:top_k]
+
+        with self._counter_lock:
+            if searched_hot:
+                self._stats['hot_searches'] += 1
+            if searched_cold:
+                self._stats['cold_searches'] += 1
+        return results
+
+    def record_hits(self, doc_ids: Iterable[int]):
+        """Count retrievals; the migration job turns these into tier decisions"""
+        now = datetime.utcnow()
+        with self._counter_lock:
+            for doc_id in doc_ids:
+                self._hits[doc_id] += 1
+                self._last_hit[doc_id] = now
+
+    def save(self):
+        """Persist the hot tier (the cold tier is written only on migration)"""
+        try:
+            with self._save_lock, self._lock.read():
+                faiss.write_index(self.hot, self.hot_path)
+        except Exception as e:
+            print(f"Error saving hot FAISS index: {e}")
+
+    def reset(self):
+        """Drop both tiers"""
+        with self._lock.write():
+            self.hot = self._new_index()
+            self.cold = None
+            self._pending_cold_removals = frozenset()
+            if os.path.exists(self.cold_path):
+                os.remove(self.cold_path)
+
+    def _build_cold(self, cold, drop_ids, extra_ids=None, extra_vectors=None):
+        """Write a new cold index to a temporary file and open it memory-mapped.
+
+        Reads only the given (immutable) cold snapshot, so it runs without the
+        lock. Returns (index or None, path to move over cold_path or None).
+        """
+        ids = self._ids(cold)
+        vectors = self._vectors(cold) if len(ids) else np.zeros((0, self.dimension), dtype='float32')
+        if len(ids) and drop_ids:
+            keep = ~np.isin(ids, np.array(list(drop_ids), dtype='int64'))
+            ids, vectors = ids[keep], vectors[keep]
+        if extra_ids is not None and len(extra_ids):
+            ids = np.concatenate([ids, extra_ids])
+            vectors = np.concatenate([vectors, extra_vectors.astype('float32')])
+        if len(ids) == 0:
+            return None, None
+
+        index = self._new_cold_index(vectors)
+        index.add_with_ids(vectors, ids)
+        tmp_path = f"{self.cold_path}.tmp"
+        faiss.write_index(index, tmp_path)
+        # The mapping follows the file when it is renamed over cold_path
+        index = faiss.read_index(tmp_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        index.nprobe = min(self.cold_nprobe, index.nlist)
+        return index, tmp_path
+
+    def _access_rows(self, doc_ids) -> Dict[int, RAGDocumentAccess]:
+        """Access rows for doc_ids in one query, creating the missing ones"""
+        doc_ids = list(doc_ids)
+        rows = {
+            row.doc_id: row
+            for row in RAGDocumentAccess.query.filter(RAGDocumentAccess.doc_id.in_(doc_ids)).all()
+        } if doc_ids else {}
+        for doc_id in doc_ids:
+            if doc_id not in rows:
+                rows[doc_id] = RAGDocumentAccess(doc_id=doc_id, hit_count=0, tier='hot')
+                db.session.add(rows[doc_id])
+        return rows
+
+    def _flush_access_counters(self) -> Dict[int, int]:
+        """Persist in-memory hit counters and return the hits since the last migration"""
+        with self._counter_lock:
+            hits, self._hits = dict(self._hits), defaultdict(int)
+            last_hit = dict(self._last_hit)
+
+        rows = self._access_rows(hits)
+        for doc_id, count in hits.items():
+            access = rows[doc_id]
+            access.hit_count = (access.hit_count or 0) + count
+            access.last_hit_at = last_hit.get(doc_id)
+        db.session.commit()
+        return hits
+
+    def migrate(self, cold_after_days=None, promote_hits=None) -> Dict[str, Any]:
+        """Move documents between tiers based on hit counters (needs an app context)"""
+        with self._migration_lock:
+            return self._migrate(cold_after_days, promote_hits)
+
+    def _migrate(self, cold_after_days, promote_hits) -> Dict[str, Any]:
+        cold_after_days = Config.RAG_COLD_AFTER_DAYS if cold_after_days is None else cold_after_days
+        promote_hits = Config.RAG_PROMOTE_HITS if promote_hits is None else promote_hits
+        cutoff = datetime.utcnow() - timedelta(days=cold_after_days)
+
+        recent_hits = self._flush_access_counters()
+
+        # Snapshot; adds and removals from here on are recorded in _touched
+        with self._lock.write():
+            hot_ids = set(self._ids(self.hot).tolist())
+            cold, compacted = self.cold, self._pending_cold_removals
+            self._touched = set()
+        with self._counter_lock:
+            last_hit = dict(self._last_hit)
+
+        try:
+            # Demote hot documents whose last hit (or creation) is older than the cutoff
+            stale = set()
+            last_activity = db.session.query(
+                RAGDocument.id,
+                db.func.coalesce(RAGDocumentAccess.last_hit_at, RAGDocument.created_at)
+            ).outerjoin(RAGDocumentAccess, RAGDocumentAccess.doc_id == RAGDocument.id)\
+             .filter(db.func.coalesce(RAGDocumentAccess.last_hit_at, RAGDocument.created_at) < cutoff)
+            for doc_id, _ in last_activity.yield_per(1000):
+                if doc_id in hot_ids and last_hit.get(doc_id, cutoff) <= cutoff:
+                    stale.add(doc_id)
+
+            # Promote cold documents that are being retrieved again
+            cold_ids = self._ids(cold)
+            promote_ids = np.array([
+                doc_id for doc_id in cold_ids.tolist()
+                if recent_hits.get(doc_id, 0) >= promote_hits and doc_id not in compacted
+            ], dtype='int64')
+            promote_vectors = self._vectors(cold)[np.isin(cold_ids, promote_ids)] if len(promote_ids) else None
+            if len(promote_ids):
+                promote_ids = cold_ids[np.isin(cold_ids, promote_ids)]
+
+            demote_ids = np.array(sorted(stale), dtype='int64')
+            demote_vectors = None
+            if len(demote_ids):
+                with self._lock.read():
+                    present = [doc_id for doc_id in demote_ids.tolist() if doc_id not in self._touched]
+                    demote_ids = np.array(present, dtype='int64')
+                    demote_vectors = np.array(
+                        [self.hot.reconstruct(doc_id) for doc_id in present], dtype='float32'
+                    ).reshape(-1, self.dimension)
+
+            # Rewriting the cold tier also compacts the removals masked since the last one
+            rewrite = bool(len(demote_ids) or len(promote_ids) or compacted)
+            new_cold, tmp_path = cold, None
+            if rewrite:
+                new_cold, tmp_path = self._build_cold(
+                    cold, compacted | set(promote_ids.tolist()), demote_ids, demote_vectors
+                )
+
+            with self._lock.write():
+                touched, self._touched = self._touched, None
+                if rewrite:
+                    if tmp_path:
+                        os.replace(tmp_path, self.cold_path)
+                    elif os.path.exists(self.cold_path):
+                        os.remove(self.cold_path)
+
+                    # Documents re-added or removed while building keep their hot state
+                    # and are masked in the new cold tier
+                    demoted = [doc_id for doc_id in demote_ids.tolist() if doc_id not in touched]
+                    if demoted:
+                        self.hot.remove_ids(np.array(demoted, dtype='int64'))
+                    keep = ~np.isin(promote_ids, list(touched)) if len(promote_ids) else None
+                    if keep is not None and keep.any():
+                        self.hot.add_with_ids(promote_vectors[keep], promote_ids[keep])
+
+                    new_ids = set(self._ids(new_cold).tolist())
+                    removed_since = (self._pending_cold_removals - compacted) | touched
+                    self.cold = new_cold
+                    self._pending_cold_removals = frozenset(removed_since & new_ids)
+                    promoted = promote_ids[keep].tolist() if keep is not None else []
+                else:
+                    demoted, promoted = [], []
+            if rewrite:
+                self.save()
+        except Exception:
+            with self._lock.write():
+                self._touched = None
+            raise
+
+        with self._counter_lock:
+            self._stats['promoted'] += len(promoted)
+            self._stats['demoted'] += len(demoted)
+            self._stats['last_migration'] = datetime.utcnow().isoformat()
+
+        # Record tier membership for reporting
+        self._set_tiers(promoted, 'hot')
+        self._set_tiers(demoted, 'cold')
+        db.session.commit()
+
+        return {'promoted': len(promoted), 'demoted': len(demoted)}
+
+    def _set_tiers(self, doc_ids, tier: str):
+        now = datetime.utcnow()
+        for access in self._access_rows(doc_ids).values():
+            access.tier = tier
+            access.tier_changed_at = now
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get tiering statistics"""
+        with self._lock.read():
+            cold, pending = self.cold, self._pending_cold_removals
+            hot_size = self.hot.ntotal
+        with self._counter_lock:
+            return {
+                **self._stats,
+                'hot_size': hot_size,
+                'cold_size': cold.ntotal - len(pending) if cold is not None else 0,
+                'cold_pending_removals': len(pending),
+                'pending_hit_counters': len(self._hits),
+                'cold_search_min_score': self.cold_min_score
+            }